@@ -0,0 +1,288 @@
+"""
+Content-addressed cache of analysis results.
+
+Analyses are cached by the SHA-256 of the video file plus a fingerprint of
+the configuration that influences the landmarks (MEDIAPIPE_CONFIG,
+LANDMARK_MODELS_CONFIG and the frame sampling/segmenting part of
+VIDEO_PROCESSING_CONFIG) and the audio features (AUDIO_ANALYSIS_CONFIG). A
+re-upload of the same recording, or a repeated request for the same video,
+is answered from the cache instead of being decoded and run through the pose
+model again.
+
+File hashes are memoized in the `video_hashes` collection by path, size and
+modification time, so a file is only read again when it changes. Cache
+entries live in the `analysis_cache` collection:
+
+    {
+        '_id': '<content hash>:<config hash>',
+        'content_hash': '...',
+        'config_hash': '...',
+        'analysis_id': ObjectId(...),
+        'video_ids': ['...'],
+        'result': {...},  # process_video() result of the cached analysis
+        'created_at': datetime,
+        'last_hit_at': datetime,
+        'hits': 0
+    }
+
+Entries are only removed explicitly (invalidate_video(), invalidate_analysis(),
+clear_cache()) or by the eviction policy in evict_cache_entries().
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import ASCENDING
+
+from .storage import SCHEMA_VERSION_BUCKETED
+from .analysis_store import ANALYSIS_COMPLETE, clone_analysis
+from .db_connection import get_analysis_collection, get_analysis_cache_collection, get_video_hashes_collection
+
+
+# VIDEO_PROCESSING_CONFIG keys that change which frames are analyzed or the resulting landmarks
+CACHE_KEY_PROCESSING_FIELDS = [
+    'frame_interval',
+    'adaptive_sampling',
+    'min_frame_interval',
+    'max_frame_interval',
+    'motion_threshold',
+    'keyframe_stride',
+    'landmark_smoothing',
+    'smoothing_min_cutoff',
+    'smoothing_beta',
+    'smoothing_d_cutoff',
+    'skip_duplicate_frames',
+    'duplicate_threshold',
+    'duplicate_max_carry',
+    'segment_workers',
+    'min_segment_duration',
+    'segment_warmup_frames',
+    'inference_max_side',
+    'roi_crop',
+    'roi_padding',
+]
+
+# AUDIO_ANALYSIS_CONFIG keys that change the stored audio features
+CACHE_KEY_AUDIO_FIELDS = [
+    'enabled',
+    'sample_rate',
+    'frame_length',
+    'hop_length',
+    'min_pitch',
+    'max_pitch',
+    'voicing_threshold',
+    'silence_db',
+]
+
+
+def hash_file(path: str, chunk_size: int) -> str:
+    """Compute the SHA-256 of a file with chunked reads."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as video_file:
+        while True:
+            chunk = video_file.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_content_hash(path: str) -> str:
+    """
+    Get the SHA-256 of a video file, memoized by path, size and modification time.
+
+    Args:
+        path: Path to the video file
+
+    Returns:
+        Hex digest of the file contents
+    """
+    stat = os.stat(path)
+    hashes_collection = get_video_hashes_collection()
+
+    memo = hashes_collection.find_one({'_id': path})
+    if memo and memo['size'] == stat.st_size and memo['mtime'] == stat.st_mtime:
+        return memo['sha256']
+
+    content_hash = hash_file(path, settings.ANALYSIS_CACHE_CONFIG['hash_chunk_size'])
+    hashes_collection.replace_one(
+        {'_id': path},
+        {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': content_hash,
+            'hashed_at': datetime.utcnow()
+        },
+        upsert=True
+    )
+    return content_hash
+
+
+def get_landmark_config() -> Dict[str, Any]:
+    """
+    The effective configuration that influences the stored landmarks.
+
+    Part of the cache key, and of the params an unfinished analysis is only
+    resumed with (see analysis_store.claim_resumable_analysis()).
+    """
+    processing_config = settings.VIDEO_PROCESSING_CONFIG
+    return {
+        'mediapipe': settings.MEDIAPIPE_CONFIG,
+        'processing': {key: processing_config[key] for key in CACHE_KEY_PROCESSING_FIELDS},
+        'landmark_models': settings.LANDMARK_MODELS_CONFIG,
+    }
+
+
+def get_config_hash() -> str:
+    """Fingerprint of the effective configuration that influences analysis results."""
+    config = {
+        'schema_version': SCHEMA_VERSION_BUCKETED,
+        **get_landmark_config(),
+        'audio': {key: settings.AUDIO_ANALYSIS_CONFIG[key] for key in CACHE_KEY_AUDIO_FIELDS},
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def get_cache_key(path: str) -> str:
+    """Get the cache key of a video file under the current configuration."""
+    return f"{get_content_hash(path)}:{get_config_hash()}"
+
+
+def lookup_cached_analysis(cache_key: str, video_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Answer an analysis request from the cache.
+
+    If the cached analysis belongs to the same video it is returned as is,
+    otherwise it is cloned to `video_id` so the video gets its own analysis.
+
+    Args:
+        cache_key: Key from get_cache_key()
+        video_id: The MongoDB ObjectId of the requested video
+
+    Returns:
+        process_video() style result with 'cached': True, or None on a miss
+    """
+    cache_collection = get_analysis_cache_collection()
+    entry = cache_collection.find_one({'_id': cache_key})
+    if entry is None:
+        return None
+
+    source = get_analysis_collection().find_one(
+        {'_id': entry['analysis_id'], 'status': ANALYSIS_COMPLETE},
+        {'video_id': 1}
+    )
+    if source is None:
+        # The cached analysis was deleted behind the cache's back
+        cache_collection.delete_one({'_id': cache_key})
+        return None
+
+    if source['video_id'] == video_id:
+        analysis_id = entry['analysis_id']
+    else:
+        analysis_id = clone_analysis(entry['analysis_id'], video_id)
+        if analysis_id is None:
+            return None
+
+    cache_collection.update_one(
+        {'_id': cache_key},
+        {
+            '$set': {'last_hit_at': datetime.utcnow()},
+            '$inc': {'hits': 1},
+            '$addToSet': {'video_ids': video_id}
+        }
+    )
+
+    result = dict(entry['result'])
+    result.update({
+        'analysis_id': str(analysis_id),
+        'cached': True,
+        'resumed': False
+    })
+    return result
+
+
+def store_cached_analysis(cache_key: str, video_id: str, result: Dict[str, Any]):
+    """
+    Register a completed analysis in the cache and apply the eviction policy.
+
+    Args:
+        cache_key: Key from get_cache_key()
+        video_id: The MongoDB ObjectId of the analyzed video
+        result: Successful process_video() result
+    """
+    content_hash, config_hash = cache_key.split(':')
+    now = datetime.utcnow()
+
+    get_analysis_cache_collection().update_one(
+        {'_id': cache_key},
+        {
+            '$set': {
+                'content_hash': content_hash,
+                'config_hash': config_hash,
+                'analysis_id': ObjectId(result['analysis_id']),
+                'result': result,
+                'created_at': now,
+                'last_hit_at': now,
+                'hits': 0
+            },
+            '$addToSet': {'video_ids': video_id}
+        },
+        upsert=True
+    )
+    evict_cache_entries()
+
+
+def invalidate_video(video_id: str) -> int:
+    """Drop the cache entries that served or were created from a video. Returns the number dropped."""
+    return get_analysis_cache_collection().delete_many({'video_ids': video_id}).deleted_count
+
+
+def invalidate_analysis(analysis_id: ObjectId) -> int:
+    """Drop the cache entries pointing to an analysis (e.g. before deleting it)."""
+    return get_analysis_cache_collection().delete_many({'analysis_id': analysis_id}).deleted_count
+
+
+def clear_cache() -> int:
+    """Drop all cache entries and file hash memos. Returns the number of entries dropped."""
+    get_video_hashes_collection().delete_many({})
+    return get_analysis_cache_collection().delete_many({}).deleted_count
+
+
+def evict_cache_entries(max_entries: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+    """
+    Apply the cache eviction policy.
+
+    Entries not hit for `max_age_days` are dropped, then the least recently
+    hit entries beyond `max_entries`. Only cache entries are removed, the
+    analyses themselves are kept.
+
+    Args:
+        max_entries: Defaults to ANALYSIS_CACHE_CONFIG['max_entries']
+        max_age_days: Defaults to ANALYSIS_CACHE_CONFIG['max_age_days']
+
+    Returns:
+        Number of evicted entries
+    """
+    cache_config = settings.ANALYSIS_CACHE_CONFIG
+    if max_entries is None:
+        max_entries = cache_config['max_entries']
+    if max_age_days is None:
+        max_age_days = cache_config['max_age_days']
+
+    cache_collection = get_analysis_cache_collection()
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+    evicted = cache_collection.delete_many({'last_hit_at': {'$lt': cutoff}}).deleted_count
+
+    excess = cache_collection.count_documents({}) - max_entries
+    if excess > 0:
+        stale_ids = [
+            entry['_id']
+            for entry in cache_collection.find({}, {'_id': 1}).sort('last_hit_at', ASCENDING).limit(excess)
+        ]
+        evicted += cache_collection.delete_many({'_id': {'$in': stale_ids}}).deleted_count
+
+    return evicted
@@ -0,0 +1,590 @@
+"""
+Bucketed persistence of analyses in MongoDB.
+
+An analysis is stored as a small header document in the `analysis` collection
+and one document per fixed-length time bucket in `analysis_buckets`:
+
+    header: {
+        'video_id': '...',
+        'schema_version': 3,
+        'status': 'processing' | 'complete' | 'failed',
+        'bucket_duration': 30,
+        'total_frames': 150,
+        'carried_forward_frames': 12,
+        'max_x': 0.987,
+        'max_y': 0.923,
+        ...
+    }
+
+    bucket: {
+        'analysis_id': ObjectId(...),
+        'bucket_index': 0,
+        'start_time': 0.0,
+        'frame_count': 150,
+        'timestamps': [0.0, 0.2, ...],
+        'landmarks': <packed block, see storage.pack_landmarks()>,
+        'carried_forward': [3, 4, 5],
+        'audio': {'loudness_db': [...], 'pitch': [...]},
+        'models': {'face': {'timestamps': [0.0, 0.6, ...], 'landmarks': <packed block>}, ...},
+        'model_frame_counts': {'face': 50},
+        'max_x': 0.987,
+        'max_y': 0.923
+    }
+
+`carried_forward` lists the positions (within the bucket) of frames whose
+landmarks were copied from the previous analyzed frame instead of running the
+pose model, because the picture had not changed. `audio` holds the voice
+loudness and pitch of every frame once the analysis is complete (see audio.py).
+`models` holds the landmarks of the additional models (face mesh, hands) for
+the frames they ran on, each model with its own timestamps (see model_stages.py).
+
+Buckets are written while the video is still being processed, so only the
+frames of the current bucket are held in memory and a crash does not lose the
+buckets that were already flushed.
+
+After every bucket write the writer records a checkpoint for its segment on
+the header (`checkpoints.<segment index>`: the first frame that is not yet
+persisted and the timestamp of the last persisted frame). A failed analysis,
+or one whose worker stopped updating it, can be claimed again and resumed from
+these checkpoints instead of starting over.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from .models import LandmarkBuffer
+from .storage import SCHEMA_VERSION_BUCKETED, get_schema_version, pack_landmarks, unpack_landmarks
+from .db_connection import get_analysis_collection, get_analysis_buckets_collection
+from .metrics import STAGE_SECONDS, STAGE_STORAGE_WRITE
+
+
+ANALYSIS_PROCESSING = 'processing'
+ANALYSIS_COMPLETE = 'complete'
+ANALYSIS_FAILED = 'failed'
+
+
+def params_hash(params: Dict[str, Any]) -> str:
+    """Fingerprint of processing params, equal exactly when the params are equal."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def create_analysis_header(
+    video_id: str,
+    bucket_duration: float,
+    params: Dict[str, Any],
+    segments: List[Tuple[int, Optional[int]]]
+) -> ObjectId:
+    """
+    Insert the header document of a new analysis in the 'processing' state.
+
+    Args:
+        video_id: The MongoDB ObjectId of the analyzed video
+        bucket_duration: Length of a bucket in seconds
+        params: Processing parameters that determine which frames are sampled
+            and how they are bucketed; an analysis is only resumed with equal params
+        segments: (start_frame, end_frame) ranges the video is analyzed in
+
+    Returns:
+        The ObjectId of the analysis
+    """
+    now = datetime.utcnow()
+    result = get_analysis_collection().insert_one({
+        'video_id': video_id,
+        'schema_version': SCHEMA_VERSION_BUCKETED,
+        'status': ANALYSIS_PROCESSING,
+        'bucket_duration': bucket_duration,
+        'params': params,
+        'params_hash': params_hash(params),
+        'segments': [list(segment) for segment in segments],
+        'checkpoints': {},
+        'created_at': now.isoformat(),
+        'updated_at': now,
+        'total_frames': 0,
+        'max_x': 0.0,
+        'max_y': 0.0
+    })
+    return result.inserted_id
+
+
+def claim_resumable_analysis(video_id: str, params: Dict[str, Any], stale_after: float) -> Optional[Dict[str, Any]]:
+    """
+    Atomically take over the most recent unfinished analysis of a video.
+
+    An analysis can be resumed if it failed, or if it is still 'processing'
+    but its `updated_at` has not been touched for `stale_after` seconds (its
+    worker died; a live worker touches it regularly, see touch_analysis()).
+
+    Args:
+        video_id: The MongoDB ObjectId of the video
+        params: Processing parameters, must equal the ones the analysis was started with
+            (all of them, compared by params_hash())
+        stale_after: Seconds without an update after which a processing analysis is abandoned
+
+    Returns:
+        The claimed header document (back in the 'processing' state), or None
+    """
+    now = datetime.utcnow()
+    query = {
+        'video_id': video_id,
+        'schema_version': SCHEMA_VERSION_BUCKETED,
+        'params_hash': params_hash(params),
+        '$or': [
+            {'status': ANALYSIS_FAILED},
+            {'status': ANALYSIS_PROCESSING, 'updated_at': {'$lt': now - timedelta(seconds=stale_after)}},
+        ]
+    }
+
+    return get_analysis_collection().find_one_and_update(
+        query,
+        {
+            '$set': {'status': ANALYSIS_PROCESSING, 'updated_at': now},
+            '$unset': {'error': ''}
+        },
+        sort=[('created_at', DESCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def touch_analysis(analysis_id: ObjectId):
+    """Mark a processing analysis as alive, so it is not claimed as abandoned while no buckets are written."""
+    get_analysis_collection().update_one(
+        {'_id': analysis_id, 'status': ANALYSIS_PROCESSING},
+        {'$set': {'updated_at': datetime.utcnow()}}
+    )
+
+
+def record_checkpoint(analysis_id: ObjectId, segment_index: int, checkpoint: Dict[str, Any]):
+    """
+    Record the progress of one segment on the analysis header.
+
+    Args:
+        analysis_id: The ObjectId of the analysis header
+        segment_index: Index of the segment in the header's `segments`
+        checkpoint: 'next_frame' (first frame whose bucket is not persisted),
+            'timestamp' (last persisted frame) and 'complete'
+    """
+    get_analysis_collection().update_one(
+        {'_id': analysis_id},
+        {
+            '$set': {
+                f'checkpoints.{segment_index}': checkpoint,
+                'updated_at': datetime.utcnow()
+            }
+        }
+    )
+
+
+def discard_buckets(analysis_id: ObjectId, first_bucket: int, end_bucket: Optional[int] = None) -> int:
+    """
+    Delete the buckets of an analysis in [first_bucket, end_bucket).
+
+    Used before resuming a segment, for buckets that were written after its
+    last recorded checkpoint.
+    """
+    bucket_range = {'$gte': first_bucket}
+    if end_bucket is not None:
+        bucket_range['$lt'] = end_bucket
+
+    return get_analysis_buckets_collection().delete_many(
+        {'analysis_id': analysis_id, 'bucket_index': bucket_range}
+    ).deleted_count
+
+
+def complete_analysis(analysis_id: ObjectId) -> Dict[str, Any]:
+    """
+    Aggregate the buckets of a finished analysis onto its header and mark it complete.
+
+    Returns:
+        Dictionary with total_frames, carried_forward_frames, model_frames
+        (frames per additional model), max_x, max_y and bucket_count
+    """
+    summary = {
+        'total_frames': 0,
+        'carried_forward_frames': 0,
+        'model_frames': {},
+        'max_x': 0.0,
+        'max_y': 0.0,
+        'bucket_count': 0
+    }
+
+    buckets = get_analysis_buckets_collection().find(
+        {'analysis_id': analysis_id},
+        {'frame_count': 1, 'carried_forward': 1, 'model_frame_counts': 1, 'max_x': 1, 'max_y': 1}
+    )
+    for bucket in buckets:
+        summary['total_frames'] += bucket['frame_count']
+        summary['carried_forward_frames'] += len(bucket.get('carried_forward', []))
+        for model, count in bucket.get('model_frame_counts', {}).items():
+            summary['model_frames'][model] = summary['model_frames'].get(model, 0) + count
+        summary['max_x'] = max(summary['max_x'], bucket['max_x'])
+        summary['max_y'] = max(summary['max_y'], bucket['max_y'])
+        summary['bucket_count'] += 1
+
+    now = datetime.utcnow()
+    get_analysis_collection().update_one(
+        {'_id': analysis_id},
+        {
+            '$set': {
+                'status': ANALYSIS_COMPLETE,
+                **summary,
+                'updated_at': now,
+                'completed_at': now.isoformat()
+            }
+        }
+    )
+    return summary
+
+
+def fail_analysis(analysis_id: ObjectId, error: str):
+    """Mark an analysis as failed. Buckets written so far are kept."""
+    get_analysis_collection().update_one(
+        {'_id': analysis_id},
+        {'$set': {'status': ANALYSIS_FAILED, 'error': error, 'updated_at': datetime.utcnow()}}
+    )
+
+
+def _bucket_query(doc: Dict[str, Any], start: Optional[float], end: Optional[float]) -> Dict[str, Any]:
+    query = {'analysis_id': doc['_id']}
+    if start is not None:
+        query['bucket_index'] = {'$gte': int(start // doc['bucket_duration'])}
+    if end is not None:
+        query['start_time'] = {'$lt': end}
+    return query
+
+
+def attach_buckets(doc: Dict[str, Any], start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Load the bucket documents of a bucketed analysis header into doc['buckets'].
+
+    With a time range only the buckets overlapping [start, end) are read.
+    Documents of older schema versions are returned unchanged.
+
+    Args:
+        doc: Analysis header document
+        start: Start of the needed time range in seconds
+        end: End of the needed time range in seconds
+    """
+    if get_schema_version(doc) != SCHEMA_VERSION_BUCKETED:
+        return doc
+
+    doc['buckets'] = list(
+        get_analysis_buckets_collection()
+        .find(_bucket_query(doc, start, end), {'timestamps': 1, 'landmarks': 1})
+        .sort('bucket_index', ASCENDING)
+    )
+    return doc
+
+
+def iter_bucket_series(
+    doc: Dict[str, Any],
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    with_landmarks: bool = True
+) -> Iterator[Tuple[List[float], Optional[np.ndarray]]]:
+    """
+    Iterate over the buckets of a bucketed analysis without loading them all.
+
+    Args:
+        doc: Analysis header document
+        start: Start of the needed time range in seconds
+        end: End of the needed time range in seconds
+        with_landmarks: False to only read the timestamps
+
+    Yields:
+        (timestamps, (frames, 33, 4) landmark array or None) per bucket, in time order
+    """
+    projection = {'timestamps': 1, 'landmarks': 1} if with_landmarks else {'timestamps': 1}
+    cursor = (
+        get_analysis_buckets_collection()
+        .find(_bucket_query(doc, start, end), projection)
+        .sort('bucket_index', ASCENDING)
+        .batch_size(4)
+    )
+    for bucket in cursor:
+        landmarks = unpack_landmarks(bucket['landmarks']) if with_landmarks else None
+        yield bucket['timestamps'], landmarks
+
+
+def load_model_series(
+    doc: Dict[str, Any],
+    model: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None
+) -> Tuple[List[float], Optional[np.ndarray]]:
+    """
+    Load the landmarks of an additional model (e.g. 'face', 'hands') of a bucketed analysis.
+
+    Args:
+        doc: Analysis header document
+        model: Name of the model in the buckets' `models` field
+        start: Only include frames at or after this many seconds
+        end: Only include frames before this many seconds
+
+    Returns:
+        Tuple of (timestamps, (frames, landmarks, 4) float32 array), the
+        array is None if the model has no frames in the range
+    """
+    timestamps = []
+    arrays = []
+    cursor = (
+        get_analysis_buckets_collection()
+        .find(_bucket_query(doc, start, end), {f'models.{model}': 1})
+        .sort('bucket_index', ASCENDING)
+    )
+    for bucket in cursor:
+        block = bucket.get('models', {}).get(model)
+        if block is None:
+            continue
+        bucket_timestamps = np.asarray(block['timestamps'], dtype=np.float64)
+        mask = np.ones(len(bucket_timestamps), dtype=bool)
+        if start is not None:
+            mask &= bucket_timestamps >= start
+        if end is not None:
+            mask &= bucket_timestamps < end
+        timestamps.extend(bucket_timestamps[mask].tolist())
+        arrays.append(unpack_landmarks(block['landmarks'])[mask])
+
+    if not timestamps:
+        return [], None
+    return timestamps, np.concatenate(arrays)
+
+
+def clone_analysis(analysis_id: ObjectId, video_id: str) -> Optional[ObjectId]:
+    """
+    Copy a complete analysis (header and buckets) to another video.
+
+    The buckets are inserted before the header, so the clone only becomes
+    visible once it is complete.
+
+    Args:
+        analysis_id: The ObjectId of the analysis to copy
+        video_id: The MongoDB ObjectId of the video the copy belongs to
+
+    Returns:
+        The ObjectId of the copy, or None if the source analysis is not complete
+    """
+    header = get_analysis_collection().find_one({'_id': analysis_id, 'status': ANALYSIS_COMPLETE})
+    if header is None:
+        return None
+
+    clone_id = ObjectId()
+    buckets_collection = get_analysis_buckets_collection()
+    batch = []
+    for bucket in buckets_collection.find({'analysis_id': analysis_id}):
+        bucket.pop('_id')
+        bucket['analysis_id'] = clone_id
+        batch.append(bucket)
+        if len(batch) >= 16:
+            buckets_collection.insert_many(batch)
+            batch = []
+    if batch:
+        buckets_collection.insert_many(batch)
+
+    now = datetime.utcnow()
+    # The level-of-detail series are not copied, they are built again on request
+    clone = {key: value for key, value in header.items() if key not in ('checkpoints', 'lod')}
+    clone.update({
+        '_id': clone_id,
+        'video_id': video_id,
+        'cloned_from': analysis_id,
+        'created_at': now.isoformat(),
+        'completed_at': now.isoformat(),
+        'updated_at': now
+    })
+    get_analysis_collection().insert_one(clone)
+    return clone_id
+
+
+def delete_analysis_header(analysis_id: ObjectId, stale_after: float) -> Optional[bool]:
+    """
+    Delete an analysis header unless a live worker is still writing its buckets.
+
+    A 'processing' analysis whose `updated_at` has not been touched for
+    `stale_after` seconds was abandoned and is deleted like a finished one.
+
+    Returns:
+        True if the header was deleted, False if the analysis is still being
+        processed, None if it does not exist
+    """
+    analysis_collection = get_analysis_collection()
+    live = {'status': ANALYSIS_PROCESSING, 'updated_at': {'$gte': datetime.utcnow() - timedelta(seconds=stale_after)}}
+    if analysis_collection.delete_one({'_id': analysis_id, '$nor': [live]}).deleted_count:
+        return True
+    if analysis_collection.count_documents({'_id': analysis_id}, limit=1):
+        return False
+    return None
+
+
+def delete_analysis_buckets(analysis_id: ObjectId) -> int:
+    """Delete all bucket documents of an analysis and return how many were deleted."""
+    return get_analysis_buckets_collection().delete_many({'analysis_id': analysis_id}).deleted_count
+
+
+class BucketWriter:
+    """
+    Collects the frames of an analysis and writes them as time buckets.
+
+    Frames must be added in timestamp order. A bucket is packed as soon as a
+    frame of a later bucket arrives; packed buckets are written with
+    insert_many once `write_batch` of them are pending, and on flush(). Every
+    write is followed by a checkpoint of the writer's segment.
+    """
+
+    def __init__(
+        self,
+        analysis_id: ObjectId,
+        segment_index: int,
+        bucket_frames: int,
+        fps: float,
+        compression: str,
+        write_batch: int = 1
+    ):
+        """
+        Args:
+            analysis_id: The ObjectId of the analysis header
+            segment_index: Index of the segment the frames belong to (for checkpoints)
+            bucket_frames: Number of video frames (not sampled frames) per bucket
+            fps: Frames per second of the video
+            compression: Compression of the packed landmark blocks
+            write_batch: Number of packed buckets sent per insert_many
+        """
+        self.analysis_id = analysis_id
+        self.segment_index = segment_index
+        self.bucket_frames = max(1, bucket_frames)
+        self.fps = fps
+        self.compression = compression
+        self.write_batch = max(1, write_batch)
+
+        self.frame_count = 0
+        self.carried_forward_count = 0
+        self.bucket_count = 0
+        self.last_timestamp: Optional[float] = None
+        self.max_x = 0.0
+        self.max_y = 0.0
+
+        self._buffer = LandmarkBuffer()
+        self._bucket_index: Optional[int] = None
+        self._carried_forward: List[int] = []
+        # Frames of the additional models in the current bucket: {model: ([timestamps], [arrays])}
+        self._model_frames: Dict[str, Tuple[List[float], List[np.ndarray]]] = {}
+        self._pending: List[Dict[str, Any]] = []
+
+    def add_landmark_list(self, frame_index: int, timestamp_seconds: float, landmark_list):
+        """
+        Add the landmarks of one sampled frame.
+
+        Args:
+            frame_index: Index of the frame in the video
+            timestamp_seconds: Frame timestamp in seconds
+            landmark_list: Repeated landmark field (e.g. results.pose_landmarks.landmark)
+        """
+        bucket_index = frame_index // self.bucket_frames
+        if bucket_index != self._bucket_index:
+            self._close_bucket()
+            self._bucket_index = bucket_index
+
+        self._buffer.append_landmark_list(timestamp_seconds, landmark_list)
+        self.frame_count += 1
+        self.last_timestamp = timestamp_seconds
+
+    def add_landmarks(
+        self,
+        frame_index: int,
+        timestamp_seconds: float,
+        values: np.ndarray,
+        carried_forward: bool = False,
+        model_landmarks: Optional[Dict[str, np.ndarray]] = None
+    ):
+        """
+        Add the landmarks of one frame from a (33, 4) array.
+
+        Args:
+            frame_index: Index of the frame in the video
+            timestamp_seconds: Frame timestamp in seconds
+            values: Landmark array of x, y, z, visibility rows
+            carried_forward: The landmarks were copied from the previous analyzed frame
+            model_landmarks: Landmark arrays of additional models that ran on the frame, by model name
+        """
+        bucket_index = frame_index // self.bucket_frames
+        if bucket_index != self._bucket_index:
+            self._close_bucket()
+            self._bucket_index = bucket_index
+
+        position = self._buffer.append(timestamp_seconds, values)
+        if carried_forward:
+            self._carried_forward.append(position)
+            self.carried_forward_count += 1
+        if model_landmarks:
+            for model, landmarks in model_landmarks.items():
+                model_timestamps, model_arrays = self._model_frames.setdefault(model, ([], []))
+                model_timestamps.append(timestamp_seconds)
+                model_arrays.append(landmarks)
+        self.frame_count += 1
+        self.last_timestamp = timestamp_seconds
+
+    def flush(self):
+        """Pack the current bucket and write all pending buckets."""
+        self._close_bucket()
+        self._write_pending()
+
+    def _close_bucket(self):
+        if self._bucket_index is None or len(self._buffer) == 0:
+            return
+
+        bucket_max_x = self._buffer.max_x
+        bucket_max_y = self._buffer.max_y
+        self.max_x = max(self.max_x, bucket_max_x)
+        self.max_y = max(self.max_y, bucket_max_y)
+
+        bucket = {
+            'analysis_id': self.analysis_id,
+            'bucket_index': self._bucket_index,
+            'start_time': self._bucket_index * self.bucket_frames / self.fps,
+            'frame_count': len(self._buffer),
+            'timestamps': self._buffer.timestamps.tolist(),
+            'landmarks': pack_landmarks(self._buffer.landmarks, self.compression),
+            'carried_forward': self._carried_forward,
+            'max_x': bucket_max_x,
+            'max_y': bucket_max_y
+        }
+        if self._model_frames:
+            bucket['models'] = {
+                model: {
+                    'timestamps': model_timestamps,
+                    'landmarks': pack_landmarks(np.stack(model_arrays), self.compression)
+                }
+                for model, (model_timestamps, model_arrays) in self._model_frames.items()
+            }
+            bucket['model_frame_counts'] = {
+                model: len(model_timestamps) for model, (model_timestamps, _) in self._model_frames.items()
+            }
+
+        self._pending.append(bucket)
+        self.bucket_count += 1
+        self._buffer.clear()
+        self._carried_forward = []
+        self._model_frames = {}
+        self._bucket_index = None
+
+        if len(self._pending) >= self.write_batch:
+            self._write_pending()
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+
+        with STAGE_SECONDS.time(stage=STAGE_STORAGE_WRITE):
+            get_analysis_buckets_collection().insert_many(self._pending, ordered=False)
+            last_bucket = self._pending[-1]
+            self._pending = []
+
+            record_checkpoint(self.analysis_id, self.segment_index, {
+                'next_frame': (last_bucket['bucket_index'] + 1) * self.bucket_frames,
+                'timestamp': last_bucket['timestamps'][-1],
+                'complete': False
+            })
@@ -1,6 +1,38 @@
+import logging
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
 
 
 class AnalysisApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analysis_api'
+
+    def ready(self):
+        # Only check the indexes of a serving process, not of other management commands
+        if os.path.basename(sys.argv[0]) == 'manage.py' and sys.argv[1:2] != ['runserver']:
+            return
+
+        config = settings.MONGODB_CONFIG
+        if config['ensure_indexes'] or config['check_indexes']:
+            # In the background so an unreachable database does not block the startup
+            threading.Thread(target=_check_indexes, name='mongodb-index-check', daemon=True).start()
+
+
+def _check_indexes():
+    from .db_connection import ensure_indexes, check_indexes
+
+    if settings.MONGODB_CONFIG['ensure_indexes']:
+        try:
+            for collection_name, names in ensure_indexes().items():
+                logger.info("Created MongoDB indexes on '%s': %s", collection_name, ', '.join(names))
+        except Exception as e:
+            logger.error("Could not create MongoDB indexes: %s", e)
+    else:
+        check_indexes()
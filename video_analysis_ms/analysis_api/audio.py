@@ -0,0 +1,514 @@
+"""
+Voice volume and pitch of a video's audio track.
+
+The audio track is decoded by an ffmpeg subprocess into mono float32 PCM,
+which is read from its stdout pipe in chunks of AUDIO_ANALYSIS_CONFIG
+['chunk_duration'] seconds, so the track is never held in memory as a
+whole. AudioFeatureExtractor cuts the stream into overlapping analysis
+frames and computes for all frames of a chunk at once:
+
+- loudness: RMS level in dBFS
+- pitch: fundamental frequency in Hz with the YIN estimator (de Cheveigne
+  and Kawahara, 2002): the difference function of every frame is computed
+  with one FFT cross-correlation, and the first lag whose cumulative mean
+  normalized difference is a local minimum below `voicing_threshold` is the
+  pitch period. Frames without such a lag, or quieter than `silence_db`, are
+  unvoiced (NaN).
+
+The contours are extracted in a thread while the video is analyzed and are
+then aligned to the stored pose frames: every frame gets the energy mean
+loudness and the geometric mean pitch of the audio frames closest to it in
+time (see align_audio_features()). They are stored in the `audio` field of
+the analysis buckets, one value per frame next to the bucket's `timestamps`,
+with a summary on the analysis header:
+
+    'audio': {
+        'sample_rate': 16000,
+        'duration': 62.4,
+        'loudness_db': -24.3,
+        'voiced_ratio': 0.61,
+        'pitch_median': 142.0,
+        'pitch_range': [118.5, 187.2]
+    }
+
+Without ffmpeg, or for videos without an audio track, the analysis is stored
+without audio features.
+"""
+import logging
+import math
+import subprocess
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from .db_connection import get_analysis_collection, get_analysis_buckets_collection
+
+
+logger = logging.getLogger(__name__)
+
+
+# Floor of the loudness of digital silence, in dBFS
+_MIN_DB = -100.0
+
+_BYTES_PER_SAMPLE = 4
+
+
+class AudioUnavailableError(RuntimeError):
+    """The audio track of a video cannot be decoded (no ffmpeg, no audio stream)."""
+
+
+def read_audio_chunks(
+    video_path: str,
+    ffmpeg_path: str = 'ffmpeg',
+    sample_rate: int = 16000,
+    chunk_samples: int = 16000,
+    stop: Optional[threading.Event] = None
+) -> Iterator[np.ndarray]:
+    """
+    Decode the audio track of a video with ffmpeg and yield it in chunks.
+
+    Args:
+        video_path: Path to the video file
+        ffmpeg_path: ffmpeg executable
+        sample_rate: Sample rate the track is resampled to
+        chunk_samples: Samples per yielded chunk (the last chunk may be shorter)
+        stop: Event that ends decoding early when set
+
+    Yields:
+        Mono float32 sample arrays in [-1, 1]
+
+    Raises:
+        AudioUnavailableError: If ffmpeg is missing or the video has no decodable audio
+    """
+    command = [
+        ffmpeg_path, '-nostdin', '-loglevel', 'error',
+        '-i', video_path,
+        '-vn', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 'f32le', '-'
+    ]
+    # stderr goes to a file: a pipe that is only read at the end blocks ffmpeg once it is full
+    stderr = tempfile.TemporaryFile()
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+    except OSError as e:
+        stderr.close()
+        raise AudioUnavailableError(f"Cannot run {ffmpeg_path}: {e}")
+
+    samples_read = 0
+    try:
+        chunk_bytes = chunk_samples * _BYTES_PER_SAMPLE
+        remainder = b''
+        while stop is None or not stop.is_set():
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % _BYTES_PER_SAMPLE
+            remainder = data[usable:]
+            chunk = np.frombuffer(data[:usable], dtype='<f4')
+            samples_read += len(chunk)
+            yield chunk
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+        stderr.seek(0)
+        error = stderr.read().decode(errors='replace').strip()
+        stderr.close()
+
+    if samples_read == 0 and (stop is None or not stop.is_set()):
+        raise AudioUnavailableError(error or 'No audio stream')
+    if returncode != 0 and error:
+        logger.warning("ffmpeg reported an error after %d audio samples: %s", samples_read, error)
+
+
+def _fft_size(length: int) -> int:
+    """Smallest FFT length >= length with no prime factor above 5 (fast in pocketfft)."""
+    size = length
+    while True:
+        remainder = size
+        for factor in (2, 3, 5):
+            while remainder % factor == 0:
+                remainder //= factor
+        if remainder == 1:
+            return size
+        size += 1
+
+
+def estimate_pitch(
+    frames: np.ndarray,
+    sample_rate: int,
+    min_lag: int,
+    max_lag: int,
+    threshold: float
+) -> np.ndarray:
+    """
+    Estimate the fundamental frequency of audio frames with YIN.
+
+    Args:
+        frames: Audio frames (shape (frames, frame_samples)), frame_samples > max_lag
+        sample_rate: Sample rate of the frames
+        min_lag: Shortest pitch period in samples (sample_rate / max pitch)
+        max_lag: Longest pitch period in samples (sample_rate / min pitch)
+        threshold: Maximum cumulative mean normalized difference of a voiced frame
+
+    Returns:
+        float64 array of pitches in Hz, NaN for unvoiced frames
+    """
+    frame_samples = frames.shape[1]
+    window = frame_samples - max_lag
+    signal = frames.astype(np.float64)
+
+    # cross[:, lag] = sum over j < window of x[j] * x[j + lag], from one FFT convolution
+    fft_size = _fft_size(frame_samples + window - 1)
+    spectrum = np.fft.rfft(signal, fft_size, axis=1)
+    kernel = np.fft.rfft(signal[:, window - 1::-1], fft_size, axis=1)
+    cross = np.fft.irfft(spectrum * kernel, fft_size, axis=1)[:, window - 1:window + max_lag]
+
+    energy = np.zeros((len(signal), frame_samples + 1))
+    np.cumsum(signal ** 2, axis=1, out=energy[:, 1:])
+    lags = np.arange(max_lag + 1)
+    shifted_energy = energy[:, lags + window] - energy[:, lags]
+
+    # Difference function d(lag) = sum over j < window of (x[j] - x[j + lag])^2
+    difference = np.maximum(energy[:, window:window + 1] + shifted_energy - 2 * cross, 0.0)
+
+    normalized = np.ones_like(difference)
+    cumulative = np.cumsum(difference[:, 1:], axis=1)
+    np.divide(
+        difference[:, 1:] * lags[1:],
+        cumulative,
+        out=normalized[:, 1:],
+        where=cumulative > 0
+    )
+
+    candidates = normalized[:, min_lag:max_lag]
+    dips = (candidates < threshold) & (candidates <= normalized[:, min_lag + 1:max_lag + 1])
+    voiced = dips.any(axis=1)
+    lag = min_lag + np.argmax(dips, axis=1)
+
+    # Parabolic interpolation around the dip for a sub-sample period
+    rows = np.arange(len(signal))
+    before = normalized[rows, lag - 1]
+    at = normalized[rows, lag]
+    after = normalized[rows, lag + 1]
+    curvature = before - 2 * at + after
+    offset = np.divide(before - after, 2 * curvature, out=np.zeros_like(at), where=curvature > 0)
+    period = lag + np.clip(offset, -1.0, 1.0)
+
+    return np.where(voiced, sample_rate / period, np.nan)
+
+
+class AudioFeatureExtractor:
+    """
+    Loudness and pitch contours of an audio stream fed in chunks.
+
+    Analysis frames of `frame_length` seconds start every `hop_length`
+    seconds; the samples of an incomplete frame are kept for the next chunk.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_length: float = 0.04,
+        hop_length: float = 0.01,
+        min_pitch: float = 75.0,
+        max_pitch: float = 400.0,
+        voicing_threshold: float = 0.15,
+        silence_db: float = -50.0
+    ):
+        """
+        Args:
+            sample_rate: Sample rate of the fed samples
+            frame_length: Length of an analysis frame in seconds
+            hop_length: Seconds between the starts of two analysis frames
+            min_pitch: Lowest detected pitch in Hz
+            max_pitch: Highest detected pitch in Hz
+            voicing_threshold: YIN threshold, lower values accept fewer frames as voiced
+            silence_db: Frames quieter than this (dBFS) have no pitch
+        """
+        self.sample_rate = sample_rate
+        self.hop_samples = max(1, int(round(hop_length * sample_rate)))
+        self.min_lag = max(2, int(sample_rate / max_pitch))
+        self.max_lag = int(math.ceil(sample_rate / min_pitch))
+        # YIN compares a frame with itself shifted by up to max_lag samples
+        self.frame_samples = max(int(round(frame_length * sample_rate)), self.max_lag * 2)
+        self.voicing_threshold = voicing_threshold
+        self.silence_db = silence_db
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._frame_count = 0
+        self._loudness: List[np.ndarray] = []
+        self._pitch: List[np.ndarray] = []
+
+    def feed(self, samples: np.ndarray):
+        """Analyze the complete frames of the stream so far."""
+        buffer = np.concatenate([self._buffer, samples]) if len(self._buffer) else samples
+        if len(buffer) < self.frame_samples:
+            self._buffer = buffer
+            return
+
+        count = (len(buffer) - self.frame_samples) // self.hop_samples + 1
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, self.frame_samples)[::self.hop_samples][:count]
+
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        loudness = np.maximum(20 * np.log10(np.maximum(rms, 1e-10)), _MIN_DB)
+        pitch = np.full(count, np.nan)
+        audible = loudness >= self.silence_db
+        if audible.any():
+            pitch[audible] = estimate_pitch(
+                frames[audible], self.sample_rate, self.min_lag, self.max_lag, self.voicing_threshold
+            )
+
+        self._loudness.append(loudness)
+        self._pitch.append(pitch)
+        self._frame_count += count
+        self._buffer = buffer[count * self.hop_samples:].copy()
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the contours of the frames analyzed so far.
+
+        Returns:
+            Tuple of (frame center timestamps in seconds, loudness in dBFS, pitch in Hz or NaN)
+        """
+        timestamps = (
+            np.arange(self._frame_count) * self.hop_samples + self.frame_samples / 2
+        ) / self.sample_rate
+        if not self._loudness:
+            return timestamps, np.zeros(0), np.zeros(0)
+        return timestamps, np.concatenate(self._loudness), np.concatenate(self._pitch)
+
+
+def extract_audio_features(
+    video_path: str,
+    config: Dict[str, Any],
+    stop: Optional[threading.Event] = None
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Extract the loudness and pitch contours of a video's audio track.
+
+    Args:
+        video_path: Path to the video file
+        config: AUDIO_ANALYSIS_CONFIG
+        stop: Event that ends the extraction early when set
+
+    Returns:
+        AudioFeatureExtractor.result() of the track, None if the video has no
+        usable audio (or ffmpeg is not available)
+    """
+    extractor = AudioFeatureExtractor(
+        sample_rate=config['sample_rate'],
+        frame_length=config['frame_length'],
+        hop_length=config['hop_length'],
+        min_pitch=config['min_pitch'],
+        max_pitch=config['max_pitch'],
+        voicing_threshold=config['voicing_threshold'],
+        silence_db=config['silence_db']
+    )
+    chunk_samples = max(extractor.frame_samples, int(config['chunk_duration'] * config['sample_rate']))
+
+    try:
+        for chunk in read_audio_chunks(video_path, config['ffmpeg_path'], config['sample_rate'], chunk_samples, stop):
+            extractor.feed(chunk)
+    except AudioUnavailableError as e:
+        logger.warning("No audio features for %s: %s", video_path, e)
+        return None
+
+    if stop is not None and stop.is_set():
+        return None
+    return extractor.result()
+
+
+def align_audio_features(
+    frame_timestamps: np.ndarray,
+    audio_timestamps: np.ndarray,
+    loudness: np.ndarray,
+    pitch: np.ndarray,
+    max_window: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregate audio contours onto pose frame timestamps.
+
+    Every frame covers the time from the midpoint to its previous frame to
+    the midpoint to its next frame, but at most max_window / 2 on either
+    side. The loudness of a frame is the energy mean of the audio frames in
+    its window, the pitch the geometric mean of their voiced pitches.
+
+    Args:
+        frame_timestamps: Pose frame timestamps in seconds, ascending
+        audio_timestamps: Audio frame timestamps in seconds, ascending
+        loudness: Loudness of the audio frames in dBFS
+        pitch: Pitch of the audio frames in Hz, NaN where unvoiced
+        max_window: Longest time span in seconds a frame covers
+
+    Returns:
+        Tuple of (loudness, pitch) per pose frame, NaN where the window holds no (voiced) audio
+    """
+    frame_timestamps = np.asarray(frame_timestamps, dtype=np.float64)
+    if len(frame_timestamps) == 0:
+        return np.zeros(0), np.zeros(0)
+
+    midpoints = (frame_timestamps[1:] + frame_timestamps[:-1]) / 2
+    lower = np.maximum(np.concatenate([[-np.inf], midpoints]), frame_timestamps - max_window / 2)
+    upper = np.minimum(np.concatenate([midpoints, [np.inf]]), frame_timestamps + max_window / 2)
+    first = np.searchsorted(audio_timestamps, lower, side='left')
+    last = np.searchsorted(audio_timestamps, upper, side='left')
+
+    def window_sums(values):
+        cumulative = np.concatenate([[0.0], np.cumsum(values)])
+        return cumulative[last] - cumulative[first]
+
+    count = last - first
+    power = window_sums(10 ** (loudness / 10))
+    frame_loudness = np.full(len(frame_timestamps), np.nan)
+    np.divide(power, count, out=frame_loudness, where=count > 0)
+    frame_loudness = np.maximum(10 * np.log10(frame_loudness), _MIN_DB)
+
+    voiced = ~np.isnan(pitch)
+    voiced_count = window_sums(voiced)
+    log_pitch = window_sums(np.log(np.where(voiced, pitch, 1.0)))
+    frame_pitch = np.full(len(frame_timestamps), np.nan)
+    np.divide(log_pitch, voiced_count, out=frame_pitch, where=voiced_count > 0)
+
+    return frame_loudness, np.exp(frame_pitch)
+
+
+def summarize_audio_features(
+    audio_timestamps: np.ndarray,
+    loudness: np.ndarray,
+    pitch: np.ndarray,
+    sample_rate: int,
+    silence_db: float
+) -> Dict[str, Any]:
+    """Header summary of the audio contours (see module docstring)."""
+    hop = audio_timestamps[1] - audio_timestamps[0] if len(audio_timestamps) > 1 else 0.0
+    audible = loudness >= silence_db
+    voiced = ~np.isnan(pitch)
+
+    summary = {
+        'sample_rate': sample_rate,
+        'duration': _round(audio_timestamps[-1] + hop / 2) if len(audio_timestamps) else 0.0,
+        'loudness_db': None,
+        'voiced_ratio': _round(voiced.sum() / audible.sum()) if audible.any() else 0.0,
+        'pitch_median': None,
+        'pitch_range': None
+    }
+    if audible.any():
+        summary['loudness_db'] = _round(10 * np.log10(np.mean(10 ** (loudness[audible] / 10))))
+    if voiced.any():
+        low, median, high = np.percentile(pitch[voiced], [10, 50, 90])
+        summary['pitch_median'] = _round(median)
+        summary['pitch_range'] = [_round(low), _round(high)]
+    return summary
+
+
+def _round(value) -> float:
+    return round(float(value), 2)
+
+
+def _to_list(values: np.ndarray) -> List[Optional[float]]:
+    """Round to 0.01 and replace NaN by None for storage."""
+    return [None if math.isnan(value) else value for value in np.round(values, 2).tolist()]
+
+
+def store_audio_features(
+    analysis_id: ObjectId,
+    features: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    config: Dict[str, Any],
+    max_window: float
+) -> Dict[str, Any]:
+    """
+    Align audio contours to the frames of a bucketed analysis and store them.
+
+    Sets `audio` ({'loudness_db': [...], 'pitch': [...]}, one value per
+    frame) on every bucket and the summary on the header.
+
+    Args:
+        analysis_id: The ObjectId of the analysis (all buckets written)
+        features: Result of extract_audio_features()
+        config: AUDIO_ANALYSIS_CONFIG
+        max_window: Longest time span in seconds a frame covers (the longest sampling interval)
+
+    Returns:
+        The summary stored on the header
+    """
+    audio_timestamps, loudness, pitch = features
+    buckets_collection = get_analysis_buckets_collection()
+
+    buckets = list(
+        buckets_collection
+        .find({'analysis_id': analysis_id}, {'timestamps': 1})
+        .sort('bucket_index', ASCENDING)
+    )
+    frame_timestamps = np.concatenate([bucket['timestamps'] for bucket in buckets]) if buckets else np.zeros(0)
+    frame_loudness, frame_pitch = align_audio_features(
+        frame_timestamps, audio_timestamps, loudness, pitch, max_window
+    )
+
+    offset = 0
+    for bucket in buckets:
+        end = offset + len(bucket['timestamps'])
+        buckets_collection.update_one(
+            {'_id': bucket['_id']},
+            {'$set': {'audio': {
+                'loudness_db': _to_list(frame_loudness[offset:end]),
+                'pitch': _to_list(frame_pitch[offset:end])
+            }}}
+        )
+        offset = end
+
+    summary = summarize_audio_features(
+        audio_timestamps, loudness, pitch, config['sample_rate'], config['silence_db']
+    )
+    get_analysis_collection().update_one(
+        {'_id': analysis_id},
+        {'$set': {'audio': summary, 'updated_at': datetime.utcnow()}}
+    )
+    return summary
+
+
+def load_audio_series(
+    doc: Dict[str, Any],
+    start: Optional[float] = None,
+    end: Optional[float] = None
+) -> Dict[str, List[Optional[float]]]:
+    """
+    Load the per-frame audio features of a bucketed analysis.
+
+    Args:
+        doc: Analysis header document
+        start: Only include frames at or after this many seconds
+        end: Only include frames before this many seconds
+
+    Returns:
+        Dictionary with timestamps, loudness_db and pitch lists of equal length
+    """
+    query = {'analysis_id': doc['_id']}
+    if start is not None:
+        query['bucket_index'] = {'$gte': int(start // doc['bucket_duration'])}
+    if end is not None:
+        query['start_time'] = {'$lt': end}
+
+    series = {'timestamps': [], 'loudness_db': [], 'pitch': []}
+    cursor = (
+        get_analysis_buckets_collection()
+        .find(query, {'timestamps': 1, 'audio': 1})
+        .sort('bucket_index', ASCENDING)
+    )
+    for bucket in cursor:
+        audio = bucket.get('audio')
+        if audio is None:
+            continue
+        for timestamp, loudness, pitch in zip(bucket['timestamps'], audio['loudness_db'], audio['pitch']):
+            if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                series['timestamps'].append(timestamp)
+                series['loudness_db'].append(loudness)
+                series['pitch'].append(pitch)
+    return series
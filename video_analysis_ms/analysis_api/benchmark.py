@@ -0,0 +1,430 @@
+"""
+Offline throughput benchmark of the analysis pipeline.
+
+Deterministic synthetic videos (a drawn figure that MediaPipe Pose detects,
+swaying and swinging its arms over a seeded noise background) are generated
+with OpenCV and run end-to-end through VideoProcessingService, with MongoDB
+replaced by an in-memory mongomock database, so no server or network is
+needed.
+
+For every case (resolution, duration, fps) the benchmark reports:
+
+- frames_per_second: sampled frames analyzed per second of wall time
+- latency_ms: p50/p95 of the time between two consecutive sampled frames
+  (decode, color conversion, inference and storage of a frame)
+- stages_ms: mean time per frame of each stage (see metrics.STAGE_SECONDS)
+- peak_rss_mb: peak resident memory of the process during the case
+- stored_bytes_per_minute: BSON size of the analysis header and buckets per
+  minute of video
+
+Results are written as JSON; compare_results() reports the relative change
+between two result files, e.g. of two commits.
+"""
+import math
+import os
+import platform
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import bson
+import cv2
+import numpy as np
+from django.conf import settings
+from django.test import override_settings
+
+from .db_connection import MongoDBConnection
+from .estimator_pool import create_pose_estimator
+from .metrics import REGISTRY, STAGE_SECONDS
+from .services import VideoProcessingService
+
+
+DEFAULT_RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080)]
+DEFAULT_DURATIONS = [10, 30]
+DEFAULT_FPS = [25, 30]
+
+# Metrics compared by compare_results(), and whether higher values are better
+COMPARED_METRICS = [
+    ('frames_per_second', True),
+    ('latency_ms.p50', False),
+    ('latency_ms.p95', False),
+    ('peak_rss_mb', False),
+    ('stored_bytes_per_minute', False),
+]
+
+_SKIN = (140, 170, 225)
+_SHIRT = (160, 60, 40)
+_PANTS = (60, 50, 40)
+_HAIR = (30, 30, 40)
+
+
+def draw_synthetic_frame(background: np.ndarray, t: float) -> np.ndarray:
+    """
+    Draw the synthetic figure at time `t` (seconds) over a background image.
+
+    The figure is laid out on a 720 px high canvas and scaled to the frame.
+    """
+    frame = background.copy()
+    height, width = frame.shape[:2]
+    scale = height / 720.0
+    center_x = width / 2 + 40 * scale * math.sin(t * 0.8)
+    swing = 40 * math.sin(t * 2.0)
+
+    def point(x, y):
+        return int(center_x + x * scale), int(y * scale)
+
+    def thickness(value):
+        return max(1, int(value * scale))
+
+    # Legs and torso
+    cv2.line(frame, point(-30, 430), point(-45, 640), _PANTS, thickness(38))
+    cv2.line(frame, point(30, 430), point(45, 640), _PANTS, thickness(38))
+    cv2.rectangle(frame, point(-70, 200), point(70, 440), _SHIRT, -1)
+
+    # Arms swing in opposite directions
+    for side, arm_swing in ((-1, swing), (1, -swing)):
+        elbow = point(side * 120, 320 + arm_swing * 0.5)
+        hand = point(side * (130 - arm_swing), 420)
+        cv2.line(frame, point(side * 70, 215), elbow, _SHIRT, thickness(30))
+        cv2.line(frame, elbow, hand, _SKIN, thickness(24))
+        cv2.circle(frame, point(side * (130 - arm_swing), 425), thickness(16), _SKIN, -1)
+
+    # Neck and head with hair, eyes, nose and mouth
+    cv2.rectangle(frame, point(-18, 160), point(18, 205), _SKIN, -1)
+    cv2.ellipse(frame, point(0, 120), (thickness(48), thickness(60)), 0, 0, 360, _SKIN, -1)
+    cv2.ellipse(frame, point(0, 85), (thickness(50), thickness(30)), 0, 180, 360, _HAIR, -1)
+    for eye_x in (-18, 18):
+        cv2.circle(frame, point(eye_x, 115), thickness(6), (40, 30, 30), -1)
+    cv2.circle(frame, point(0, 132), thickness(4), (110, 140, 200), -1)
+    cv2.ellipse(frame, point(0, 150), (thickness(15), thickness(5)), 0, 0, 180, (60, 60, 150), -1)
+
+    return frame
+
+
+def generate_synthetic_video(
+    path: str,
+    width: int,
+    height: int,
+    fps: float,
+    duration: float,
+    seed: int = 0
+) -> str:
+    """
+    Write a deterministic synthetic test video (MPEG-4 Part 2 in an .mp4 container).
+
+    Args:
+        path: Output file path
+        width: Frame width in pixels
+        height: Frame height in pixels
+        fps: Frame rate
+        duration: Length in seconds
+        seed: Seed of the background noise
+
+    Returns:
+        The output path
+    """
+    rng = np.random.default_rng(seed)
+    background = np.empty((height, width, 3), dtype=np.uint8)
+    background[:] = (90, 110, 130)
+    noise = rng.integers(-12, 13, size=(height, width, 1), dtype=np.int16)
+    background = np.clip(background.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"Failed to open video writer for {path}")
+
+    try:
+        for frame_index in range(int(round(duration * fps))):
+            writer.write(draw_synthetic_frame(background, frame_index / fps))
+    finally:
+        writer.release()
+
+    return path
+
+
+@contextmanager
+def in_memory_mongodb() -> Iterator:
+    """
+    Replace the MongoDB connection with an in-memory mongomock database.
+
+    Yields:
+        The mongomock database
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise ImportError('The benchmark needs the mongomock package (pip install mongomock)')
+
+    previous = MongoDBConnection._instance
+
+    client = mongomock.MongoClient()
+    connection = object.__new__(MongoDBConnection)
+    connection._client = client
+    connection._db = client[settings.MONGODB_CONFIG['database']]
+    connection._pid = os.getpid()
+    MongoDBConnection._instance = connection
+
+    try:
+        yield connection._db
+    finally:
+        MongoDBConnection._instance = previous
+
+
+def _current_rss() -> int:
+    """Resident set size of this process in bytes (0 where /proc is not available)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class PeakRssMonitor:
+    """Sample the resident memory of the process in a background thread and keep the peak."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-monitor', daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+        if self.peak == 0:
+            # No /proc: fall back to the peak of the whole process (bytes on macOS), if available
+            try:
+                import resource
+            except ImportError:
+                return
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak = maxrss if platform.system() == 'Darwin' else maxrss * 1024
+
+
+class _TimedService(VideoProcessingService):
+    """VideoProcessingService that records when each sampled frame reaches the pose model."""
+
+    def __init__(self, pose):
+        super().__init__(pose=pose)
+        self.frame_starts: List[float] = []
+
+    def detect_pose_rgb(self, rgb_frame):
+        self.frame_starts.append(time.perf_counter())
+        return super().detect_pose_rgb(rgb_frame)
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    return float(np.percentile(values, percentile)) if values else None
+
+
+def _stored_bytes(db, analysis_id: str) -> int:
+    header = db['analysis'].find_one({'_id': bson.ObjectId(analysis_id)})
+    total = len(bson.encode(header))
+    for bucket in db['analysis_buckets'].find({'analysis_id': header['_id']}):
+        total += len(bson.encode(bucket))
+    return total
+
+
+def run_case(db, pose, video_dir: str, width: int, height: int, fps: float, duration: float) -> Dict[str, Any]:
+    """
+    Generate (or reuse) the synthetic video of a case and analyze it.
+
+    Args:
+        db: Database from in_memory_mongodb()
+        pose: Pose estimator to analyze with
+        video_dir: Directory of the generated videos
+        width: Frame width in pixels
+        height: Frame height in pixels
+        fps: Frame rate
+        duration: Length in seconds
+
+    Returns:
+        Measurements of the case (see module docstring)
+    """
+    name = f"{width}x{height}_{fps:g}fps_{duration:g}s"
+    filename = f"synthetic_{name}.mp4"
+    video_path = Path(video_dir) / filename
+    if not video_path.exists():
+        generate_synthetic_video(str(video_path), width, height, fps, duration)
+
+    video_id = str(db['videos'].insert_one({'filename': filename}).inserted_id)
+
+    service = _TimedService(pose)
+    # Measure the full pipeline on every run
+    service.cache_enabled = False
+    service.resume_analyses = False
+    # Segment processes would not see the in-memory database
+    service.segment_workers = 1
+
+    REGISTRY.reset()
+    with override_settings(VIDEO_STORAGE_PATH=video_dir), PeakRssMonitor() as rss:
+        started = time.perf_counter()
+        result = service.process_video(video_id, debug_visualization=False)
+        elapsed = time.perf_counter() - started
+
+    if not result['success']:
+        raise RuntimeError(f"Benchmark case {name} failed: {result.get('error')}")
+
+    frame_starts = service.frame_starts
+    latencies = [
+        (end - start) * 1000
+        for start, end in zip([started] + frame_starts[:-1], frame_starts)
+    ]
+    stages = {
+        key[0]: total / sum(counts) * 1000
+        for key, (counts, total) in STAGE_SECONDS.samples()
+        if sum(counts)
+    }
+    stored_bytes = _stored_bytes(db, result['analysis_id'])
+
+    return {
+        'name': name,
+        'width': width,
+        'height': height,
+        'fps': fps,
+        'duration': duration,
+        'frames_sampled': len(frame_starts),
+        'frames_processed': result['frames_processed'],
+        'wall_seconds': elapsed,
+        'frames_per_second': len(frame_starts) / elapsed if elapsed > 0 else None,
+        'latency_ms': {
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'max': max(latencies) if latencies else None,
+        },
+        'stages_ms': stages,
+        'peak_rss_mb': rss.peak / (1024 * 1024),
+        'stored_bytes': stored_bytes,
+        'stored_bytes_per_minute': stored_bytes / (duration / 60),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    video_dir: str,
+    resolutions: List[Tuple[int, int]] = DEFAULT_RESOLUTIONS,
+    durations: List[float] = DEFAULT_DURATIONS,
+    fps_values: List[float] = DEFAULT_FPS,
+    progress=None
+) -> Dict[str, Any]:
+    """
+    Run every combination of resolution, duration and fps.
+
+    A short warm-up video is analyzed first so graph initialization is not
+    attributed to the first case.
+
+    Args:
+        video_dir: Directory for the generated videos (reused between runs)
+        resolutions: (width, height) pairs
+        durations: Video lengths in seconds
+        fps_values: Frame rates
+        progress: Called with each finished case result
+
+    Returns:
+        Result document with the environment, configuration and case results
+    """
+    os.makedirs(video_dir, exist_ok=True)
+    cases = []
+
+    pose = create_pose_estimator()
+    try:
+        with in_memory_mongodb() as db:
+            run_case(db, pose, video_dir, 320, 180, 10, 2)
+            pose.reset()
+
+            for width, height in resolutions:
+                for duration in durations:
+                    for fps in fps_values:
+                        case = run_case(db, pose, video_dir, width, height, fps, duration)
+                        pose.reset()
+                        cases.append(case)
+                        if progress:
+                            progress(case)
+    finally:
+        pose.close()
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+        },
+        'config': {
+            'mediapipe': settings.MEDIAPIPE_CONFIG,
+            'frame_interval': settings.VIDEO_PROCESSING_CONFIG['frame_interval'],
+            'sampling_strategy': settings.VIDEO_PROCESSING_CONFIG['sampling_strategy'],
+            'compression': settings.ANALYSIS_STORAGE_CONFIG['compression'],
+        },
+        'cases': cases,
+    }
+
+
+def _lookup(case: Dict[str, Any], metric: str):
+    value = case
+    for key in metric.split('.'):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Compare the cases two benchmark runs have in common.
+
+    Args:
+        baseline: Earlier result document
+        current: New result document
+
+    Returns:
+        One entry per case and metric with both values, the relative change
+        and whether the change is an improvement
+    """
+    baseline_cases = {case['name']: case for case in baseline['cases']}
+    comparison = []
+
+    for case in current['cases']:
+        base_case = baseline_cases.get(case['name'])
+        if base_case is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old = _lookup(base_case, metric)
+            new = _lookup(case, metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            comparison.append({
+                'case': case['name'],
+                'metric': metric,
+                'baseline': old,
+                'current': new,
+                'change': change,
+                'improved': change > 0 if higher_is_better else change < 0,
+            })
+
+    return comparison
@@ -1,9 +1,86 @@
 """
 MongoDB connection and operations.
+
+The client is configured from MONGODB_CONFIG (pool size, timeouts, write
+concern and wire compression). MongoClient is not fork-safe, so a process
+that inherits the singleton from its parent (e.g. a pre-forking WSGI server
+or a forked worker) opens its own client on first use instead of reusing
+the parent's sockets.
+
+The indexes of the collections owned by this service are declared in
+INDEXES. ensure_indexes() creates them (run by the analysis workers on
+startup and by the `ensure_indexes` management command) and
+find_missing_indexes() reports the ones that do not exist yet.
 """
-from pymongo import MongoClient
+import logging
+import os
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from pymongo.write_concern import WriteConcern
 from django.conf import settings
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Job states for which at most one job per dedup_key may exist (see jobs.ACTIVE_JOB_STATES)
+_ACTIVE_JOB_STATES = ['pending', 'running']
+
+# Indexes of the collections owned by this service, by collection name
+INDEXES: Dict[str, List[IndexModel]] = {
+    'analysis': [
+        # Listing the analyses of a video, newest first
+        IndexModel([('video_id', ASCENDING), ('_id', DESCENDING)], name='video_id_newest'),
+        # Claiming a resumable analysis of a video
+        IndexModel(
+            [('video_id', ASCENDING), ('status', ASCENDING), ('created_at', DESCENDING)],
+            name='video_id_status_created_at'
+        ),
+        IndexModel([('created_at', DESCENDING)], name='created_at'),
+    ],
+    'analysis_buckets': [
+        IndexModel(
+            [('analysis_id', ASCENDING), ('bucket_index', ASCENDING)],
+            name='analysis_id_bucket_index',
+            unique=True
+        ),
+    ],
+    'analysis_jobs': [
+        # Claiming the next pending job, interactive jobs before batch jobs
+        IndexModel(
+            [('state', ASCENDING), ('priority', DESCENDING), ('available_at', ASCENDING)],
+            name='state_priority_available_at'
+        ),
+        # Reclaiming running jobs with an expired lease
+        IndexModel([('state', ASCENDING), ('lease_expires_at', ASCENDING)], name='state_lease_expires_at'),
+        # At most one pending or running job per video and options
+        IndexModel(
+            [('dedup_key', ASCENDING)],
+            name='active_dedup_key',
+            unique=True,
+            partialFilterExpression={'state': {'$in': _ACTIVE_JOB_STATES}}
+        ),
+        IndexModel([('video_id', ASCENDING), ('created_at', DESCENDING)], name='video_id_created_at'),
+        IndexModel([('batch_ids', ASCENDING)], name='batch_ids'),
+    ],
+    'analysis_lod': [
+        IndexModel(
+            [('analysis_id', ASCENDING), ('resolution', ASCENDING), ('chunk_index', ASCENDING)],
+            name='analysis_id_resolution_chunk_index',
+            unique=True
+        ),
+    ],
+    'analysis_cache': [
+        IndexModel([('analysis_id', ASCENDING)], name='analysis_id'),
+        IndexModel([('video_ids', ASCENDING)], name='video_ids'),
+        IndexModel([('last_hit_at', ASCENDING)], name='last_hit_at'),
+    ],
+}
+
+
+def _parse_write_concern(value: str):
+    """MONGODB_CONFIG['write_concern'] is a number of nodes or a tag such as 'majority'."""
+    return int(value) if str(value).isdigit() else value
 
 
 class MongoDBConnection:
@@ -11,6 +88,7 @@ class MongoDBConnection:
 
     _instance: Optional['MongoDBConnection'] = None
     _client: Optional[MongoClient] = None
+    _pid: Optional[int] = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -34,13 +112,37 @@ class MongoDBConnection:
         else:
             connection_string = f"mongodb://{config['host']}:{config['port']}"
 
-        self._client = MongoClient(connection_string)
-        self._db = self._client[config['database']]
+        options = {
+            'maxPoolSize': config['max_pool_size'],
+            'minPoolSize': config['min_pool_size'],
+            'maxIdleTimeMS': config['max_idle_time_ms'],
+            'serverSelectionTimeoutMS': config['server_selection_timeout_ms'],
+            'connectTimeoutMS': config['connect_timeout_ms'],
+            'socketTimeoutMS': config['socket_timeout_ms'],
+            'appname': config['app_name'],
+        }
+        if config['compressors']:
+            options['compressors'] = config['compressors']
+
+        self._client = MongoClient(connection_string, **options)
+        self._pid = os.getpid()
+        self._db = self._client.get_database(
+            config['database'],
+            write_concern=WriteConcern(
+                w=_parse_write_concern(config['write_concern']),
+                j=config['journal'] or None
+            )
+        )
+
+    def _reset_after_fork(self):
+        """Drop the client inherited from the parent process without closing the parent's connections."""
+        self._client = None
+        self._pid = None
 
     @property
     def db(self):
         """Get the database instance."""
-        if self._client is None:
+        if self._client is None or self._pid != os.getpid():
             self._connect()
         return self._db
 
@@ -51,8 +153,80 @@ class MongoDBConnection:
     def close(self):
         """Close the MongoDB connection."""
         if self._client:
-            self._client.close()
+            if self._pid == os.getpid():
+                self._client.close()
             self._client = None
+            self._pid = None
+
+
+def _reset_connection_after_fork():
+    if MongoDBConnection._instance is not None:
+        MongoDBConnection._instance._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_connection_after_fork)
+
+
+def _index_key(index: Dict[str, Any]) -> Tuple:
+    return tuple((field, direction) for field, direction in index['key'].items())
+
+
+def find_missing_indexes() -> Dict[str, List[str]]:
+    """
+    Compare the declared INDEXES with the indexes that exist in the database.
+
+    Indexes are matched by their keys, so an index created by hand under a
+    different name counts as present.
+
+    Returns:
+        Names of the missing indexes by collection name (empty if all exist)
+    """
+    db = MongoDBConnection().db
+    missing = {}
+
+    for collection_name, indexes in INDEXES.items():
+        existing = {_index_key(index) for index in db[collection_name].list_indexes()}
+        names = [
+            index.document['name'] for index in indexes
+            if _index_key(index.document) not in existing
+        ]
+        if names:
+            missing[collection_name] = names
+
+    return missing
+
+
+def ensure_indexes() -> Dict[str, List[str]]:
+    """
+    Create the declared INDEXES that do not exist yet.
+
+    Returns:
+        Names of the created indexes by collection name
+    """
+    db = MongoDBConnection().db
+    created = {}
+
+    for collection_name, names in find_missing_indexes().items():
+        indexes = [index for index in INDEXES[collection_name] if index.document['name'] in names]
+        created[collection_name] = db[collection_name].create_indexes(indexes)
+
+    return created
+
+
+def check_indexes():
+    """Log the declared indexes that are missing in the database (run on startup)."""
+    try:
+        missing = find_missing_indexes()
+    except PyMongoError as e:
+        logger.error("Could not check MongoDB indexes: %s", e)
+        return
+
+    for collection_name, names in missing.items():
+        logger.warning(
+            "Missing MongoDB indexes on '%s': %s (run `python manage.py ensure_indexes`)",
+            collection_name, ', '.join(names)
+        )
 
 
 def get_videos_collection():
@@ -63,3 +237,38 @@ def get_videos_collection():
 def get_analysis_collection():
     """Get the analysis collection."""
     return MongoDBConnection().get_collection('analysis')
+
+
+def get_analysis_buckets_collection():
+    """Get the collection of time buckets of bucketed analyses."""
+    return MongoDBConnection().get_collection('analysis_buckets')
+
+
+def get_analysis_lod_collection():
+    """Get the collection of level-of-detail (downsampled) landmark series of analyses."""
+    return MongoDBConnection().get_collection('analysis_lod')
+
+
+def get_analysis_cache_collection():
+    """Get the content-addressed analysis cache collection."""
+    return MongoDBConnection().get_collection('analysis_cache')
+
+
+def get_video_hashes_collection():
+    """Get the collection memoizing video file content hashes."""
+    return MongoDBConnection().get_collection('video_hashes')
+
+
+def get_jobs_collection():
+    """Get the analysis jobs collection."""
+    return MongoDBConnection().get_collection('analysis_jobs')
+
+
+def get_delivery_metrics_collection():
+    """Get the collection of speech-delivery metrics, one document per analysis."""
+    return MongoDBConnection().get_collection('delivery_metrics')
+
+
+def get_metrics_collection():
+    """Get the collection of metrics snapshots published by the analysis workers."""
+    return MongoDBConnection().get_collection('analysis_metrics')
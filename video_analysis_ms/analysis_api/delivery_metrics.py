@@ -0,0 +1,397 @@
+"""
+Speech-delivery metrics computed from a stored landmark series.
+
+The client app scores a talk on a few topics (hip movement, hand gestures,
+eye contact, stage usage). Instead of downloading the whole landmark series
+and computing them on the phone, the service derives them here and stores
+one small document per analysis in the `delivery_metrics` collection:
+
+    {
+        '_id': ObjectId(<analysis id>),
+        'video_id': '...',
+        'version': 1,
+        'duration': 62.4,
+        'pose_coverage': 0.97,
+        'hips': {'sway_amplitude': 0.08, 'sway_frequency': 0.35},
+        'hand_gestures': {'rate_per_minute': 14.2, 'active_ratio': 0.31, 'openness': 1.4, 'visible_ratio': 0.9},
+        'eye_contact': {'facing_ratio': 0.82, 'longest_look_away': 3.2},
+        'stage': {'distance': 5.1, 'coverage': 0.21, 'moving_ratio': 0.12},
+        'timeline': {'window': 10.0, 'hip_sway': [...], 'gesture': [...], 'facing': [...], 'movement': [...]}
+    }
+
+Distances and speeds are measured in shoulder widths (the median distance
+between the shoulders over the video), so they do not depend on how far the
+speaker stands from the camera; stage `coverage` is a fraction of the frame
+width. The timeline holds one value per `window` seconds.
+
+The series is first resampled to a uniform grid (visibility-weighted, see
+temporal.interpolate_landmarks()), so adaptive sampling, keyframes and
+duplicate frames all yield comparable metrics. Grid points further than
+`max_gap` seconds from a detected pose are left out. All metrics are
+computed with array operations over the whole series.
+"""
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from django.conf import settings
+
+from .storage import POSE_LANDMARK_NAMES, load_landmark_series
+from .models import X, Y, VISIBILITY
+from .temporal import interpolate_landmarks
+from .analysis_store import attach_buckets, ANALYSIS_COMPLETE
+from .db_connection import get_analysis_collection, get_delivery_metrics_collection
+
+
+# Stored documents of an older version are recomputed when requested
+DELIVERY_METRICS_VERSION = 1
+
+NOSE = POSE_LANDMARK_NAMES.index('nose')
+LEFT_EYE = POSE_LANDMARK_NAMES.index('left_eye')
+RIGHT_EYE = POSE_LANDMARK_NAMES.index('right_eye')
+LEFT_SHOULDER = POSE_LANDMARK_NAMES.index('left_shoulder')
+RIGHT_SHOULDER = POSE_LANDMARK_NAMES.index('right_shoulder')
+LEFT_WRIST = POSE_LANDMARK_NAMES.index('left_wrist')
+RIGHT_WRIST = POSE_LANDMARK_NAMES.index('right_wrist')
+LEFT_HIP = POSE_LANDMARK_NAMES.index('left_hip')
+RIGHT_HIP = POSE_LANDMARK_NAMES.index('right_hip')
+
+# Landmarks below this visibility are treated as not visible
+MIN_VISIBILITY = 0.5
+# Seconds of the moving average hip sway is measured against (slower movement is walking)
+SWAY_BASELINE = 4.0
+# Hip sway frequencies considered, in Hz
+SWAY_BAND = (0.1, 2.0)
+# Wrist speed (shoulder widths per second) from which a hand counts as gesturing
+GESTURE_SPEED = 1.0
+# Gestures shorter than this many seconds are ignored
+MIN_GESTURE_DURATION = 0.3
+# Horizontal nose offset from between the eyes (in eye distances) up to which the speaker faces the camera
+FACING_YAW = 0.35
+# Seconds of the moving average the stage position is smoothed with
+STAGE_SMOOTHING = 1.0
+# Hip speed (shoulder widths per second) from which the speaker counts as moving across the stage
+MOVING_SPEED = 0.5
+
+# Decimal places of the stored values
+_PRECISION = 4
+
+
+def resample_series(
+    timestamps: np.ndarray,
+    landmarks: np.ndarray,
+    rate: float,
+    max_gap: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Resample a landmark series to a uniform time grid.
+
+    Args:
+        timestamps: Frame timestamps in seconds, ascending
+        landmarks: (frames, 33, 4) landmark array
+        rate: Samples per second of the grid
+        max_gap: Grid points further than this many seconds from a frame are invalid
+
+    Returns:
+        Tuple of grid timestamps, (samples, 33, 4) landmarks and the boolean valid mask
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    grid = np.arange(timestamps[0], timestamps[-1] + 0.5 / rate, 1.0 / rate)
+    resampled = interpolate_landmarks(timestamps, landmarks, grid)
+
+    # Distance of every grid point to the closest frame
+    right = np.clip(np.searchsorted(timestamps, grid), 0, len(timestamps) - 1)
+    left = np.clip(right - 1, 0, len(timestamps) - 1)
+    distance = np.minimum(np.abs(timestamps[right] - grid), np.abs(grid - timestamps[left]))
+    return grid, resampled, distance <= max_gap
+
+
+def moving_average(values: np.ndarray, valid: np.ndarray, size: int) -> np.ndarray:
+    """
+    Centered moving average over `size` samples that ignores invalid samples.
+
+    Args:
+        values: 1-D series
+        valid: Boolean mask of the samples to include
+        size: Window length in samples
+
+    Returns:
+        Averaged series (the value itself where the window holds no valid sample)
+    """
+    # np.convolve(mode='same') returns the longer of the two inputs, so the window may not exceed the series
+    size = max(1, min(size, len(values)))
+    kernel = np.ones(size)
+    weights = valid.astype(np.float64)
+    totals = np.convolve(np.where(valid, values, 0.0), kernel, mode='same')
+    counts = np.convolve(weights, kernel, mode='same')
+    return np.divide(totals, counts, out=np.array(values, dtype=np.float64), where=counts > 0)
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start indices and lengths of the runs of True in a boolean mask."""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    starts = edges[::2]
+    return starts, edges[1::2] - starts
+
+
+def _ratio(mask: np.ndarray, valid: np.ndarray) -> Optional[float]:
+    count = np.count_nonzero(valid)
+    return float(np.count_nonzero(mask & valid) / count) if count else None
+
+
+def _window_means(values: np.ndarray, valid: np.ndarray, window_samples: int) -> list:
+    """Mean of the valid samples per window, None for windows without any."""
+    starts = np.arange(0, len(values), window_samples)
+    totals = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+    means = np.divide(totals, counts, out=np.zeros_like(totals, dtype=np.float64), where=counts > 0)
+    return [_round(mean) if count else None for mean, count in zip(means, counts)]
+
+
+def _round(value) -> Optional[float]:
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), _PRECISION)
+
+
+def _hip_metrics(
+    hip_x: np.ndarray,
+    valid: np.ndarray,
+    scale: float,
+    rate: float
+) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Side-to-side hip sway around the slow stage position."""
+    baseline = moving_average(hip_x, valid, int(SWAY_BASELINE * rate))
+    sway = np.where(valid, (hip_x - baseline) / scale, 0.0)
+
+    amplitude = np.sqrt(np.mean(sway[valid] ** 2)) if valid.any() else None
+
+    frequency = None
+    if np.count_nonzero(valid) >= 2 * rate / SWAY_BAND[0]:
+        spectrum = np.abs(np.fft.rfft(sway - sway[valid].mean() * valid))
+        frequencies = np.fft.rfftfreq(len(sway), 1.0 / rate)
+        band = (frequencies >= SWAY_BAND[0]) & (frequencies <= SWAY_BAND[1])
+        if band.any() and spectrum[band].max() > 0:
+            frequency = frequencies[band][np.argmax(spectrum[band])]
+
+    return {
+        'sway_amplitude': _round(amplitude),
+        'sway_frequency': _round(frequency)
+    }, np.abs(sway)
+
+
+def _hand_metrics(
+    landmarks: np.ndarray,
+    valid: np.ndarray,
+    scale: float,
+    rate: float
+) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Gesture rate and share of time from wrist speed, openness from the distance between the wrists."""
+    wrists = landmarks[:, [LEFT_WRIST, RIGHT_WRIST]]
+    visible = (wrists[:, :, VISIBILITY] >= MIN_VISIBILITY) & valid[:, None]
+
+    positions = wrists[:, :, [X, Y]].astype(np.float64)
+    speed = np.zeros(visible.shape)
+    speed[1:] = np.linalg.norm(np.diff(positions, axis=0), axis=2) * rate / scale
+    # A speed needs the wrist visible in both samples
+    speed[1:] *= visible[1:] & visible[:-1]
+
+    gesturing = (speed >= GESTURE_SPEED).any(axis=1)
+    _, lengths = _runs(gesturing)
+    gestures = np.count_nonzero(lengths >= max(1, round(MIN_GESTURE_DURATION * rate)))
+
+    any_visible = visible.any(axis=1)
+    minutes = np.count_nonzero(any_visible) / rate / 60
+    both_visible = visible.all(axis=1)
+    openness = np.abs(positions[:, 0, 0] - positions[:, 1, 0]) / scale
+
+    return {
+        'rate_per_minute': _round(gestures / minutes) if minutes > 0 else None,
+        'active_ratio': _round(_ratio(gesturing, any_visible)),
+        'openness': _round(openness[both_visible].mean()) if both_visible.any() else None,
+        'visible_ratio': _round(_ratio(any_visible, valid))
+    }, gesturing.astype(np.float64)
+
+
+def _eye_contact_metrics(
+    landmarks: np.ndarray,
+    valid: np.ndarray,
+    rate: float
+) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Facing the camera, from the horizontal offset of the nose from between the eyes."""
+    eye_x = landmarks[:, [LEFT_EYE, RIGHT_EYE], X].astype(np.float64)
+    eye_distance = np.abs(eye_x[:, 0] - eye_x[:, 1])
+    yaw = np.divide(
+        landmarks[:, NOSE, X] - eye_x.mean(axis=1),
+        eye_distance,
+        out=np.full(len(landmarks), np.inf),
+        where=eye_distance > 0
+    )
+
+    face_visible = landmarks[:, [NOSE, LEFT_EYE, RIGHT_EYE], VISIBILITY].min(axis=1) >= MIN_VISIBILITY
+    facing = valid & face_visible & (np.abs(yaw) <= FACING_YAW)
+
+    _, lengths = _runs(valid & ~facing)
+    longest = lengths.max() / rate if len(lengths) else 0.0
+
+    return {
+        'facing_ratio': _round(_ratio(facing, valid)),
+        'longest_look_away': _round(longest)
+    }, facing.astype(np.float64)
+
+
+def _stage_metrics(
+    hip_x: np.ndarray,
+    hip_y: np.ndarray,
+    valid: np.ndarray,
+    scale: float,
+    rate: float
+) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Distance walked and share of the frame width used, from the smoothed hip center."""
+    size = int(STAGE_SMOOTHING * rate)
+    x = moving_average(hip_x, valid, size)
+    y = moving_average(hip_y, valid, size)
+
+    steps = np.hypot(np.diff(x), np.diff(y)) / scale
+    steps *= valid[1:] & valid[:-1]
+    speed = np.zeros(len(x))
+    speed[1:] = steps * rate
+
+    coverage = None
+    if valid.any():
+        low, high = np.percentile(x[valid], [5, 95])
+        coverage = high - low
+
+    return {
+        'distance': _round(steps.sum()),
+        'coverage': _round(coverage),
+        'moving_ratio': _round(_ratio(speed >= MOVING_SPEED, valid))
+    }, speed
+
+
+def compute_delivery_metrics(
+    timestamps,
+    landmarks: np.ndarray,
+    rate: float = 5.0,
+    window: float = 10.0,
+    max_gap: float = 1.0
+) -> Dict[str, Any]:
+    """
+    Compute the speech-delivery metrics of a landmark series.
+
+    Args:
+        timestamps: Frame timestamps in seconds
+        landmarks: (frames, 33, 4) landmark array
+        rate: Samples per second the series is resampled to
+        window: Seconds per timeline value
+        max_gap: Seconds without a detected pose after which the speaker counts as not visible
+
+    Returns:
+        The metrics (see module docstring), all None when there are fewer than two frames
+    """
+    empty = {
+        'duration': 0.0,
+        'pose_coverage': None,
+        'hips': {'sway_amplitude': None, 'sway_frequency': None},
+        'hand_gestures': {'rate_per_minute': None, 'active_ratio': None, 'openness': None, 'visible_ratio': None},
+        'eye_contact': {'facing_ratio': None, 'longest_look_away': None},
+        'stage': {'distance': None, 'coverage': None, 'moving_ratio': None},
+        'timeline': {'window': window, 'hip_sway': [], 'gesture': [], 'facing': [], 'movement': []}
+    }
+    if len(timestamps) < 2:
+        return empty
+
+    grid, series, valid = resample_series(timestamps, landmarks, rate, max_gap)
+
+    shoulder_width = np.hypot(
+        series[:, LEFT_SHOULDER, X] - series[:, RIGHT_SHOULDER, X],
+        series[:, LEFT_SHOULDER, Y] - series[:, RIGHT_SHOULDER, Y]
+    )
+    shoulder_visibility = series[:, [LEFT_SHOULDER, RIGHT_SHOULDER], VISIBILITY].min(axis=1)
+    shoulders_visible = valid & (shoulder_visibility >= MIN_VISIBILITY)
+    if not shoulders_visible.any():
+        return {**empty, 'duration': _round(grid[-1] - grid[0]), 'pose_coverage': _round(valid.mean())}
+    scale = max(float(np.median(shoulder_width[shoulders_visible])), 1e-3)
+
+    hip_x = series[:, [LEFT_HIP, RIGHT_HIP], X].mean(axis=1).astype(np.float64)
+    hip_y = series[:, [LEFT_HIP, RIGHT_HIP], Y].mean(axis=1).astype(np.float64)
+
+    hips, sway = _hip_metrics(hip_x, valid, scale, rate)
+    hands, gesturing = _hand_metrics(series, valid, scale, rate)
+    eye_contact, facing = _eye_contact_metrics(series, valid, rate)
+    stage, speed = _stage_metrics(hip_x, hip_y, valid, scale, rate)
+
+    window_samples = max(1, int(round(window * rate)))
+    return {
+        'duration': _round(grid[-1] - grid[0]),
+        'pose_coverage': _round(valid.mean()),
+        'hips': hips,
+        'hand_gestures': hands,
+        'eye_contact': eye_contact,
+        'stage': stage,
+        'timeline': {
+            'window': window,
+            'hip_sway': _window_means(sway, valid, window_samples),
+            'gesture': _window_means(gesturing, valid, window_samples),
+            'facing': _window_means(facing, valid, window_samples),
+            'movement': _window_means(speed, valid, window_samples)
+        }
+    }
+
+
+def update_delivery_metrics(analysis_id: ObjectId) -> Optional[Dict[str, Any]]:
+    """
+    Compute and store the delivery metrics of a complete analysis.
+
+    Args:
+        analysis_id: The ObjectId of the analysis
+
+    Returns:
+        The stored metrics document, None if the analysis does not exist or is not complete
+    """
+    doc = get_analysis_collection().find_one({'_id': analysis_id})
+    if doc is None or doc.get('status', ANALYSIS_COMPLETE) != ANALYSIS_COMPLETE:
+        return None
+
+    config = settings.DELIVERY_METRICS_CONFIG
+    timestamps, landmarks = load_landmark_series(attach_buckets(doc))
+    metrics = compute_delivery_metrics(
+        timestamps,
+        landmarks,
+        rate=config['sample_rate'],
+        window=config['window'],
+        max_gap=config['max_gap']
+    )
+
+    metrics_doc = {
+        '_id': analysis_id,
+        'video_id': doc.get('video_id'),
+        'version': DELIVERY_METRICS_VERSION,
+        'created_at': datetime.utcnow().isoformat(),
+        **metrics
+    }
+    get_delivery_metrics_collection().replace_one({'_id': analysis_id}, metrics_doc, upsert=True)
+    return metrics_doc
+
+
+def get_delivery_metrics(analysis_id: ObjectId) -> Optional[Dict[str, Any]]:
+    """
+    Get the delivery metrics of an analysis, computing them if they are missing or outdated.
+
+    Args:
+        analysis_id: The ObjectId of the analysis
+
+    Returns:
+        The metrics document, None if the analysis does not exist or is not complete
+    """
+    metrics_doc = get_delivery_metrics_collection().find_one({'_id': analysis_id})
+    if metrics_doc is not None and metrics_doc.get('version') == DELIVERY_METRICS_VERSION:
+        return metrics_doc
+    return update_delivery_metrics(analysis_id)
+
+
+def delete_delivery_metrics(analysis_id: ObjectId):
+    """Delete the stored delivery metrics of an analysis."""
+    get_delivery_metrics_collection().delete_one({'_id': analysis_id})
@@ -0,0 +1,217 @@
+"""
+Process-wide pool of pre-initialized MediaPipe Pose estimators.
+
+Loading the Pose graph is expensive, so estimators are created once and
+checked out per video instead of being built for every request. The pool
+size also bounds how many videos are analyzed concurrently in a process.
+"""
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+import mediapipe as mp
+from django.conf import settings
+
+from .metrics import REGISTRY, ESTIMATORS, ESTIMATOR_CHECKOUT_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+
+class EstimatorPoolExhausted(Exception):
+    """Raised when no estimator becomes available within the checkout timeout."""
+
+
+def create_pose_estimator():
+    """
+    Create a MediaPipe Pose estimator from MEDIAPIPE_CONFIG.
+
+    Returns:
+        A new mp.solutions.pose.Pose instance
+    """
+    mp_config = settings.MEDIAPIPE_CONFIG
+    return mp.solutions.pose.Pose(
+        min_detection_confidence=mp_config['min_detection_confidence'],
+        min_tracking_confidence=mp_config['min_tracking_confidence'],
+        model_complexity=mp_config['model_complexity']
+    )
+
+
+class PoseEstimatorPool:
+    """Bounded pool of warm Pose estimators with checkout/checkin."""
+
+    def __init__(self, size: int, checkout_timeout: float):
+        self.size = max(1, size)
+        self.checkout_timeout = checkout_timeout
+
+        # LIFO so the most recently used (warmest) estimator is handed out first
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._discarded = 0
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Create estimators until the pool is full."""
+        while True:
+            estimator = self._create_if_below_size()
+            if estimator is None:
+                break
+            self._idle.put(estimator)
+
+    def checkout(self, timeout: Optional[float] = None):
+        """
+        Take an estimator out of the pool.
+
+        Args:
+            timeout: Seconds to wait for a free estimator, defaults to the pool's checkout timeout
+
+        Returns:
+            A Pose estimator with fresh tracking state
+
+        Raises:
+            EstimatorPoolExhausted: If all estimators stay in use for the whole timeout
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        estimator = self._create_if_below_size()
+        if estimator is not None:
+            return estimator
+
+        if timeout is None:
+            timeout = self.checkout_timeout
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise EstimatorPoolExhausted(
+                f"No pose estimator available after {timeout}s (pool size {self.size})"
+            )
+
+    def checkin(self, estimator, healthy: bool = True):
+        """
+        Return an estimator to the pool.
+
+        The estimator is reset so tracking state from one video never leaks
+        into the next one. Unhealthy estimators (or ones that fail to reset)
+        are closed and replaced lazily on a later checkout.
+
+        Args:
+            estimator: Estimator obtained from checkout()
+            healthy: False if the estimator raised while in use
+        """
+        if healthy:
+            try:
+                estimator.reset()
+            except Exception as e:
+                logger.warning("Pose estimator failed to reset, discarding it: %s", e)
+                healthy = False
+
+        if healthy:
+            self._idle.put(estimator)
+            return
+
+        try:
+            estimator.close()
+        except Exception:
+            pass
+
+        with self._lock:
+            self._created -= 1
+            self._discarded += 1
+
+    @contextmanager
+    def estimator(self, timeout: Optional[float] = None):
+        """Check out an estimator for the duration of a `with` block."""
+        started = time.perf_counter()
+        estimator = self.checkout(timeout)
+        ESTIMATOR_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+        healthy = True
+        try:
+            yield estimator
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.checkin(estimator, healthy)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool utilization counters."""
+        with self._lock:
+            created = self._created
+            discarded = self._discarded
+
+        idle = self._idle.qsize()
+        return {
+            'size': self.size,
+            'created': created,
+            'idle': idle,
+            'in_use': created - idle,
+            'discarded': discarded
+        }
+
+    def close(self):
+        """Close all idle estimators."""
+        while True:
+            try:
+                estimator = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            estimator.close()
+            with self._lock:
+                self._created -= 1
+
+    def _create_if_below_size(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+
+        try:
+            return create_pose_estimator()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+
+_pool: Optional[PoseEstimatorPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_estimator_pool() -> PoseEstimatorPool:
+    """Get the process-wide estimator pool, creating it on first use."""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = settings.ESTIMATOR_POOL_CONFIG
+                _pool = PoseEstimatorPool(
+                    size=config['size'],
+                    checkout_timeout=config['checkout_timeout']
+                )
+    return _pool
+
+
+def _collect_pool_metrics():
+    if _pool is None:
+        return
+    stats = _pool.stats()
+    ESTIMATORS.set(stats['in_use'], state='in_use')
+    ESTIMATORS.set(stats['idle'], state='idle')
+    ESTIMATORS.set(stats['size'], state='capacity')
+
+
+REGISTRY.add_collector(_collect_pool_metrics)
+
+
+def warm_estimator_pool():
+    """Pre-initialize the process-wide pool if ESTIMATOR_POOL_CONFIG asks for it."""
+    if settings.ESTIMATOR_POOL_CONFIG['warm_on_startup']:
+        get_estimator_pool().warm()
@@ -0,0 +1,586 @@
+"""
+Asynchronous analysis jobs persisted in MongoDB.
+
+The analyze endpoint only enqueues a job document. Worker processes started
+with `python manage.py run_analysis_workers` claim pending jobs, run the video
+through VideoProcessingService and record the outcome on the job document.
+
+Batches of videos (e.g. reprocessing after a model or configuration change)
+are enqueued with enqueue_batch_jobs() at a lower priority: workers claim
+interactive jobs first, and at most ANALYSIS_JOB_CONFIG['batch_max_running']
+batch jobs run at a time, so a batch leaves workers free for interactive
+requests.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .db_connection import get_jobs_collection, get_videos_collection, ensure_indexes
+from .metrics import publish_metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+ACTIVE_JOB_STATES = [JOB_PENDING, JOB_RUNNING]
+
+# Jobs are claimed in descending priority; batch jobs are throttled
+PRIORITY_BATCH = 0
+PRIORITY_INTERACTIVE = 1
+
+DUPLICATE_KEY_ERROR = 11000
+# Retries of batch upserts that lost an insert race against a concurrent enqueue
+BATCH_ENQUEUE_RETRIES = 3
+
+
+def _dedup_key(video_id: str, options: Dict[str, Any]) -> str:
+    return f"{video_id}:{json.dumps(options, sort_keys=True)}"
+
+
+def _enqueue_update(
+    video_id: str,
+    options: Dict[str, Any],
+    job_id: ObjectId,
+    priority: int,
+    now: datetime,
+    video_path: Optional[str] = None,
+    batch_id: Optional[ObjectId] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Query and upsert update of an enqueue that reuses an identical active job."""
+    query = {
+        'dedup_key': _dedup_key(video_id, options),
+        'state': {'$in': ACTIVE_JOB_STATES}
+    }
+    update = {
+        '$setOnInsert': {
+            '_id': job_id,
+            'video_id': video_id,
+            'video_path': video_path,
+            'options': options,
+            'state': JOB_PENDING,
+            'progress': 0.0,
+            'attempts': 0,
+            'max_attempts': settings.ANALYSIS_JOB_CONFIG['max_attempts'],
+            'analysis_id': None,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+            'available_at': now,
+        },
+        # An interactive request for a video that is queued in a batch moves the job ahead
+        '$max': {'priority': priority},
+    }
+    if batch_id is not None:
+        update['$addToSet'] = {'batch_ids': batch_id}
+    return query, update
+
+
+def enqueue_analysis_job(video_id: str, options: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Enqueue an analysis job, reusing an identical job that is still pending or running.
+
+    Args:
+        video_id: The MongoDB ObjectId of the video to analyze
+        options: Processing options passed to process_video (e.g. debug_visualization)
+
+    Returns:
+        Tuple of the job document and whether a new job was created
+    """
+    options = options or {}
+    job_id = ObjectId()
+    query, update = _enqueue_update(video_id, options, job_id, PRIORITY_INTERACTIVE, datetime.utcnow())
+
+    try:
+        job = get_jobs_collection().find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent request inserted the same job first (unique active_dedup_key index)
+        job = get_jobs_collection().find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+
+    return job, job['_id'] == job_id
+
+
+def resolve_video_paths(video_filter: Dict[str, Any], limit: int = 0) -> Dict[str, Optional[str]]:
+    """
+    Resolve the file paths of the videos matching a filter with a single query.
+
+    Args:
+        video_filter: MongoDB filter on the videos collection (e.g. {'_id': {'$in': [...]}})
+        limit: Maximum number of videos, 0 for no limit
+
+    Returns:
+        File path by video ID of the matching videos, None if the file is missing
+    """
+    paths = {}
+    for video_doc in get_videos_collection().find(video_filter, {'filename': 1}).limit(limit):
+        filename = video_doc.get('filename')
+        video_path = Path(settings.VIDEO_STORAGE_PATH) / filename if filename else None
+        paths[str(video_doc['_id'])] = str(video_path) if video_path and video_path.exists() else None
+    return paths
+
+
+def enqueue_batch_jobs(
+    video_paths: Dict[str, str],
+    options: Optional[Dict[str, Any]] = None
+) -> Tuple[ObjectId, List[Tuple[Dict[str, Any], bool]]]:
+    """
+    Enqueue low priority analysis jobs for many videos with one bulk write.
+
+    Identical jobs that are still pending or running are reused (and become
+    part of the batch) instead of queueing duplicates.
+
+    Args:
+        video_paths: Resolved file path by video ID (see resolve_video_paths())
+        options: Processing options passed to process_video
+
+    Returns:
+        Tuple of the batch ID and, per video in input order, the job document
+        and whether a new job was created
+    """
+    options = options or {}
+    now = datetime.utcnow()
+    batch_id = ObjectId()
+    job_ids = {video_id: ObjectId() for video_id in video_paths}
+    jobs_collection = get_jobs_collection()
+
+    requests = []
+    for video_id, video_path in video_paths.items():
+        query, update = _enqueue_update(
+            video_id, options, job_ids[video_id], PRIORITY_BATCH, now, video_path=video_path, batch_id=batch_id
+        )
+        requests.append(UpdateOne(query, update, upsert=True))
+    if not requests:
+        return batch_id, []
+
+    pending = requests
+    for attempt in range(BATCH_ENQUEUE_RETRIES + 1):
+        try:
+            jobs_collection.bulk_write(pending, ordered=False)
+            break
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            if (
+                attempt == BATCH_ENQUEUE_RETRIES
+                or not write_errors
+                or any(error['code'] != DUPLICATE_KEY_ERROR for error in write_errors)
+            ):
+                raise
+            # Concurrent requests inserted some of the same jobs first (unique active_dedup_key index),
+            # retried upserts match and join those jobs instead
+            logger.debug('Retrying %d batch job upserts after duplicate key errors', len(write_errors))
+            pending = [pending[error['index']] for error in write_errors]
+
+    jobs = {
+        job['video_id']: job
+        for job in jobs_collection.find({'batch_ids': batch_id})
+    }
+    return batch_id, [
+        (jobs[video_id], jobs[video_id]['_id'] == job_ids[video_id])
+        for video_id in video_paths if video_id in jobs
+    ]
+
+
+def get_batch_jobs(batch_id: str) -> List[Dict[str, Any]]:
+    """Get the job documents of a batch, in the order they were created."""
+    return list(get_jobs_collection().find({'batch_ids': ObjectId(batch_id)}).sort('_id', 1))
+
+
+def count_active_jobs() -> Dict[str, int]:
+    """Count the pending and running jobs with one aggregation, by state (0 for states without jobs)."""
+    counts = dict.fromkeys(ACTIVE_JOB_STATES, 0)
+    for group in get_jobs_collection().aggregate([
+        {'$match': {'state': {'$in': ACTIVE_JOB_STATES}}},
+        {'$group': {'_id': '$state', 'count': {'$sum': 1}}}
+    ]):
+        counts[group['_id']] = group['count']
+    return counts
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Get a job document by its ID."""
+    return get_jobs_collection().find_one({'_id': ObjectId(job_id)})
+
+
+def job_to_dict(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a job document to its JSON representation."""
+    def _iso(value):
+        return value.isoformat() if value else None
+
+    return {
+        'job_id': str(job['_id']),
+        'video_id': job['video_id'],
+        'state': job['state'],
+        'priority': job.get('priority', PRIORITY_INTERACTIVE),
+        'progress': job.get('progress', 0.0),
+        'attempts': job.get('attempts', 0),
+        'max_attempts': job.get('max_attempts'),
+        'analysis_id': job.get('analysis_id'),
+        'result': job.get('result'),
+        'error': job.get('error'),
+        'created_at': _iso(job.get('created_at')),
+        'started_at': _iso(job.get('started_at')),
+        'finished_at': _iso(job.get('finished_at')),
+    }
+
+
+def claim_next_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Atomically claim the oldest runnable job of the highest priority.
+
+    Jobs whose worker stopped renewing the lease (e.g. the process died) are
+    claimed again, which counts as another attempt. While
+    ANALYSIS_JOB_CONFIG['batch_max_running'] batch jobs are running, only
+    interactive jobs are claimed. The limit is checked before the claim, so
+    workers claiming at the same moment can exceed it briefly.
+
+    Args:
+        worker_id: Identifier of the claiming worker
+
+    Returns:
+        The claimed job document, or None if the queue is empty
+    """
+    now = datetime.utcnow()
+    job_config = settings.ANALYSIS_JOB_CONFIG
+    lease_timeout = job_config['lease_timeout']
+    jobs_collection = get_jobs_collection()
+
+    query = {
+        '$or': [
+            {'state': JOB_PENDING, 'available_at': {'$lte': now}},
+            {'state': JOB_RUNNING, 'lease_expires_at': {'$lt': now}},
+        ]
+    }
+    running_batch_jobs = jobs_collection.count_documents({
+        'state': JOB_RUNNING,
+        'priority': {'$lt': PRIORITY_INTERACTIVE},
+        'lease_expires_at': {'$gte': now}
+    })
+    if running_batch_jobs >= job_config['batch_max_running']:
+        # Jobs queued before priorities existed have none and count as interactive
+        query['priority'] = {'$not': {'$lt': PRIORITY_INTERACTIVE}}
+
+    return jobs_collection.find_one_and_update(
+        query,
+        {
+            '$set': {
+                'state': JOB_RUNNING,
+                'worker_id': worker_id,
+                'started_at': now,
+                'updated_at': now,
+                'lease_expires_at': now + timedelta(seconds=lease_timeout),
+            },
+            '$inc': {'attempts': 1}
+        },
+        sort=[('priority', -1), ('available_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+class Heartbeat:
+    """
+    Calls a function every `interval` seconds in a daemon thread while it is active.
+
+    Used as a context manager around long running work whose liveness must
+    not depend on how often it reports progress. Exceptions of the function
+    are logged and do not stop the heartbeat.
+    """
+
+    def __init__(self, beat: Callable[[], None], interval: float, name: str = 'heartbeat'):
+        self.beat = beat
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                logger.warning("Heartbeat %s failed: %s", self._thread.name, e)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def _lease_query(job_id: ObjectId, worker_id: str) -> Dict[str, Any]:
+    """Match a job only while `worker_id` still holds it (another worker may have reclaimed an expired lease)."""
+    return {'_id': job_id, 'state': JOB_RUNNING, 'worker_id': worker_id}
+
+
+def renew_job_lease(job_id: ObjectId, worker_id: str) -> bool:
+    """
+    Extend the lease of a running job by ANALYSIS_JOB_CONFIG['lease_timeout'] seconds.
+
+    Returns:
+        False if the worker lost the job's lease
+    """
+    now = datetime.utcnow()
+    lease_timeout = settings.ANALYSIS_JOB_CONFIG['lease_timeout']
+
+    result = get_jobs_collection().update_one(
+        _lease_query(job_id, worker_id),
+        {
+            '$set': {
+                'updated_at': now,
+                'lease_expires_at': now + timedelta(seconds=lease_timeout),
+            }
+        }
+    )
+    return result.matched_count > 0
+
+
+def update_job_progress(job_id: ObjectId, worker_id: str, progress: float) -> bool:
+    """
+    Record job progress (0.0 - 1.0) and renew the worker's lease.
+
+    Returns:
+        False if the worker lost the job's lease
+    """
+    now = datetime.utcnow()
+    lease_timeout = settings.ANALYSIS_JOB_CONFIG['lease_timeout']
+
+    result = get_jobs_collection().update_one(
+        _lease_query(job_id, worker_id),
+        {
+            '$set': {
+                'progress': round(progress, 4),
+                'updated_at': now,
+                'lease_expires_at': now + timedelta(seconds=lease_timeout),
+            }
+        }
+    )
+    return result.matched_count > 0
+
+
+def complete_job(job_id: ObjectId, worker_id: str, result: Dict[str, Any]) -> bool:
+    """
+    Mark a job as completed with the result of process_video.
+
+    Returns:
+        False if the worker lost the job's lease; the job is left to the worker that holds it
+    """
+    now = datetime.utcnow()
+    update = get_jobs_collection().update_one(
+        _lease_query(job_id, worker_id),
+        {
+            '$set': {
+                'state': JOB_COMPLETED,
+                'progress': 1.0,
+                'analysis_id': result.get('analysis_id'),
+                'result': result,
+                'error': None,
+                'updated_at': now,
+                'finished_at': now,
+            }
+        }
+    )
+    return update.matched_count > 0
+
+
+def fail_job(job: Dict[str, Any], error: str, retryable: bool = True) -> bool:
+    """
+    Record a failed attempt, scheduling a retry with linear backoff while attempts remain.
+
+    Args:
+        job: The job document that failed, as claimed by the worker
+        error: Error message
+        retryable: False if retrying cannot succeed (e.g. the video does not exist)
+
+    Returns:
+        False if the worker lost the job's lease; the job is left to the worker that holds it
+    """
+    now = datetime.utcnow()
+    update = {
+        'error': error,
+        'updated_at': now,
+    }
+
+    if retryable and job['attempts'] < job['max_attempts']:
+        backoff = settings.ANALYSIS_JOB_CONFIG['retry_backoff'] * job['attempts']
+        update['state'] = JOB_PENDING
+        update['available_at'] = now + timedelta(seconds=backoff)
+    else:
+        update['state'] = JOB_FAILED
+        update['finished_at'] = now
+
+    result = get_jobs_collection().update_one(_lease_query(job['_id'], job['worker_id']), {'$set': update})
+    return result.matched_count > 0
+
+
+def run_job(job: Dict[str, Any]):
+    """
+    Run a claimed job to completion and record its outcome.
+
+    Args:
+        job: A job document returned by claim_next_job()
+    """
+    # Imported here so the queue functions stay usable without MediaPipe
+    from .estimator_pool import get_estimator_pool
+    from .services import VideoProcessingService
+
+    job_id = job['_id']
+    worker_id = job['worker_id']
+    log_fields = {'job_id': str(job_id), 'video_id': job['video_id']}
+
+    if job['attempts'] > job['max_attempts']:
+        fail_job(job, job.get('error') or 'Worker lost while processing the job', retryable=False)
+        return
+
+    options = job.get('options', {})
+    logger.info(
+        "Running job %s for video %s (attempt %d)", job_id, job['video_id'], job['attempts'],
+        extra=log_fields
+    )
+
+    # Progress is only reported per segment, so the lease is renewed independently of it
+    lease_interval = settings.ANALYSIS_JOB_CONFIG['lease_timeout'] / 3
+    try:
+        with Heartbeat(lambda: renew_job_lease(job_id, worker_id), lease_interval, name='job-lease'):
+            with get_estimator_pool().estimator() as pose:
+                service = VideoProcessingService(pose=pose)
+                result = service.process_video(
+                    job['video_id'],
+                    debug_visualization=options.get('debug_visualization'),
+                    video_path=job.get('video_path'),
+                    progress_callback=lambda progress: update_job_progress(job_id, worker_id, progress)
+                )
+    except Exception as e:
+        logger.exception("Job %s raised: %s", job_id, e, extra=log_fields)
+        if not fail_job(job, str(e)):
+            logger.warning("Job %s was reclaimed by another worker, not recording the error", job_id, extra=log_fields)
+        return
+
+    if result['success']:
+        recorded = complete_job(job_id, worker_id, result)
+        if recorded:
+            logger.info(
+                "Job %s completed, analysis %s", job_id, result['analysis_id'],
+                extra=dict(log_fields, analysis_id=result['analysis_id'])
+            )
+    else:
+        recorded = fail_job(job, result.get('error', 'Unknown error occurred'), retryable=result.get('retryable', True))
+        if recorded:
+            logger.warning("Job %s failed: %s", job_id, result.get('error'), extra=log_fields)
+
+    if not recorded:
+        logger.warning("Job %s was reclaimed by another worker, discarding its result", job_id, extra=log_fields)
+
+
+def _worker_main(worker_index: int, num_workers: int):
+    """Entry point of a spawned worker process."""
+    import django
+    django.setup()
+
+    from .estimator_pool import warm_estimator_pool
+    from .services import configure_segment_pool, get_segment_pool_size
+    configure_segment_pool(num_workers)
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    # Load the pose estimators before the first job is claimed, unless long videos are analyzed
+    # in the segment processes (each with its own estimator) and this one is only needed for short ones
+    if get_segment_pool_size() == 1:
+        warm_estimator_pool()
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{worker_index}"
+    poll_interval = settings.ANALYSIS_JOB_CONFIG['poll_interval']
+    metrics_config = settings.METRICS_CONFIG
+    last_published = None
+    logger.info("Analysis worker %s started", worker_id)
+
+    while not stopping:
+        # Share this worker's metrics with the /metrics endpoint of the API process
+        if metrics_config['enabled'] and (
+            last_published is None or time.monotonic() - last_published >= metrics_config['publish_interval']
+        ):
+            try:
+                publish_metrics(worker_id)
+            except Exception as e:
+                logger.warning("Worker %s failed to publish metrics: %s", worker_id, e)
+            last_published = time.monotonic()
+
+        try:
+            job = claim_next_job(worker_id)
+        except Exception as e:
+            logger.error("Worker %s failed to claim a job: %s", worker_id, e)
+            job = None
+
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        run_job(job)
+        # Publish right after a job so its metrics show up without waiting for the interval
+        last_published = None
+
+    logger.info("Analysis worker %s stopped", worker_id)
+
+
+def run_workers(num_workers: int):
+    """
+    Start `num_workers` worker processes and wait for them to exit.
+
+    Workers are spawned rather than forked so every process gets its own
+    MongoDB client and MediaPipe graphs.
+    """
+    # The job queue, resume and bucket writes rely on these indexes
+    for collection_name, names in ensure_indexes().items():
+        logger.info("Created MongoDB indexes on '%s': %s", collection_name, ', '.join(names))
+
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    for worker_index in range(num_workers):
+        process = context.Process(
+            target=_worker_main, args=(worker_index, num_workers), name=f'analysis-worker-{worker_index}'
+        )
+        process.start()
+        processes.append(process)
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
@@ -0,0 +1,393 @@
+"""
+Level-of-detail pyramid of landmark series for charting.
+
+Overview charts of a whole session do not need every analyzed frame. For
+every resolution in ANALYSIS_LOD_CONFIG['resolutions'] (seconds per point)
+the frames are aggregated to the min, mean and max of every landmark
+coordinate per time bin. The levels are stored in the `analysis_lod`
+collection, one document per level and chunk of `chunk_points` bins:
+
+    {
+        'analysis_id': ObjectId(...),
+        'resolution': 5.0,
+        'chunk_index': 0,
+        'start_time': 0.0,
+        'timestamps': [0.0, 5.0, ...],  # start of each bin
+        'frame_counts': [25, 25, ...],
+        'min': <packed block, see storage.pack_landmarks()>,
+        'mean': <packed block>,
+        'max': <packed block>
+    }
+
+Bins without a detected pose are left out. The finest level is built from
+the stored buckets one at a time and every coarser level from the level
+below it (when its resolution is a multiple of that level's), so building
+the pyramid reads the analysis once and keeps at most one chunk per level
+in memory.
+
+The header of the analysis records the built levels:
+
+    'lod': {'version': 1, 'resolutions': [1.0, 5.0, 30.0], 'point_counts': [62, 13, 3], 'chunk_points': 720}
+
+Levels are built when an analysis completes and again on the first request
+if they are missing or the configured resolutions changed.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+from django.conf import settings
+from pymongo import ASCENDING
+
+from .storage import (
+    POSE_LANDMARK_NAMES,
+    LANDMARK_FIELDS,
+    FORMAT_COLUMNAR,
+    VIEW_SUMMARY,
+    SCHEMA_VERSION_BUCKETED,
+    get_schema_version,
+    load_landmark_series,
+    pack_landmarks,
+    unpack_landmarks,
+    serialize_analysis,
+)
+from .analysis_store import iter_bucket_series, ANALYSIS_COMPLETE
+from .db_connection import get_analysis_collection, get_analysis_lod_collection
+
+
+# Headers built by an older version are rebuilt when a level is requested
+LOD_VERSION = 1
+
+LOD_STATISTICS = ('min', 'mean', 'max')
+
+RESOLUTION_AUTO = 'auto'
+
+# Tolerance of the time to bin assignment, so float timestamps on a bin edge fall into the later bin
+_EDGE_EPSILON = 1e-9
+
+
+class _LevelBuilder:
+    """
+    Aggregates a time ordered series into the bins of one level.
+
+    Input batches are partial aggregates (per frame, or per bin of a finer
+    level): start times, min, max, sum and count. A bin is complete once a
+    later bin starts; complete bins are written in chunks and passed on to
+    the next coarser level.
+    """
+
+    def __init__(self, analysis_id: ObjectId, resolution: float, chunk_points: int, compression: str):
+        self.analysis_id = analysis_id
+        self.resolution = resolution
+        self.chunk_points = chunk_points
+        self.compression = compression
+        self.coarser: List['_LevelBuilder'] = []
+        self.point_count = 0
+
+        # Bin still open for more input
+        self._pending = None
+        # Complete bins of the current chunk
+        self._chunk_index = None
+        self._chunk = []
+
+    def add(self, times: np.ndarray, mins: np.ndarray, maxs: np.ndarray, sums: np.ndarray, counts: np.ndarray):
+        if len(times) == 0:
+            return
+
+        bins = np.floor(times / self.resolution + _EDGE_EPSILON).astype(np.int64)
+        starts = np.flatnonzero(np.diff(bins, prepend=bins[0] - 1))
+        bins = bins[starts]
+        mins = np.minimum.reduceat(mins, starts)
+        maxs = np.maximum.reduceat(maxs, starts)
+        sums = np.add.reduceat(sums, starts)
+        counts = np.add.reduceat(counts, starts)
+
+        if self._pending is not None:
+            pending_bin, pending_min, pending_max, pending_sum, pending_count = self._pending
+            if pending_bin == bins[0]:
+                mins[0] = np.minimum(mins[0], pending_min)
+                maxs[0] = np.maximum(maxs[0], pending_max)
+                sums[0] += pending_sum
+                counts[0] += pending_count
+            else:
+                self._emit(
+                    np.array([pending_bin]), pending_min[np.newaxis], pending_max[np.newaxis],
+                    pending_sum[np.newaxis], np.array([pending_count])
+                )
+
+        self._pending = (bins[-1], mins[-1], maxs[-1], sums[-1], counts[-1])
+        if len(bins) > 1:
+            self._emit(bins[:-1], mins[:-1], maxs[:-1], sums[:-1], counts[:-1])
+
+    def finish(self):
+        """Emit the open bin and write the last chunk, then finish the coarser levels."""
+        if self._pending is not None:
+            pending_bin, pending_min, pending_max, pending_sum, pending_count = self._pending
+            self._pending = None
+            self._emit(
+                np.array([pending_bin]), pending_min[np.newaxis], pending_max[np.newaxis],
+                pending_sum[np.newaxis], np.array([pending_count])
+            )
+        self._write_chunk()
+        for level in self.coarser:
+            level.finish()
+
+    def _emit(self, bins: np.ndarray, mins: np.ndarray, maxs: np.ndarray, sums: np.ndarray, counts: np.ndarray):
+        for level in self.coarser:
+            level.add(bins * self.resolution, mins, maxs, sums, counts)
+
+        self.point_count += len(bins)
+        chunk_indexes = bins // self.chunk_points
+        for chunk_index in np.unique(chunk_indexes):
+            if chunk_index != self._chunk_index:
+                self._write_chunk()
+                self._chunk_index = int(chunk_index)
+            mask = chunk_indexes == chunk_index
+            self._chunk.append((bins[mask], mins[mask], maxs[mask], sums[mask], counts[mask]))
+
+    def _write_chunk(self):
+        if not self._chunk:
+            return
+
+        bins, mins, maxs, sums, counts = (np.concatenate(parts) for parts in zip(*self._chunk))
+        self._chunk = []
+        means = sums / counts[:, np.newaxis, np.newaxis]
+        get_analysis_lod_collection().replace_one(
+            {'analysis_id': self.analysis_id, 'resolution': self.resolution, 'chunk_index': self._chunk_index},
+            {
+                'analysis_id': self.analysis_id,
+                'resolution': self.resolution,
+                'chunk_index': self._chunk_index,
+                'start_time': self._chunk_index * self.chunk_points * self.resolution,
+                'timestamps': (bins * self.resolution).tolist(),
+                'frame_counts': counts.tolist(),
+                'min': pack_landmarks(mins, self.compression),
+                'mean': pack_landmarks(means, self.compression),
+                'max': pack_landmarks(maxs, self.compression)
+            },
+            upsert=True
+        )
+
+
+def _is_multiple(resolution: float, finer: float) -> bool:
+    ratio = resolution / finer
+    return abs(ratio - round(ratio)) < 1e-6
+
+
+def build_lod(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build and store the level-of-detail pyramid of an analysis.
+
+    Args:
+        doc: Analysis header (or full document of an older schema version)
+
+    Returns:
+        The `lod` field recorded on the analysis header
+    """
+    config = settings.ANALYSIS_LOD_CONFIG
+    compression = settings.ANALYSIS_STORAGE_CONFIG['compression']
+    resolutions = sorted(float(resolution) for resolution in config['resolutions'])
+
+    lod_collection = get_analysis_lod_collection()
+    lod_collection.delete_many({'analysis_id': doc['_id']})
+
+    levels = []
+    roots = []
+    for resolution in resolutions:
+        level = _LevelBuilder(doc['_id'], resolution, config['chunk_points'], compression)
+        finer = next((finer for finer in reversed(levels) if _is_multiple(resolution, finer.resolution)), None)
+        if finer is None:
+            roots.append(level)
+        else:
+            finer.coarser.append(level)
+        levels.append(level)
+
+    if get_schema_version(doc) == SCHEMA_VERSION_BUCKETED:
+        series = iter_bucket_series(doc)
+    else:
+        series = [load_landmark_series(doc)]
+
+    for timestamps, landmarks in series:
+        if len(timestamps) == 0:
+            continue
+        times = np.asarray(timestamps, dtype=np.float64)
+        sums = landmarks.astype(np.float64)
+        counts = np.ones(len(times), dtype=np.int64)
+        for level in roots:
+            level.add(times, landmarks, landmarks, sums, counts)
+
+    for level in roots:
+        level.finish()
+
+    lod = {
+        'version': LOD_VERSION,
+        'resolutions': resolutions,
+        'point_counts': [level.point_count for level in levels],
+        'chunk_points': config['chunk_points']
+    }
+    get_analysis_collection().update_one({'_id': doc['_id']}, {'$set': {'lod': lod}})
+    return lod
+
+
+def _is_current(lod: Optional[Dict[str, Any]]) -> bool:
+    resolutions = sorted(float(resolution) for resolution in settings.ANALYSIS_LOD_CONFIG['resolutions'])
+    return lod is not None and lod.get('version') == LOD_VERSION and lod.get('resolutions') == resolutions
+
+
+def update_lod(analysis_id: ObjectId) -> Optional[Dict[str, Any]]:
+    """
+    Build the level-of-detail pyramid of a complete analysis.
+
+    Returns:
+        The `lod` header field, None if the analysis does not exist or is not complete
+    """
+    doc = get_analysis_collection().find_one({'_id': analysis_id})
+    if doc is None or doc.get('status', ANALYSIS_COMPLETE) != ANALYSIS_COMPLETE:
+        return None
+    return build_lod(doc)
+
+
+def ensure_lod(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Get the `lod` header field of an analysis, building the levels if they are missing or outdated.
+
+    Args:
+        doc: Analysis header document
+
+    Returns:
+        The `lod` header field, None if the analysis is not complete
+    """
+    if _is_current(doc.get('lod')):
+        return doc['lod']
+    if doc.get('status', ANALYSIS_COMPLETE) != ANALYSIS_COMPLETE:
+        return None
+
+    # The document may have been read without its data fields
+    lod = build_lod(get_analysis_collection().find_one({'_id': doc['_id']}))
+    doc['lod'] = lod
+    return lod
+
+
+def select_resolution(
+    lod: Dict[str, Any],
+    max_points: int,
+    duration: Optional[float] = None
+) -> float:
+    """
+    Pick the finest level with at most `max_points` points.
+
+    Args:
+        lod: The `lod` header field
+        max_points: Maximum number of points of the selected level
+        duration: Seconds of the requested time range, None for the whole analysis
+
+    Returns:
+        Resolution of the selected level, the coarsest one if none is small enough
+    """
+    for resolution, point_count in zip(lod['resolutions'], lod['point_counts']):
+        if duration is not None:
+            point_count = duration / resolution
+        if point_count <= max_points:
+            return resolution
+    return lod['resolutions'][-1]
+
+
+def load_lod_series(
+    doc: Dict[str, Any],
+    resolution: float,
+    start: Optional[float] = None,
+    end: Optional[float] = None
+) -> Tuple[List[float], List[int], Dict[str, np.ndarray]]:
+    """
+    Load one level of an analysis's pyramid.
+
+    Args:
+        doc: Analysis header document with a current `lod` field (see ensure_lod())
+        resolution: Seconds per point of the level
+        start: Only include bins starting at or after this many seconds
+        end: Only include bins starting before this many seconds
+
+    Returns:
+        Tuple of (bin start times, frames per bin, {statistic: (points, 33, 4) float32 array})
+    """
+    chunk_duration = doc['lod']['chunk_points'] * resolution
+    query = {'analysis_id': doc['_id'], 'resolution': resolution}
+    if start is not None:
+        query['chunk_index'] = {'$gte': int(start // chunk_duration)}
+    if end is not None:
+        query['start_time'] = {'$lt': end}
+
+    timestamps = []
+    frame_counts = []
+    arrays = {statistic: [] for statistic in LOD_STATISTICS}
+    for chunk in get_analysis_lod_collection().find(query).sort('chunk_index', ASCENDING):
+        chunk_timestamps = np.asarray(chunk['timestamps'], dtype=np.float64)
+        mask = np.ones(len(chunk_timestamps), dtype=bool)
+        if start is not None:
+            mask &= chunk_timestamps >= start
+        if end is not None:
+            mask &= chunk_timestamps < end
+        timestamps.extend(chunk_timestamps[mask].tolist())
+        frame_counts.extend(np.asarray(chunk['frame_counts'])[mask].tolist())
+        for statistic in LOD_STATISTICS:
+            arrays[statistic].append(unpack_landmarks(chunk[statistic])[mask])
+
+    series = {
+        statistic: np.concatenate(parts) if parts else np.zeros(
+            (0, len(POSE_LANDMARK_NAMES), len(LANDMARK_FIELDS)), dtype=np.float32
+        )
+        for statistic, parts in arrays.items()
+    }
+    return timestamps, frame_counts, series
+
+
+def delete_lod(analysis_id: ObjectId) -> int:
+    """Delete the level-of-detail documents of an analysis and return how many were deleted."""
+    return get_analysis_lod_collection().delete_many({'analysis_id': analysis_id}).deleted_count
+
+
+def serialize_lod(
+    doc: Dict[str, Any],
+    resolution: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    landmark_names: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Convert an analysis header and one level of its pyramid to its JSON representation.
+
+    Args:
+        doc: Analysis header document
+        resolution: Seconds per point of the level, or 'auto' for the finest
+            level with at most ANALYSIS_LOD_CONFIG['auto_max_points'] points
+        start: Only include bins starting at or after this many seconds
+        end: Only include bins starting before this many seconds
+        landmark_names: Only include these landmarks, defaults to all 33
+
+    Returns:
+        JSON serializable dictionary, without landmarks if the analysis is not complete
+    """
+    lod = ensure_lod(doc)
+    result = serialize_analysis(doc, view=VIEW_SUMMARY)
+    if lod is None:
+        return result
+
+    if resolution == RESOLUTION_AUTO:
+        duration = end - start if start is not None and end is not None else None
+        resolution = select_resolution(lod, settings.ANALYSIS_LOD_CONFIG['auto_max_points'], duration)
+    else:
+        resolution = float(resolution)
+
+    timestamps, frame_counts, series = load_lod_series(doc, resolution, start, end)
+    if landmark_names is not None:
+        indexes = [POSE_LANDMARK_NAMES.index(name) for name in landmark_names]
+        series = {statistic: array[:, indexes] for statistic, array in series.items()}
+
+    result['format'] = FORMAT_COLUMNAR
+    result['resolution'] = resolution
+    result['timestamps'] = timestamps
+    result['frame_counts'] = frame_counts
+    result['landmark_names'] = landmark_names or POSE_LANDMARK_NAMES
+    result['fields'] = LANDMARK_FIELDS
+    result['landmarks'] = {statistic: array.tolist() for statistic, array in series.items()}
+    return result
@@ -0,0 +1,34 @@
+"""
+Create the MongoDB indexes declared in db_connection.INDEXES.
+"""
+from django.core.management.base import BaseCommand
+
+from analysis_api.db_connection import ensure_indexes, find_missing_indexes
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB indexes of the analysis collections that do not exist yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only list the missing indexes, exit with status 1 if there are any'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            missing = find_missing_indexes()
+            for collection_name, names in missing.items():
+                self.stdout.write(f"{collection_name}: missing {', '.join(names)}")
+            if missing:
+                raise SystemExit(1)
+            self.stdout.write(self.style.SUCCESS('All indexes exist'))
+            return
+
+        created = ensure_indexes()
+        for collection_name, names in created.items():
+            self.stdout.write(f"{collection_name}: created {', '.join(names)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {sum(len(names) for names in created.values())} index(es)"
+        ))
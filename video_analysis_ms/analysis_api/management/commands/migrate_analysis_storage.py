@@ -0,0 +1,50 @@
+"""
+Convert legacy analysis documents to the columnar storage schema.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analysis_api.db_connection import get_analysis_collection
+from analysis_api.storage import convert_legacy_document
+
+
+class Command(BaseCommand):
+    help = 'Convert analysis documents with per-frame landmark dicts to the packed columnar schema'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compression',
+            default=settings.ANALYSIS_STORAGE_CONFIG['compression'],
+            choices=['none', 'zlib', 'zstd'],
+            help='Compression of the packed landmark block (default: ANALYSIS_STORAGE_CONFIG["compression"])'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many documents would be converted'
+        )
+
+    def handle(self, *args, **options):
+        analysis_collection = get_analysis_collection()
+        legacy_filter = {'schema_version': {'$exists': False}}
+
+        if options['dry_run']:
+            count = analysis_collection.count_documents(legacy_filter)
+            self.stdout.write(f"{count} legacy analysis document(s) would be converted")
+            return
+
+        converted = 0
+        # Only _id is fetched up front, each document is loaded and rewritten on its own
+        for ref in analysis_collection.find(legacy_filter, {'_id': 1}):
+            doc = analysis_collection.find_one({'_id': ref['_id'], **legacy_filter})
+            if doc is None:
+                continue
+
+            new_doc = convert_legacy_document(doc, options['compression'])
+            analysis_collection.replace_one({'_id': doc['_id'], **legacy_filter}, new_doc)
+            converted += 1
+
+            if converted % 100 == 0:
+                self.stdout.write(f"Converted {converted} documents...")
+
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted} analysis document(s)"))
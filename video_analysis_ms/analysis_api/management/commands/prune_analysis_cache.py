@@ -0,0 +1,48 @@
+"""
+Apply the analysis cache eviction policy or invalidate cache entries.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analysis_api.analysis_cache import evict_cache_entries, invalidate_video, clear_cache
+
+
+class Command(BaseCommand):
+    help = 'Evict old analysis cache entries, or invalidate the cache of a video or the whole cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-entries',
+            type=int,
+            default=settings.ANALYSIS_CACHE_CONFIG['max_entries'],
+            help='Keep at most this many entries (default: ANALYSIS_CACHE_CONFIG["max_entries"])'
+        )
+        parser.add_argument(
+            '--max-age-days',
+            type=float,
+            default=settings.ANALYSIS_CACHE_CONFIG['max_age_days'],
+            help='Evict entries not hit for this many days (default: ANALYSIS_CACHE_CONFIG["max_age_days"])'
+        )
+        parser.add_argument(
+            '--video',
+            help='Only invalidate the cache entries of this video ID'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Drop all cache entries and memoized file hashes'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            dropped = clear_cache()
+            self.stdout.write(self.style.SUCCESS(f"Dropped {dropped} cache entries"))
+            return
+
+        if options['video']:
+            dropped = invalidate_video(options['video'])
+            self.stdout.write(self.style.SUCCESS(f"Invalidated {dropped} cache entries of video {options['video']}"))
+            return
+
+        evicted = evict_cache_entries(options['max_entries'], options['max_age_days'])
+        self.stdout.write(self.style.SUCCESS(f"Evicted {evicted} cache entries"))
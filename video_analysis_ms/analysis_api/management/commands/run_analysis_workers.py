@@ -0,0 +1,26 @@
+"""
+Start local worker processes that drain the analysis job queue.
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analysis_api.jobs import run_workers
+
+
+class Command(BaseCommand):
+    help = 'Start worker processes that run queued video analysis jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.ANALYSIS_JOB_CONFIG['workers'],
+            help='Number of worker processes, 0 for one per CPU core (default: ANALYSIS_JOB_CONFIG["workers"])'
+        )
+
+    def handle(self, *args, **options):
+        num_workers = options['workers'] if options['workers'] > 0 else os.cpu_count() or 1
+        self.stdout.write(f"Starting {num_workers} analysis worker(s)...")
+        run_workers(num_workers)
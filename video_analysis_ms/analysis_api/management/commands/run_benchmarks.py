@@ -0,0 +1,129 @@
+"""
+Run the offline analysis benchmark on synthetic videos and write the results as JSON.
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis_api.benchmark import (
+    DEFAULT_RESOLUTIONS,
+    DEFAULT_DURATIONS,
+    DEFAULT_FPS,
+    run_benchmarks,
+    compare_results,
+)
+
+
+def _parse_list(value, parse):
+    return [parse(item) for item in value.split(',') if item]
+
+
+def _parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the analysis pipeline on generated videos with an in-memory MongoDB'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--resolutions',
+            default=','.join(f'{width}x{height}' for width, height in DEFAULT_RESOLUTIONS),
+            help='Comma separated WIDTHxHEIGHT list'
+        )
+        parser.add_argument(
+            '--durations',
+            default=','.join(str(duration) for duration in DEFAULT_DURATIONS),
+            help='Comma separated video lengths in seconds'
+        )
+        parser.add_argument(
+            '--fps',
+            default=','.join(str(fps) for fps in DEFAULT_FPS),
+            help='Comma separated frame rates'
+        )
+        parser.add_argument(
+            '--video-dir',
+            default=str(Path(settings.BASE_DIR) / 'benchmark_output' / 'videos'),
+            help='Where generated videos are stored and reused (default: benchmark_output/videos/)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Result file (default: benchmark_output/benchmark-<timestamp>.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Earlier result file to compare with'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.1,
+            help='Relative change treated as a regression when comparing (default: 0.1)'
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Exit with status 1 if a compared metric regressed beyond the threshold'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            resolutions = _parse_list(options['resolutions'], _parse_resolution)
+            durations = _parse_list(options['durations'], float)
+            fps_values = _parse_list(options['fps'], float)
+        except ValueError as e:
+            raise CommandError(f"Invalid case list: {e}")
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        def report(case):
+            self.stdout.write(
+                f"{case['name']}: {case['frames_per_second']:.1f} frames/s, "
+                f"p50 {case['latency_ms']['p50']:.1f} ms, p95 {case['latency_ms']['p95']:.1f} ms, "
+                f"peak RSS {case['peak_rss_mb']:.0f} MB, "
+                f"{case['stored_bytes_per_minute'] / 1024:.1f} KiB stored per minute"
+            )
+
+        try:
+            results = run_benchmarks(
+                options['video_dir'],
+                resolutions=resolutions,
+                durations=durations,
+                fps_values=fps_values,
+                progress=report
+            )
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        output = options['output']
+        if not output:
+            output_dir = Path(settings.BASE_DIR) / 'benchmark_output'
+            output_dir.mkdir(parents=True, exist_ok=True)
+            output = str(output_dir / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if baseline is None:
+            return
+
+        regressions = 0
+        for entry in compare_results(baseline, results):
+            regressed = not entry['improved'] and abs(entry['change']) > options['threshold']
+            regressions += regressed
+            line = (
+                f"{entry['case']} {entry['metric']}: {entry['baseline']:.2f} -> "
+                f"{entry['current']:.2f} ({entry['change']:+.1%})"
+            )
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{regressions} metric(s) regressed by more than {options['threshold']:.0%}")
@@ -0,0 +1,362 @@
+"""
+Lightweight processing metrics with Prometheus text exposition.
+
+Metrics are plain in-process counters, gauges and histograms; recording a
+value is a dict lookup and an addition under a lock, so instrumenting every
+frame does not measurably slow the analysis down.
+
+Videos are analyzed in the job worker processes (and their segment
+processes), not in the API process that serves /api/v1/metrics/. Segment
+processes send the metrics of a segment back with its result, and every job
+worker periodically publishes a snapshot of its registry to the
+`analysis_metrics` collection:
+
+    {
+        '_id': '<host>:<pid>:<worker index>',
+        'updated_at': datetime,
+        'metrics': {'<metric name>': [[[<label values>], <value>], ...]}
+    }
+
+The metrics endpoint sums the snapshots of all workers that published
+recently with the metrics of its own process. Histogram values in snapshots
+are [[<count per bucket>...], <sum>], the counts are not cumulative.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Callable
+
+from django.conf import settings
+
+from .db_connection import get_metrics_collection
+
+
+# Upper bounds in seconds, for per-frame stage timings
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric:
+    """Base class of the metric types: a value per combination of label values."""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _merge_value(self, current, value):
+        return value if current is None else current + value
+
+    def samples(self) -> List[List[Any]]:
+        """Current values as [[label values], value] pairs."""
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    def merge(self, samples: List[List[Any]]):
+        """Add [[label values], value] pairs (e.g. from another process) to this metric."""
+        with self._lock:
+            for key, value in samples:
+                key = tuple(key)
+                self._values[key] = self._merge_value(self._values.get(key), value)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+    def expose(self) -> List[str]:
+        """Lines of the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for key, value in sorted(self.samples()):
+            lines.extend(self._expose_sample(tuple(key), value))
+        return lines
+
+    def _expose_sample(self, key: Tuple[str, ...], value) -> List[str]:
+        return [f'{self.name}{self._format_labels(key)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    """Monotonically increasing value."""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down. Gauges of several processes are summed."""
+
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in fixed buckets."""
+
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a `with` block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def time_iter(self, iterable: Iterable, **labels) -> Iterator:
+        """Yield the items of an iterable, observing how long producing each one took."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(time.perf_counter() - start, **labels)
+            yield item
+
+    def _merge_value(self, current, value):
+        if current is None:
+            return [list(value[0]), value[1]]
+        return [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1]]
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1]]
+
+    def _expose_sample(self, key: Tuple[str, ...], value) -> List[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = self._format_labels(key, ('le', _format_value(bound)))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = self._format_labels(key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """Set of metrics of a process, plus collectors that refresh gauges before they are read."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a function that sets gauges from the current state of the process."""
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in self._collectors:
+            collector()
+
+    def snapshot(self) -> Dict[str, List[List[Any]]]:
+        """Values of all metrics, by metric name (see module docstring)."""
+        return {name: metric.samples() for name, metric in self._metrics.items()}
+
+    def merge(self, snapshot: Dict[str, List[List[Any]]]):
+        """Add the values of a snapshot taken in another process."""
+        for name, samples in snapshot.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(samples)
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def render(self, snapshots: Iterable[Dict[str, List[List[Any]]]] = ()) -> str:
+        """
+        Render the metrics in the Prometheus text format.
+
+        Args:
+            snapshots: Snapshots of other processes to add to this process' values
+
+        Returns:
+            The exposition text
+        """
+        self.collect()
+        combined = MetricsRegistry()
+        for metric in self._metrics.values():
+            copy = combined.register(_empty_copy(metric))
+            copy.merge(metric.samples())
+        for snapshot in snapshots:
+            combined.merge(snapshot)
+
+        lines = []
+        for metric in combined._metrics.values():
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+def _empty_copy(metric: Metric) -> Metric:
+    if isinstance(metric, Histogram):
+        return Histogram(metric.name, metric.help, metric.labelnames, metric.buckets)
+    return type(metric)(metric.name, metric.help, metric.labelnames)
+
+
+REGISTRY = MetricsRegistry()
+
+# Stages of the per-frame pipeline timed in VideoProcessingService.analyze_segment()
+STAGE_DECODE = 'decode'
+# Time inference waited for the decoder thread (see pipeline.FramePrefetcher)
+STAGE_DECODE_WAIT = 'decode_wait'
+STAGE_COLOR_CONVERSION = 'color_conversion'
+# Cropping/downscaling to the inference resolution (see preprocessing.py)
+STAGE_PREPROCESS = 'preprocess'
+STAGE_INFERENCE = 'inference'
+# Additional landmark models (see model_stages.py)
+STAGE_FACE_INFERENCE = 'face_inference'
+STAGE_HANDS_INFERENCE = 'hands_inference'
+STAGE_HOLISTIC_INFERENCE = 'holistic_inference'
+STAGE_VISUALIZATION = 'visualization'
+STAGE_STORAGE_WRITE = 'storage_write'
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'analysis_stage_seconds',
+    'Time spent in a processing stage per sampled frame (storage_write: per bucket batch write)',
+    ('stage',)
+))
+FRAMES_SAMPLED = REGISTRY.register(Counter(
+    'analysis_frames_sampled_total',
+    'Sampled frames decoded and run through the pose model'
+))
+FRAMES_PROCESSED = REGISTRY.register(Counter(
+    'analysis_frames_processed_total',
+    'Frames with a detected (or interpolated) pose stored in an analysis'
+))
+FRAMES_SKIPPED = REGISTRY.register(Counter(
+    'analysis_frames_skipped_total',
+    'Sampled frames not run through the pose model by reason (static, duplicate)',
+    ('reason',)
+))
+MODEL_FRAMES = REGISTRY.register(Counter(
+    'analysis_model_frames_total',
+    'Frames with landmarks of an additional model (face, hands)',
+    ('model',)
+))
+FRAMES_INTERPOLATED = REGISTRY.register(Counter(
+    'analysis_frames_interpolated_total',
+    'Frames stored in an analysis that were interpolated between keyframes instead of analyzed'
+))
+ANALYSES = REGISTRY.register(Counter(
+    'analysis_videos_total',
+    'Video analyses by outcome (complete, cached, failed)',
+    ('outcome',)
+))
+ANALYSIS_SECONDS = REGISTRY.register(Histogram(
+    'analysis_video_seconds',
+    'Wall time of analyzing one video',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+))
+ANALYSIS_FPS = REGISTRY.register(Histogram(
+    'analysis_frames_per_second',
+    'Sampled frames analyzed per second of wall time, per video',
+    buckets=(1, 2, 5, 10, 20, 30, 50, 100, 200, 500)
+))
+JOBS = REGISTRY.register(Gauge(
+    'analysis_jobs',
+    'Analysis jobs in the queue by state (pending, running)',
+    ('state',)
+))
+WORKERS = REGISTRY.register(Gauge(
+    'analysis_workers',
+    'Analysis worker processes that published metrics recently'
+))
+ESTIMATORS = REGISTRY.register(Gauge(
+    'estimator_pool_estimators',
+    'Pose estimators of the worker estimator pools by state (in_use, idle, capacity)',
+    ('state',)
+))
+ESTIMATOR_CHECKOUT_SECONDS = REGISTRY.register(Histogram(
+    'estimator_pool_checkout_seconds',
+    'Time waited for a free pose estimator',
+    buckets=(0.001, 0.01, 0.1, 1, 5, 10, 30, 60)
+))
+
+
+def publish_metrics(worker_id: str):
+    """Store a snapshot of this process' metrics for the metrics endpoint."""
+    REGISTRY.collect()
+    get_metrics_collection().replace_one(
+        {'_id': worker_id},
+        {'updated_at': datetime.utcnow(), 'metrics': REGISTRY.snapshot()},
+        upsert=True
+    )
+
+
+def get_worker_snapshots() -> List[Dict[str, List[List[Any]]]]:
+    """Get the metrics snapshots of the workers that published within METRICS_CONFIG['stale_after']."""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.METRICS_CONFIG['stale_after'])
+    return [
+        doc['metrics']
+        for doc in get_metrics_collection().find({'updated_at': {'$gte': cutoff}}, {'metrics': 1})
+    ]
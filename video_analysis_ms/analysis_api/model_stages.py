@@ -0,0 +1,354 @@
+"""
+Additional landmark models run on the frames of the pose pass.
+
+Eye contact and gesture analysis need face and hand landmarks, which the
+Pose model only roughly provides. Instead of a separate pass per model
+(decoding the video again each time), analyze_segment() hands every decoded
+RGB frame, together with its pose, to the enabled model stages:
+
+- 'face': MediaPipe FaceMesh, 468 landmarks
+- 'hands': MediaPipe Hands, 21 landmarks per hand, left hand first
+- 'holistic': MediaPipe Holistic, stored as 'face' and 'hands' like the two
+  above (one graph instead of two, but it runs its own pose model and does
+  not use the pose crop)
+
+Each stage has its own sampling interval (LANDMARK_MODELS_CONFIG
+['<model>_interval']): it runs on the first analyzed frame of every interval
+in which the pose shows the face or a hand with at least `min_visibility`.
+FaceMesh and Hands only see a square crop around the face or hands taken
+from the pose landmarks, so small faces and hands keep their resolution;
+their landmarks are mapped back to normalized coordinates of the full frame.
+
+Landmark arrays use the same x, y, z, visibility fields as the pose.
+FaceMesh and Hands report no visibility, so it is 1.0 for detected and 0.0
+for missing landmarks (e.g. the hand that was not found).
+"""
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import mediapipe as mp
+import numpy as np
+
+from .models import X, Y, Z, VISIBILITY
+from .storage import POSE_LANDMARK_NAMES
+from .preprocessing import Region, square_region
+from .metrics import (
+    STAGE_SECONDS,
+    STAGE_FACE_INFERENCE,
+    STAGE_HANDS_INFERENCE,
+    STAGE_HOLISTIC_INFERENCE,
+    MODEL_FRAMES,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+MODEL_FACE = 'face'
+MODEL_HANDS = 'hands'
+MODEL_HOLISTIC = 'holistic'
+MODELS = (MODEL_FACE, MODEL_HANDS, MODEL_HOLISTIC)
+
+FACE_LANDMARK_COUNT = 468
+HAND_LANDMARK_COUNT = 21
+
+HAND_LANDMARK_NAMES = [
+    f'{side}_{landmark.name.lower()}'
+    for side in ('left', 'right')
+    for landmark in mp.solutions.hands.HandLandmark
+]
+
+# Pose landmarks of the head (nose to mouth)
+_HEAD = list(range(POSE_LANDMARK_NAMES.index('mouth_right') + 1))
+_FACE_REQUIRED = [POSE_LANDMARK_NAMES.index(name) for name in ('nose', 'left_eye', 'right_eye')]
+# Wrist, pinky, index and thumb of each hand, and the elbow for the hand size
+_HAND_POINTS = {
+    side: [POSE_LANDMARK_NAMES.index(f'{side}_{part}') for part in ('wrist', 'pinky', 'index', 'thumb')]
+    for side in ('left', 'right')
+}
+_ELBOW = {side: POSE_LANDMARK_NAMES.index(f'{side}_elbow') for side in ('left', 'right')}
+
+
+def _landmarks_to_array(landmark_list, count: int) -> np.ndarray:
+    """(count, 4) array of a MediaPipe landmark list, visibility 1.0."""
+    array = np.ones((count, 4), dtype=np.float32)
+    array[:, :3] = [(landmark.x, landmark.y, landmark.z) for landmark in landmark_list]
+    return array
+
+
+def _map_from_region(array: np.ndarray, region: Region, frame_size: Tuple[int, int]):
+    """Map landmarks normalized to a crop to normalized full-frame coordinates, in place."""
+    x, y, width, height = region
+    frame_width, frame_height = frame_size
+    array[:, X] = (x + array[:, X] * width) / frame_width
+    array[:, Y] = (y + array[:, Y] * height) / frame_height
+    # z uses roughly the same scale as x
+    array[:, Z] *= width / frame_width
+
+
+class ModelStage(ABC):
+    """
+    A landmark model run on some of the analyzed frames.
+
+    Subclasses set `models` (the names their results are stored under) and
+    `inference_stage` (the metrics stage label), and implement visible()
+    and _run().
+    """
+
+    models: Tuple[str, ...] = ()
+    inference_stage = ''
+
+    def __init__(self, interval_frames: int, min_visibility: float = 0.5, roi_padding: float = 0.5):
+        """
+        Args:
+            interval_frames: Video frames per sampling interval of the model
+            min_visibility: Pose visibility the face or hand landmarks need for the model to run
+            roi_padding: Padding around the face or hands crop, as a fraction of its extent
+        """
+        self.interval_frames = max(1, interval_frames)
+        self.min_visibility = min_visibility
+        self.roi_padding = roi_padding
+        self._last_interval: Optional[int] = None
+
+    def process(self, frame_index: int, rgb_frame: np.ndarray, pose: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Run the model on a frame if it is due and the pose shows what it detects.
+
+        Args:
+            frame_index: Index of the frame in the video
+            rgb_frame: Full decoded RGB frame
+            pose: (33, 4) pose landmarks of the frame
+
+        Returns:
+            Landmark arrays by model name, empty if the model did not run or found nothing
+        """
+        interval = frame_index // self.interval_frames
+        if interval == self._last_interval or not self.visible(pose):
+            return {}
+
+        self._last_interval = interval
+        with STAGE_SECONDS.time(stage=self.inference_stage):
+            results = self._run(rgb_frame, pose)
+        for model in results:
+            MODEL_FRAMES.inc(model=model)
+        return results
+
+    @abstractmethod
+    def visible(self, pose: np.ndarray) -> bool:
+        """Whether the pose shows what the model detects, with enough visibility."""
+
+    @abstractmethod
+    def _run(self, rgb_frame: np.ndarray, pose: np.ndarray) -> Dict[str, np.ndarray]:
+        """Run the model on a frame and return its landmarks in full-frame coordinates by model name."""
+
+    def _crop(self, rgb_frame: np.ndarray, points: np.ndarray, min_side: float = 0.0):
+        """
+        Square crop around pose landmarks.
+
+        Args:
+            rgb_frame: Full RGB frame
+            points: (n, 2) normalized x, y of the landmarks
+            min_side: Minimum extent of the landmarks in pixels before padding
+
+        Returns:
+            Tuple of (contiguous crop, region)
+        """
+        frame_height, frame_width = rgb_frame.shape[:2]
+        xs = points[:, 0] * frame_width
+        ys = points[:, 1] * frame_height
+        center_x = (xs.min() + xs.max()) / 2
+        center_y = (ys.min() + ys.max()) / 2
+        half = max(xs.max() - xs.min(), ys.max() - ys.min(), min_side) / 2
+        region = square_region(
+            (center_x - half, center_y - half, center_x + half, center_y + half),
+            (frame_width, frame_height),
+            self.roi_padding
+        )
+        x, y, width, height = region
+        return np.ascontiguousarray(rgb_frame[y:y + height, x:x + width]), region
+
+    def close(self):
+        pass
+
+
+class FaceMeshStage(ModelStage):
+    """FaceMesh on a crop around the head."""
+
+    models = (MODEL_FACE,)
+    inference_stage = STAGE_FACE_INFERENCE
+
+    def __init__(self, interval_frames: int, min_detection_confidence: float = 0.5, **kwargs):
+        super().__init__(interval_frames, **kwargs)
+        # Crops move between runs, so every run is a fresh detection
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=True,
+            max_num_faces=1,
+            min_detection_confidence=min_detection_confidence
+        )
+
+    def visible(self, pose: np.ndarray) -> bool:
+        return bool((pose[_FACE_REQUIRED, VISIBILITY] >= self.min_visibility).all())
+
+    def _run(self, rgb_frame: np.ndarray, pose: np.ndarray) -> Dict[str, np.ndarray]:
+        head = pose[_HEAD]
+        head = head[head[:, VISIBILITY] >= self.min_visibility]
+        crop, region = self._crop(rgb_frame, head[:, :2])
+
+        results = self.face_mesh.process(crop)
+        if not results.multi_face_landmarks:
+            return {}
+
+        face = _landmarks_to_array(results.multi_face_landmarks[0].landmark, FACE_LANDMARK_COUNT)
+        _map_from_region(face, region, (rgb_frame.shape[1], rgb_frame.shape[0]))
+        return {MODEL_FACE: face}
+
+    def close(self):
+        self.face_mesh.close()
+
+
+class HandsStage(ModelStage):
+    """Hands on a crop around each visible hand."""
+
+    models = (MODEL_HANDS,)
+    inference_stage = STAGE_HANDS_INFERENCE
+
+    def __init__(self, interval_frames: int, min_detection_confidence: float = 0.5, **kwargs):
+        super().__init__(interval_frames, **kwargs)
+        self.hands = mp.solutions.hands.Hands(
+            static_image_mode=True,
+            max_num_hands=1,
+            min_detection_confidence=min_detection_confidence
+        )
+
+    def _visible_sides(self, pose: np.ndarray) -> List[str]:
+        return [
+            side for side, points in _HAND_POINTS.items()
+            if pose[points[0], VISIBILITY] >= self.min_visibility
+        ]
+
+    def visible(self, pose: np.ndarray) -> bool:
+        return bool(self._visible_sides(pose))
+
+    def _run(self, rgb_frame: np.ndarray, pose: np.ndarray) -> Dict[str, np.ndarray]:
+        frame_height, frame_width = rgb_frame.shape[:2]
+        hands = np.zeros((2 * HAND_LANDMARK_COUNT, 4), dtype=np.float32)
+        found = False
+
+        # One crop per hand: with both hands in one crop the palm detector often only finds one
+        for offset, side in ((0, 'left'), (HAND_LANDMARK_COUNT, 'right')):
+            points = _HAND_POINTS[side]
+            if pose[points[0], VISIBILITY] < self.min_visibility:
+                continue
+
+            # A hand is about half a forearm long, the pose hand points only cover its base
+            forearm = np.hypot(
+                (pose[points[0], X] - pose[_ELBOW[side], X]) * frame_width,
+                (pose[points[0], Y] - pose[_ELBOW[side], Y]) * frame_height
+            )
+            crop, region = self._crop(rgb_frame, pose[points, :2], min_side=forearm * 0.75)
+
+            results = self.hands.process(crop)
+            if not results.multi_hand_landmarks:
+                continue
+
+            hand = _landmarks_to_array(results.multi_hand_landmarks[0].landmark, HAND_LANDMARK_COUNT)
+            _map_from_region(hand, region, (frame_width, frame_height))
+            hands[offset:offset + HAND_LANDMARK_COUNT] = hand
+            found = True
+
+        return {MODEL_HANDS: hands} if found else {}
+
+    def close(self):
+        self.hands.close()
+
+
+class HolisticStage(ModelStage):
+    """Holistic on the full frame, stored as face and hands."""
+
+    models = (MODEL_FACE, MODEL_HANDS)
+    inference_stage = STAGE_HOLISTIC_INFERENCE
+
+    def __init__(
+        self,
+        interval_frames: int,
+        min_detection_confidence: float = 0.5,
+        min_tracking_confidence: float = 0.5,
+        **kwargs
+    ):
+        super().__init__(interval_frames, **kwargs)
+        self.holistic = mp.solutions.holistic.Holistic(
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence
+        )
+
+    def visible(self, pose: np.ndarray) -> bool:
+        return bool(
+            (pose[_FACE_REQUIRED, VISIBILITY] >= self.min_visibility).all()
+            or any(pose[points[0], VISIBILITY] >= self.min_visibility for points in _HAND_POINTS.values())
+        )
+
+    def _run(self, rgb_frame: np.ndarray, pose: np.ndarray) -> Dict[str, np.ndarray]:
+        results = self.holistic.process(rgb_frame)
+
+        landmarks = {}
+        if results.face_landmarks:
+            landmarks[MODEL_FACE] = _landmarks_to_array(results.face_landmarks.landmark, FACE_LANDMARK_COUNT)
+        if results.left_hand_landmarks or results.right_hand_landmarks:
+            hands = np.zeros((2 * HAND_LANDMARK_COUNT, 4), dtype=np.float32)
+            for offset, hand_landmarks in (
+                (0, results.left_hand_landmarks),
+                (HAND_LANDMARK_COUNT, results.right_hand_landmarks)
+            ):
+                if hand_landmarks:
+                    hands[offset:offset + HAND_LANDMARK_COUNT] = _landmarks_to_array(
+                        hand_landmarks.landmark, HAND_LANDMARK_COUNT
+                    )
+            landmarks[MODEL_HANDS] = hands
+        return landmarks
+
+    def close(self):
+        self.holistic.close()
+
+
+def create_model_stages(models: List[str], fps: float, frame_skip: int, config: Dict) -> List[ModelStage]:
+    """
+    Create the stages of the enabled models.
+
+    Args:
+        models: Enabled model names (LANDMARK_MODELS_CONFIG['models'])
+        fps: Frames per second of the video
+        frame_skip: Number of frames between two sampled frames
+        config: LANDMARK_MODELS_CONFIG
+
+    Returns:
+        The model stages, empty if no model is enabled
+    """
+    unknown = [model for model in models if model not in MODELS]
+    if unknown:
+        logger.warning("Ignoring unknown landmark models: %s", ', '.join(unknown))
+
+    if MODEL_HOLISTIC in models and (MODEL_FACE in models or MODEL_HANDS in models):
+        logger.warning("Holistic provides the face and hands, ignoring the separate face and hands models")
+        models = [MODEL_HOLISTIC]
+
+    def interval_frames(model):
+        return max(frame_skip, int(round(config[f'{model}_interval'] * fps)))
+
+    options = {
+        'min_visibility': config['min_visibility'],
+        'roi_padding': config['roi_padding'],
+        'min_detection_confidence': config['min_detection_confidence'],
+    }
+    stages = []
+    if MODEL_HOLISTIC in models:
+        stages.append(HolisticStage(
+            interval_frames(MODEL_HOLISTIC),
+            min_tracking_confidence=config['min_tracking_confidence'],
+            **options
+        ))
+    if MODEL_FACE in models:
+        stages.append(FaceMeshStage(interval_frames(MODEL_FACE), **options))
+    if MODEL_HANDS in models:
+        stages.append(HandsStage(interval_frames(MODEL_HANDS), **options))
+    return stages
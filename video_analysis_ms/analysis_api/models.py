@@ -1,66 +1,120 @@
 """
 Models for video analysis data stored in MongoDB.
 Note: These are not Django ORM models, but data classes for MongoDB documents.
+
+Landmarks are kept in a LandmarkBuffer, a (frames, 33, 4) float32 array that
+grows geometrically, so per-frame work does not allocate Python objects per
+landmark and aggregates are computed with vectorized reductions.
 """
-from datetime import datetime
-from typing import List, Dict, Any
-
-
-class LandmarkData:
-    """Represents a single landmark with x, y, z coordinates and visibility."""
-
-    def __init__(self, x: float, y: float, z: float, visibility: float):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.visibility = visibility
-
-    def to_dict(self) -> Dict[str, float]:
-        return {
-            'x': self.x,
-            'y': self.y,
-            'z': self.z,
-            'visibility': self.visibility
-        }
-
-
-class FrameAnalysis:
-    """Represents the analysis data for a single frame."""
-
-    def __init__(self, timestamp: str, landmarks: Dict[str, LandmarkData]):
-        self.timestamp = timestamp
-        self.landmarks = landmarks
-
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            'timestamp': self.timestamp,
-            'landmarks': {
-                name: landmark.to_dict()
-                for name, landmark in self.landmarks.items()
-            }
-        }
-
-
-class VideoAnalysis:
-    """Represents the complete analysis document for a video."""
-
-    def __init__(self, video_id: str, data: List[FrameAnalysis] = None):
-        self.video_id = video_id
-        self.data = data or []
-        self.created_at = datetime.utcnow()
-        self.max_x = 0.0
-        self.max_y = 0.0
-
-    def add_frame_analysis(self, frame_analysis: FrameAnalysis):
-        """Add analysis data for a single frame."""
-        self.data.append(frame_analysis)
-
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            'video_id': self.video_id,
-            'data': [frame.to_dict() for frame in self.data],
-            'created_at': self.created_at.isoformat(),
-            'total_frames': len(self.data),
-            'max_x': self.max_x,
-            'max_y': self.max_y
-        }
+import numpy as np
+
+from .storage import POSE_LANDMARK_NAMES, LANDMARK_FIELDS
+
+
+LANDMARK_COUNT = len(POSE_LANDMARK_NAMES)
+FIELD_COUNT = len(LANDMARK_FIELDS)
+
+# Indices of the fields on the last axis of a landmark array
+X, Y, Z, VISIBILITY = range(FIELD_COUNT)
+
+
+class LandmarkBuffer:
+    """Growable series of frame timestamps and (33, 4) landmark arrays."""
+
+    def __init__(self, capacity: int = 256):
+        capacity = max(1, capacity)
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self._landmarks = np.empty((capacity, LANDMARK_COUNT, FIELD_COUNT), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self):
+        """Drop all frames, keeping the allocated capacity."""
+        self._size = 0
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Frame timestamps in seconds (view, shape (frames,))."""
+        return self._timestamps[:self._size]
+
+    @property
+    def landmarks(self) -> np.ndarray:
+        """Landmark array (view, shape (frames, 33, 4))."""
+        return self._landmarks[:self._size]
+
+    def _reserve(self, size: int):
+        capacity = len(self._timestamps)
+        if size <= capacity:
+            return
+
+        while capacity < size:
+            capacity *= 2
+
+        timestamps = np.empty(capacity, dtype=np.float64)
+        landmarks = np.empty((capacity, LANDMARK_COUNT, FIELD_COUNT), dtype=np.float32)
+        timestamps[:self._size] = self._timestamps[:self._size]
+        landmarks[:self._size] = self._landmarks[:self._size]
+        self._timestamps = timestamps
+        self._landmarks = landmarks
+
+    def append_landmark_list(self, timestamp_seconds: float, landmark_list) -> int:
+        """
+        Append a frame straight from a MediaPipe landmark list.
+
+        Args:
+            timestamp_seconds: Frame timestamp in seconds
+            landmark_list: Repeated landmark field (e.g. results.pose_landmarks.landmark)
+
+        Returns:
+            Index of the appended frame
+        """
+        self._reserve(self._size + 1)
+        index = self._size
+        self._landmarks[index] = [
+            (landmark.x, landmark.y, landmark.z, landmark.visibility)
+            for landmark in landmark_list
+        ]
+        self._timestamps[index] = timestamp_seconds
+        self._size += 1
+        return index
+
+    def append(self, timestamp_seconds: float, values: np.ndarray) -> int:
+        """Append a frame from a (33, 4) array and return its index."""
+        self._reserve(self._size + 1)
+        index = self._size
+        self._landmarks[index] = values
+        self._timestamps[index] = timestamp_seconds
+        self._size += 1
+        return index
+
+    def extend(self, timestamps: np.ndarray, landmarks: np.ndarray):
+        """Append many frames at once."""
+        count = len(timestamps)
+        self._reserve(self._size + count)
+        self._timestamps[self._size:self._size + count] = timestamps
+        self._landmarks[self._size:self._size + count] = landmarks
+        self._size += count
+
+    def field_max(self, field: int) -> float:
+        """Maximum of one field (X, Y, Z or VISIBILITY) over all frames and landmarks, 0.0 if empty."""
+        if self._size == 0:
+            return 0.0
+        return float(self.landmarks[:, :, field].max())
+
+    def field_min(self, field: int) -> float:
+        """Minimum of one field over all frames and landmarks, 0.0 if empty."""
+        if self._size == 0:
+            return 0.0
+        return float(self.landmarks[:, :, field].min())
+
+    @property
+    def max_x(self) -> float:
+        # Coordinates are not clamped, but the analysis has always reported at least 0.0
+        return max(0.0, self.field_max(X))
+
+    @property
+    def max_y(self) -> float:
+        return max(0.0, self.field_max(Y))
+
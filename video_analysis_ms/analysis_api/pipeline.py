@@ -0,0 +1,207 @@
+"""
+Pipelined frame processing.
+
+Without pipelining, decoding, color conversion, pose inference and storage
+of a frame run one after another on one thread. The classes here split this
+into three stages connected by bounded queues:
+
+    decoder thread          calling thread          persistence thread
+    FramePrefetcher    ->   pose inference     ->   BackgroundBucketWriter
+    (decode + BGR->RGB)                             (BucketWriter, MongoDB)
+
+The decoder fills a ring of preallocated RGB frame arrays. A slot is handed
+to the consumer and only reused after the consumer asked for the next frame,
+so at most `depth` decoded frames wait for inference and no frame is copied
+or allocated per sample. OpenCV releases the GIL while decoding and
+converting, and pymongo while waiting for the server, so the stages overlap
+with MediaPipe's inference in the calling thread.
+"""
+import queue
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .metrics import STAGE_SECONDS, STAGE_DECODE, STAGE_COLOR_CONVERSION, STAGE_DECODE_WAIT
+from .sampling import FrameSampler
+
+
+# Seconds between checks whether the other side of a queue stopped
+_POLL_INTERVAL = 0.1
+
+_END = object()
+
+
+def iter_rgb_frames(sampler: FrameSampler) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Sequentially decode the sampled frames and convert them to RGB.
+
+    The BGR and RGB arrays are reused for every frame, so a yielded frame is
+    only valid until the next one is requested.
+
+    Yields:
+        (frame_index, rgb_frame) tuples
+    """
+    rgb_frame = None
+    for frame_index, frame in STAGE_SECONDS.time_iter(sampler, stage=STAGE_DECODE):
+        sampler.out = frame
+        with STAGE_SECONDS.time(stage=STAGE_COLOR_CONVERSION):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+        yield frame_index, rgb_frame
+
+
+class FramePrefetcher:
+    """
+    Decode and color-convert sampled frames in a background thread.
+
+    Iterating yields (frame_index, rgb_frame) tuples. A yielded frame array
+    is a slot of the ring buffer and stays valid until the next frame is
+    requested. Exceptions of the decoder thread are raised in the consumer.
+    """
+
+    def __init__(self, sampler: FrameSampler, depth: int):
+        """
+        Args:
+            sampler: Sampler of the frames to decode (consumed by the decoder thread)
+            depth: Maximum number of decoded frames waiting for the consumer
+        """
+        self.sampler = sampler
+        self.depth = max(1, depth)
+
+        self._ready = queue.Queue()
+        self._free = queue.Queue()
+        self._slots = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decode, name='frame-prefetcher', daemon=True)
+
+    def _decode(self):
+        try:
+            for frame_index, frame in STAGE_SECONDS.time_iter(self.sampler, stage=STAGE_DECODE):
+                # Decode the next frame into the same BGR array
+                self.sampler.out = frame
+
+                if not self._slots:
+                    # Allocate the ring once the frame size is known; one slot is
+                    # held by the consumer and one is being filled
+                    self._slots = [np.empty_like(frame) for _ in range(self.depth + 2)]
+                    for index in range(len(self._slots)):
+                        self._free.put(index)
+
+                slot = self._take_free_slot()
+                if slot is None:
+                    return
+
+                with STAGE_SECONDS.time(stage=STAGE_COLOR_CONVERSION):
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._slots[slot])
+                self._ready.put((frame_index, slot))
+
+            self._ready.put(_END)
+        except BaseException as e:
+            self._ready.put(e)
+
+    def _take_free_slot(self) -> Optional[int]:
+        while not self._stop.is_set():
+            try:
+                return self._free.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        self._thread.start()
+        held = None
+        try:
+            while True:
+                if held is not None:
+                    self._free.put(held)
+                    held = None
+
+                with STAGE_SECONDS.time(stage=STAGE_DECODE_WAIT):
+                    item = self._ready.get()
+
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+
+                frame_index, held = item
+                yield frame_index, self._slots[held]
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the decoder thread and wait for it to exit."""
+        self._stop.set()
+        if self._thread.is_alive():
+            # Unblock a decoder waiting for a free slot
+            while self._thread.is_alive():
+                try:
+                    self._ready.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+                for index in range(len(self._slots)):
+                    self._free.put(index)
+            self._thread.join()
+
+
+class BackgroundBucketWriter:
+    """
+    Feed a BucketWriter from a background thread.
+
+    add_landmarks() only enqueues the landmarks; the bucket buffer
+    updates and MongoDB writes happen in the persistence thread. flush()
+    waits until everything was written and raises an exception of the
+    persistence thread. The wrapped writer's counters are final after flush().
+    """
+
+    def __init__(self, writer, queue_size: int):
+        """
+        Args:
+            writer: The BucketWriter to feed
+            queue_size: Maximum number of frames waiting to be persisted
+        """
+        self.writer = writer
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._persist, name='bucket-writer', daemon=True)
+        self._thread.start()
+
+    def _persist(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if self._error is not None:
+                # Keep draining so the producer never blocks, nothing more is written
+                continue
+            try:
+                self.writer.add_landmarks(*item)
+            except BaseException as e:
+                self._error = e
+
+    def add_landmarks(
+        self,
+        frame_index: int,
+        timestamp_seconds: float,
+        values: np.ndarray,
+        carried_forward: bool = False,
+        model_landmarks: Optional[Dict[str, np.ndarray]] = None
+    ):
+        """Queue the landmarks of one frame (see BucketWriter.add_landmarks())."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put((frame_index, timestamp_seconds, values, carried_forward, model_landmarks))
+
+    def close(self):
+        """Stop the persistence thread after the queued frames were handled."""
+        if self._thread.is_alive():
+            self._queue.put(_END)
+            self._thread.join()
+
+    def flush(self):
+        """Write all queued frames and the last bucket."""
+        self.close()
+        if self._error is not None:
+            raise self._error
+        self.writer.flush()
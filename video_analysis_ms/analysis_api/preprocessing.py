@@ -0,0 +1,229 @@
+"""
+Preparation of frames for pose inference.
+
+MediaPipe Pose resizes its input to a few hundred pixels internally, so
+running it on full 1080p frames mostly costs time in the image transforms.
+InferencePreprocessor downscales frames to VIDEO_PROCESSING_CONFIG
+['inference_max_side'] and can optionally crop them to a region of interest
+around the speaker, derived from the previous frame's landmarks:
+
+- The region is a square around the visible landmarks plus padding. It
+  is kept while the landmarks stay inside its inner margin and only
+  recomputed when the speaker moves out of it, so the pose tracker sees a
+  stable image; the estimator is reset whenever the region changes.
+- Without a pose (first frame, speaker lost) the whole frame is used.
+
+Landmarks detected on a cropped frame are mapped back to normalized
+coordinates of the full frame. The crop is a view into the decoded frame and
+resized images are written into buffers reused between frames.
+"""
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# (x, y, width, height) of a region in pixels
+Region = Tuple[int, int, int, int]
+
+
+class InferencePreprocessor:
+    """Downscale (and optionally crop) frames for inference and map landmarks back."""
+
+    def __init__(
+        self,
+        max_side: int = 0,
+        roi_crop: bool = False,
+        roi_padding: float = 0.25,
+        roi_min_visibility: float = 0.5,
+        roi_min_size: float = 0.25
+    ):
+        """
+        Args:
+            max_side: Longest side of the inference image in pixels, 0 keeps the resolution
+            roi_crop: Crop to the region around the previous frame's landmarks
+            roi_padding: Padding added around the landmarks, as a fraction of their extent
+            roi_min_visibility: Landmarks below this visibility do not shape the region
+            roi_min_size: Minimum region side as a fraction of the shorter frame side
+        """
+        self.max_side = max_side
+        self.roi_crop = roi_crop
+        self.roi_padding = roi_padding
+        self.roi_min_visibility = roi_min_visibility
+        self.roi_min_size = roi_min_size
+
+        self.region: Optional[Region] = None
+
+        self._frame_size: Optional[Tuple[int, int]] = None
+        self._buffers: Dict[Tuple[int, int, int], np.ndarray] = {}
+
+    def prepare(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Get the image to run inference on for a frame.
+
+        Args:
+            frame: Full decoded frame (height x width x 3)
+
+        Returns:
+            The frame itself, or a cropped and/or downscaled image in a reused buffer
+        """
+        height, width = frame.shape[:2]
+        self._frame_size = (width, height)
+
+        x, y, region_width, region_height = self.region or (0, 0, width, height)
+        source = frame[y:y + region_height, x:x + region_width]
+
+        scale = 1.0
+        if self.max_side > 0:
+            scale = min(1.0, self.max_side / max(region_width, region_height))
+
+        if scale == 1.0 and self.region is None:
+            return frame
+
+        target_size = (max(1, round(region_width * scale)), max(1, round(region_height * scale)))
+        buffer = self._get_buffer(target_size[1], target_size[0], frame.shape[2])
+
+        if scale == 1.0:
+            # Uncropped size, but the crop view is not contiguous
+            np.copyto(buffer, source)
+        else:
+            cv2.resize(source, target_size, dst=buffer, interpolation=cv2.INTER_LINEAR)
+        return buffer
+
+    def _get_buffer(self, height: int, width: int, channels: int) -> np.ndarray:
+        shape = (height, width, channels)
+        buffer = self._buffers.get(shape)
+        if buffer is None:
+            # Regions rarely change, keep only the buffers of the current and previous one
+            if len(self._buffers) > 1:
+                self._buffers.clear()
+            buffer = self._buffers[shape] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def map_landmarks(self, landmark_list):
+        """
+        Map landmarks detected on the prepared image to normalized full-frame coordinates, in place.
+
+        Args:
+            landmark_list: Repeated landmark field (e.g. results.pose_landmarks.landmark)
+        """
+        if self.region is None:
+            # Downscaling alone does not change normalized coordinates
+            return
+
+        frame_width, frame_height = self._frame_size
+        x, y, region_width, region_height = self.region
+        scale_x = region_width / frame_width
+        scale_y = region_height / frame_height
+        offset_x = x / frame_width
+        offset_y = y / frame_height
+
+        for landmark in landmark_list:
+            landmark.x = offset_x + landmark.x * scale_x
+            landmark.y = offset_y + landmark.y * scale_y
+            # z uses roughly the same scale as x
+            landmark.z = landmark.z * scale_x
+
+    def update(self, landmark_list) -> bool:
+        """
+        Choose the region of the next frame from this frame's (full-frame) landmarks.
+
+        Args:
+            landmark_list: Landmarks of the frame, None if no pose was detected
+
+        Returns:
+            True if the region changed (the pose estimator's tracking state no
+            longer matches the image and should be reset)
+        """
+        if not self.roi_crop or self._frame_size is None:
+            return False
+
+        previous = self.region
+        if landmark_list is None:
+            self.region = None
+        else:
+            bounds = self._landmark_bounds(landmark_list)
+            if bounds is None:
+                self.region = None
+            elif self.region is None or not self._inside_margin(bounds, self.region):
+                self.region = self._padded_region(bounds)
+
+        return self.region != previous
+
+    def _landmark_bounds(self, landmark_list) -> Optional[Tuple[float, float, float, float]]:
+        """Pixel bounding box (x0, y0, x1, y1) of the visible landmarks."""
+        frame_width, frame_height = self._frame_size
+        xs = []
+        ys = []
+        for landmark in landmark_list:
+            if landmark.visibility >= self.roi_min_visibility:
+                xs.append(landmark.x * frame_width)
+                ys.append(landmark.y * frame_height)
+
+        if len(xs) < 2:
+            return None
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def _inside_margin(self, bounds: Tuple[float, float, float, float], region: Region) -> bool:
+        """Whether the landmarks are still inside the region shrunk by half of its padding."""
+        x, y, region_width, region_height = region
+        # The region is the landmark extent plus padding on both sides
+        margin = self.roi_padding / (1 + 2 * self.roi_padding) / 2
+        margin_x = region_width * margin
+        margin_y = region_height * margin
+        frame_width, frame_height = self._frame_size
+
+        # Edges of the region at the frame border have no margin to keep
+        left = x + margin_x if x > 0 else 0
+        top = y + margin_y if y > 0 else 0
+        right = x + region_width - margin_x if x + region_width < frame_width else frame_width
+        bottom = y + region_height - margin_y if y + region_height < frame_height else frame_height
+
+        x0, y0, x1, y1 = bounds
+        return x0 >= left and y0 >= top and x1 <= right and y1 <= bottom
+
+    def _padded_region(self, bounds: Tuple[float, float, float, float]) -> Optional[Region]:
+        """Region around the landmark bounds with padding, clamped to the frame."""
+        region = square_region(bounds, self._frame_size, self.roi_padding, self.roi_min_size)
+        x, y, width, height = region
+        frame_width, frame_height = self._frame_size
+        if width >= frame_width and height >= frame_height:
+            return None
+        return region
+
+
+def square_region(
+    bounds: Tuple[float, float, float, float],
+    frame_size: Tuple[int, int],
+    padding: float,
+    min_size: float = 0.0
+) -> Region:
+    """
+    Square pixel region around a bounding box, clamped to the frame.
+
+    Args:
+        bounds: Pixel bounding box (x0, y0, x1, y1)
+        frame_size: (width, height) of the frame
+        padding: Padding added on each side, as a fraction of the box's larger extent
+        min_size: Minimum side as a fraction of the shorter frame side
+
+    Returns:
+        (x, y, width, height) of the region (not square where clamped to the frame)
+    """
+    frame_width, frame_height = frame_size
+    x0, y0, x1, y1 = bounds
+
+    # Square regions: the pose detector letterboxes its input to a square, and a
+    # narrow region would be left as soon as the speaker leans to a side
+    side = max(x1 - x0, y1 - y0, 1) * (1 + 2 * padding)
+    side = max(side, min(frame_width, frame_height) * min_size)
+    width = min(frame_width, side)
+    height = min(frame_height, side)
+
+    center_x = (x0 + x1) / 2
+    center_y = (y0 + y1) / 2
+    left = int(min(max(center_x - width / 2, 0), frame_width - width))
+    top = int(min(max(center_y - height / 2, 0), frame_height - height))
+    width = int(min(frame_width - left, round(width)))
+    height = int(min(frame_height - top, round(height)))
+    return left, top, width, height
@@ -0,0 +1,406 @@
+"""
+Frame sampling for video decoding.
+
+The sampler walks a cv2.VideoCapture and yields only the frames that are
+going to be analyzed, picking the cheapest way to get past the frames in
+between for the given container and codec.
+
+With a MotionGate, the sampled frames are only candidates: a candidate is
+analyzed when the picture changed enough since the last analyzed frame, or
+when the maximum interval has passed. A speaker standing still is then
+analyzed every `max_frame_interval` seconds and a gesturing one every
+`min_frame_interval` seconds.
+
+A DuplicateFrameDetector works on the frames that are analyzed: a frame that
+is nearly identical to the last frame the pose model ran on (a paused
+speaker in front of a tripod camera) does not need to be run again.
+"""
+import cv2
+from collections import deque
+from pathlib import Path
+from typing import Deque, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+# Decode and convert every frame, keep every N-th one (legacy behaviour)
+STRATEGY_READ = 'read'
+# Advance over skipped frames with grab() and only retrieve() sampled frames
+STRATEGY_GRAB = 'grab'
+# Seek straight to every sampled frame
+STRATEGY_SEEK = 'seek'
+
+STRATEGIES = (STRATEGY_READ, STRATEGY_GRAB, STRATEGY_SEEK)
+
+# Containers with an index that allows frame accurate seeking
+SEEKABLE_CONTAINERS = {'.mp4', '.m4v', '.mov', '.avi', '.mkv'}
+
+# Codecs where every frame is a keyframe, so a seek never decodes extra frames
+INTRA_ONLY_CODECS = {
+    'MJPG', 'mjpg', 'MJPA', 'jpeg', 'AVRn',
+    'png ', 'MPNG',
+    'apch', 'apcn', 'apcs', 'apco', 'ap4h',
+    'HFYU', 'FFV1', 'ffv1', 'DXHD', 'AVdn',
+}
+
+# OpenCV's FFmpeg backend decodes a few frames around every seek target, so
+# even for intra-only codecs seeking only wins over grab() past this gap
+INTRA_SEEK_MIN_FRAME_GAP = 20
+
+
+def get_fourcc(cap: cv2.VideoCapture) -> str:
+    """
+    Get the codec FourCC of an opened video as a string.
+
+    Args:
+        cap: Opened video capture
+
+    Returns:
+        Four character codec code, or an empty string if unknown
+    """
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    if code <= 0:
+        return ''
+    return code.to_bytes(4, 'little').decode('latin-1')
+
+
+def choose_strategy(
+    video_path: str,
+    fourcc: str,
+    frame_skip: int,
+    seek_min_frame_gap: int
+) -> str:
+    """
+    Pick the sampling strategy for a container/codec combination.
+
+    Seeking restarts decoding at the closest keyframe, so for inter-coded
+    video it only pays off when the gap between sampled frames is larger than
+    a typical GOP. Intra-only codecs can seek at much smaller gaps. Everything
+    else advances with grab(), which skips the color conversion and copy of
+    frames that are not sampled.
+
+    Args:
+        video_path: Path to the video file (extension identifies the container)
+        fourcc: Codec FourCC reported by OpenCV
+        frame_skip: Number of frames between two sampled frames
+        seek_min_frame_gap: Minimum frame gap at which seeking inter-coded video is preferred
+
+    Returns:
+        One of STRATEGIES
+    """
+    if frame_skip <= 1:
+        return STRATEGY_READ
+
+    container = Path(video_path).suffix.lower()
+    if container in SEEKABLE_CONTAINERS:
+        if fourcc in INTRA_ONLY_CODECS:
+            min_gap = min(INTRA_SEEK_MIN_FRAME_GAP, seek_min_frame_gap)
+        else:
+            min_gap = seek_min_frame_gap
+
+        if frame_skip >= min_gap:
+            return STRATEGY_SEEK
+
+    return STRATEGY_GRAB
+
+
+def frame_thumbnail(frame: np.ndarray, width: int = 64, color_code: int = cv2.COLOR_BGR2GRAY) -> np.ndarray:
+    """
+    Small grayscale version of a frame for cheap motion measurements.
+
+    Args:
+        frame: Decoded frame (height x width x 3)
+        width: Thumbnail width in pixels
+        color_code: Conversion of the frame's color order to gray
+
+    Returns:
+        uint8 thumbnail of `width` pixels and the frame's aspect ratio
+    """
+    height, frame_width = frame.shape[:2]
+    thumbnail_height = max(1, round(height * width / frame_width))
+    # Striding first keeps the area interpolation cheap on large frames
+    step = max(1, frame_width // (width * 4))
+    small = cv2.resize(frame[::step, ::step], (width, thumbnail_height), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, color_code)
+
+
+def changed_fraction(thumbnail: np.ndarray, reference: np.ndarray, pixel_threshold: int = 12) -> float:
+    """Fraction of thumbnail pixels whose gray level differs from the reference by more than the threshold."""
+    difference = cv2.absdiff(thumbnail, reference)
+    return np.count_nonzero(difference > pixel_threshold) / difference.size
+
+
+class MotionGate:
+    """
+    Selects the candidate frames that moved since the last selected frame.
+
+    Motion is measured on a small grayscale thumbnail of each candidate, as
+    the fraction of thumbnail pixels that differ from the last selected
+    frame's thumbnail by more than `pixel_threshold` gray levels. Comparing
+    against the last selected frame (not the previous candidate) also catches
+    slow movement that accumulates over several candidates.
+    """
+
+    def __init__(
+        self,
+        max_frame_gap: int,
+        motion_threshold: float,
+        thumbnail_width: int = 64,
+        pixel_threshold: int = 12
+    ):
+        """
+        Args:
+            max_frame_gap: A candidate this many frames after the last selected one is always selected
+            motion_threshold: Fraction of the picture that has to change for a candidate to be selected
+            thumbnail_width: Width in pixels of the thumbnail motion is measured on
+            pixel_threshold: Gray level difference at which a thumbnail pixel counts as changed
+        """
+        self.max_frame_gap = max_frame_gap
+        self.motion_threshold = motion_threshold
+        self.thumbnail_width = thumbnail_width
+        self.pixel_threshold = pixel_threshold
+
+        self._last_index: Optional[int] = None
+        self._last_thumbnail: Optional[np.ndarray] = None
+
+    def accept(self, frame_index: int, frame: np.ndarray) -> bool:
+        """
+        Decide whether a candidate frame is analyzed.
+
+        Args:
+            frame_index: Index of the candidate in the video
+            frame: The decoded BGR candidate
+
+        Returns:
+            True if the frame should be analyzed
+        """
+        thumbnail = frame_thumbnail(frame, self.thumbnail_width)
+        if (
+            self._last_thumbnail is None
+            or frame_index - self._last_index >= self.max_frame_gap
+            or changed_fraction(thumbnail, self._last_thumbnail, self.pixel_threshold) >= self.motion_threshold
+        ):
+            self._last_index = frame_index
+            self._last_thumbnail = thumbnail
+            return True
+        return False
+
+
+class DuplicateFrameDetector:
+    """
+    Recognizes frames nearly identical to the last frame the pose model ran on.
+
+    Uses the same thumbnail difference as MotionGate. A frame that is not a
+    duplicate becomes the new reference, so a slow drift is caught once it
+    adds up to the threshold. After `max_carry_frames` frames the next frame
+    is analyzed again regardless.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_carry_frames: int,
+        color_code: int = cv2.COLOR_RGB2GRAY,
+        thumbnail_width: int = 64,
+        pixel_threshold: int = 12
+    ):
+        """
+        Args:
+            threshold: Largest fraction of the picture that may change for a frame to count as a duplicate
+            max_carry_frames: Frames after the reference at which duplicates are analyzed anyway
+            color_code: Conversion of the frames' color order to gray
+            thumbnail_width: Width in pixels of the thumbnail frames are compared on
+            pixel_threshold: Gray level difference at which a thumbnail pixel counts as changed
+        """
+        self.threshold = threshold
+        self.max_carry_frames = max_carry_frames
+        self.color_code = color_code
+        self.thumbnail_width = thumbnail_width
+        self.pixel_threshold = pixel_threshold
+
+        self._reference_index: Optional[int] = None
+        self._reference: Optional[np.ndarray] = None
+
+    def is_duplicate(self, frame_index: int, frame: np.ndarray) -> bool:
+        """
+        Check a frame against the reference, making it the new reference if it is not a duplicate.
+
+        Args:
+            frame_index: Index of the frame in the video
+            frame: The decoded frame
+
+        Returns:
+            True if the reference frame's pose can be reused for this frame
+        """
+        thumbnail = frame_thumbnail(frame, self.thumbnail_width, self.color_code)
+        if (
+            self._reference is not None
+            and frame_index - self._reference_index < self.max_carry_frames
+            and changed_fraction(thumbnail, self._reference, self.pixel_threshold) <= self.threshold
+        ):
+            return True
+
+        self._reference_index = frame_index
+        self._reference = thumbnail
+        return False
+
+
+class FrameSampler:
+    """
+    Yields every `frame_skip`-th frame of a video together with its index.
+
+    Sampled indices are `start_frame`, `start_frame + frame_skip`, ... up to
+    (excluding) `end_frame`, so a video can be sampled in independent ranges.
+    With a `motion_gate`, only the sampled frames it accepts are yielded.
+    """
+
+    def __init__(
+        self,
+        cap: cv2.VideoCapture,
+        video_path: str,
+        frame_skip: int,
+        strategy: str = 'auto',
+        seek_min_frame_gap: int = 90,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        motion_gate: Optional[MotionGate] = None
+    ):
+        self.cap = cap
+        self.frame_skip = max(1, frame_skip)
+        self.fourcc = get_fourcc(cap)
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+
+        if strategy == 'auto':
+            strategy = choose_strategy(video_path, self.fourcc, self.frame_skip, seek_min_frame_gap)
+        elif strategy not in STRATEGIES:
+            raise ValueError(f"Unknown sampling strategy: {strategy}")
+
+        self.strategy = strategy
+        self.motion_gate = motion_gate
+
+        # Position the stream was advanced to (sampled + skipped frames)
+        self.frames_read = 0
+        # Sampled frames the motion gate passed over as static
+        self.frames_static = 0
+        # Indices of those frames, in order; consumed by LandmarkSeriesWriter (from another
+        # thread when the frames are prefetched), so it does not fill the static intervals
+        self.static_indices: Deque[int] = deque()
+
+        # Array to decode the next sampled frame into (e.g. the previous frame once it
+        # was consumed), None to allocate a new one
+        self.out: Optional[np.ndarray] = None
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        if self.strategy == STRATEGY_SEEK:
+            frames = self._iter_seek()
+        elif self.strategy == STRATEGY_GRAB:
+            frames = self._iter_grab()
+        else:
+            frames = self._iter_read()
+
+        if self.motion_gate is not None:
+            return self._iter_gated(frames)
+        return frames
+
+    def _iter_gated(self, frames: Iterator[Tuple[int, np.ndarray]]) -> Iterator[Tuple[int, np.ndarray]]:
+        for frame_index, frame in frames:
+            if self.motion_gate.accept(frame_index, frame):
+                yield frame_index, frame
+            else:
+                self.frames_static += 1
+                self.static_indices.append(frame_index)
+
+    def _is_sampled(self, frame_index: int) -> bool:
+        offset = frame_index - self.start_frame
+        return offset >= 0 and offset % self.frame_skip == 0
+
+    def _before_end(self, frame_index: int) -> bool:
+        return self.end_frame is None or frame_index < self.end_frame
+
+    def _iter_read(self) -> Iterator[Tuple[int, np.ndarray]]:
+        frame_index = self._move_to(self.start_frame)
+        while self._before_end(frame_index):
+            ret, frame = self.cap.read(self.out)
+            if not ret:
+                break
+            self.frames_read = frame_index + 1
+
+            if self._is_sampled(frame_index):
+                yield frame_index, frame
+
+            frame_index += 1
+
+    def _iter_grab(self) -> Iterator[Tuple[int, np.ndarray]]:
+        frame_index = self._move_to(self.start_frame)
+        while self._before_end(frame_index) and self.cap.grab():
+            self.frames_read = frame_index + 1
+
+            if self._is_sampled(frame_index):
+                ret, frame = self.cap.retrieve(self.out)
+                if not ret:
+                    break
+                yield frame_index, frame
+
+            frame_index += 1
+
+    def _iter_seek(self) -> Iterator[Tuple[int, np.ndarray]]:
+        target = self.start_frame
+        position = 0
+        while self._before_end(target):
+            if position != target:
+                position = self._seek(target, position)
+
+            # Seek landed on an earlier keyframe (or was refused), walk forward
+            while position < target and self.cap.grab():
+                position += 1
+                self.frames_read = position
+            if position < target:
+                # The stream ended
+                break
+
+            if position > target:
+                # Overshot the target, continue with the next sampled index
+                target += -(-(position - target) // self.frame_skip) * self.frame_skip
+                continue
+
+            ret, frame = self.cap.read(self.out)
+            if not ret:
+                break
+            position += 1
+            self.frames_read = position
+
+            yield target, frame
+            target += self.frame_skip
+
+        if self.end_frame is None:
+            self._read_to_end()
+
+    def _read_to_end(self):
+        """
+        Advance `frames_read` over the frames after the last sampled one.
+
+        CAP_PROP_FRAME_COUNT is only an estimate for many containers (and too
+        high for damaged or variable frame rate files), so the remaining frames
+        are grabbed until the stream ends.
+        """
+        if self._seek(self.frames_read, -1) != self.frames_read:
+            return
+        while self.cap.grab():
+            self.frames_read += 1
+
+    def _move_to(self, frame_index: int) -> int:
+        """Position the stream at (or just before) `frame_index` and return the position."""
+        position = 0
+        if frame_index > 0:
+            position = self._seek(frame_index, position)
+            while position < frame_index and self.cap.grab():
+                position += 1
+        self.frames_read = position
+        return position
+
+    def _seek(self, target: int, position: int) -> int:
+        """Seek to `target` and return the position the stream ended up at."""
+        if not self.cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+            return position
+        return int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
@@ -2,74 +2,117 @@
 Video processing service using MediaPipe for landmark extraction.
 """
 import cv2
+import logging
+import math
 import mediapipe as mp
+import multiprocessing
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Callable, List, Tuple
 from django.conf import settings
 from bson import ObjectId
 
-from .models import VideoAnalysis, FrameAnalysis, LandmarkData
-from .db_connection import get_videos_collection, get_analysis_collection
-
-
-# MediaPipe Pose landmark names
-POSE_LANDMARK_NAMES = [
-    'nose',
-    'left_eye_inner',
-    'left_eye',
-    'left_eye_outer',
-    'right_eye_inner',
-    'right_eye',
-    'right_eye_outer',
-    'left_ear',
-    'right_ear',
-    'mouth_left',
-    'mouth_right',
-    'left_shoulder',
-    'right_shoulder',
-    'left_elbow',
-    'right_elbow',
-    'left_wrist',
-    'right_wrist',
-    'left_pinky',
-    'right_pinky',
-    'left_index',
-    'right_index',
-    'left_thumb',
-    'right_thumb',
-    'left_hip',
-    'right_hip',
-    'left_knee',
-    'right_knee',
-    'left_ankle',
-    'right_ankle',
-    'left_heel',
-    'right_heel',
-    'left_foot_index',
-    'right_foot_index',
-]
+from .storage import POSE_LANDMARK_NAMES
+from .sampling import FrameSampler, MotionGate, DuplicateFrameDetector
+from .pipeline import FramePrefetcher, BackgroundBucketWriter, iter_rgb_frames
+from .preprocessing import InferencePreprocessor
+from .model_stages import create_model_stages
+from .temporal import LandmarkSeriesWriter, OneEuroFilter, landmark_list_to_array
+from .audio import extract_audio_features, store_audio_features
+from .delivery_metrics import update_delivery_metrics
+from .lod import update_lod
+from .estimator_pool import create_pose_estimator, get_estimator_pool
+from .analysis_store import (
+    BucketWriter,
+    create_analysis_header,
+    claim_resumable_analysis,
+    touch_analysis,
+    record_checkpoint,
+    discard_buckets,
+    complete_analysis,
+    fail_analysis,
+)
+from .analysis_cache import get_cache_key, get_landmark_config, lookup_cached_analysis, store_cached_analysis
+from .jobs import Heartbeat
+from .db_connection import get_videos_collection
+from .metrics import (
+    REGISTRY,
+    STAGE_SECONDS,
+    STAGE_PREPROCESS,
+    STAGE_INFERENCE,
+    STAGE_VISUALIZATION,
+    FRAMES_SAMPLED,
+    FRAMES_SKIPPED,
+    FRAMES_INTERPOLATED,
+    FRAMES_PROCESSED,
+    ANALYSES,
+    ANALYSIS_SECONDS,
+    ANALYSIS_FPS,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 class VideoProcessingService:
     """Service for processing videos and extracting pose landmarks."""
 
-    def __init__(self):
+    def __init__(self, pose=None):
+        """
+        Args:
+            pose: Pose estimator to use (e.g. checked out from the estimator pool).
+                If omitted, the service creates and owns its own estimator.
+        """
         self.mp_pose = mp.solutions.pose
         self.mp_drawing = mp.solutions.drawing_utils
 
-        # Get MediaPipe configuration from settings
-        mp_config = settings.MEDIAPIPE_CONFIG
-        self.pose = self.mp_pose.Pose(
-            min_detection_confidence=mp_config['min_detection_confidence'],
-            min_tracking_confidence=mp_config['min_tracking_confidence'],
-            model_complexity=mp_config['model_complexity']
-        )
+        self._owns_pose = pose is None
+        self.pose = pose if pose is not None else create_pose_estimator()
 
         # Get video processing configuration
-        self.frame_interval = settings.VIDEO_PROCESSING_CONFIG['frame_interval']
-        self.max_duration = settings.VIDEO_PROCESSING_CONFIG['max_video_duration']
+        processing_config = settings.VIDEO_PROCESSING_CONFIG
+        self.frame_interval = processing_config['frame_interval']
+        self.adaptive_sampling = processing_config['adaptive_sampling']
+        self.min_frame_interval = processing_config['min_frame_interval']
+        self.max_frame_interval = processing_config['max_frame_interval']
+        self.motion_threshold = processing_config['motion_threshold']
+        self.keyframe_stride = max(1, processing_config['keyframe_stride'])
+        self.landmark_smoothing = processing_config['landmark_smoothing']
+        self.smoothing_min_cutoff = processing_config['smoothing_min_cutoff']
+        self.smoothing_beta = processing_config['smoothing_beta']
+        self.smoothing_d_cutoff = processing_config['smoothing_d_cutoff']
+        self.skip_duplicate_frames = processing_config['skip_duplicate_frames']
+        self.duplicate_threshold = processing_config['duplicate_threshold']
+        self.duplicate_max_carry = processing_config['duplicate_max_carry']
+        self.max_duration = processing_config['max_video_duration']
+        self.sampling_strategy = processing_config['sampling_strategy']
+        self.seek_min_frame_gap = processing_config['seek_min_frame_gap']
+        self.debug_visualization = processing_config['debug_visualization']
+        self.segment_workers = get_segment_pool_size()
+        self.min_segment_duration = processing_config['min_segment_duration']
+        self.segment_warmup_frames = processing_config['segment_warmup_frames']
+        self.prefetch_frames = processing_config['prefetch_frames']
+        self.persist_queue_size = processing_config['persist_queue_size']
+        self.inference_max_side = processing_config['inference_max_side']
+        self.roi_crop = processing_config['roi_crop']
+        self.roi_padding = processing_config['roi_padding']
+        self.resume_analyses = processing_config['resume_analyses']
+        self.resume_stale_after = settings.ANALYSIS_JOB_CONFIG['lease_timeout']
+        self.cache_enabled = settings.ANALYSIS_CACHE_CONFIG['enabled']
+        self.delivery_metrics_enabled = settings.DELIVERY_METRICS_CONFIG['enabled']
+        self.lod_enabled = settings.ANALYSIS_LOD_CONFIG['enabled']
+        self.audio_config = settings.AUDIO_ANALYSIS_CONFIG
+        self.landmark_models_config = settings.LANDMARK_MODELS_CONFIG
+
+        storage_config = settings.ANALYSIS_STORAGE_CONFIG
+        self.compression = storage_config['compression']
+        self.bucket_duration = storage_config['bucket_duration']
+        self.bucket_write_batch = storage_config['bucket_write_batch']
 
     def get_video_path(self, video_id: str) -> Optional[str]:
         """
@@ -87,65 +130,52 @@ class VideoProcessingService:
             video_doc = videos_collection.find_one({'_id': ObjectId(video_id)})
 
             if not video_doc:
-                print(f"Video with ID {video_id} not found in database")
+                logger.warning("Video with ID %s not found in database", video_id)
                 return None
 
             filename = video_doc.get('filename')
             if not filename:
-                print(f"Video document {video_id} has no filename")
+                logger.warning("Video document %s has no filename", video_id)
                 return None
 
             video_path = Path(settings.VIDEO_STORAGE_PATH) / filename
 
             if not video_path.exists():
-                print(f"Video file not found at path: {video_path}")
+                logger.warning("Video file not found at path: %s", video_path)
                 return None
 
             return str(video_path)
 
         except Exception as e:
-            print(f"Error getting video path: {e}")
+            logger.exception("Error getting video path: %s", e)
             return None
 
-    def extract_landmarks(self, frame) -> Optional[Dict[str, LandmarkData]]:
+    def detect_pose_rgb(self, rgb_frame):
         """
-        Extract pose landmarks from a single frame.
+        Run pose detection on a frame that is already converted to RGB.
 
         Args:
-            frame: OpenCV frame (BGR image)
+            rgb_frame: RGB image
 
         Returns:
-            Dictionary mapping landmark names to LandmarkData objects,
-            or None if no pose detected
+            MediaPipe pose landmark list, or None if no pose detected
         """
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Process the frame
-        results = self.pose.process(rgb_frame)
-
-        if not results.pose_landmarks:
-            return None
-
-        # Extract landmarks
-        landmarks = {}
-        for idx, landmark in enumerate(results.pose_landmarks.landmark):
-            landmark_name = POSE_LANDMARK_NAMES[idx]
-            landmarks[landmark_name] = LandmarkData(
-                x=landmark.x,
-                y=landmark.y,
-                z=landmark.z,
-                visibility=landmark.visibility
-            )
+        with STAGE_SECONDS.time(stage=STAGE_INFERENCE):
+            results = self.pose.process(rgb_frame)
 
-        return landmarks
+        return results.pose_landmarks
 
-    def save_visualization(self, frame, video_id: str, processed_frame_index: int) -> Optional[str]:
+    def save_visualization(self, frame, pose_landmarks, video_id: str, processed_frame_index: int) -> Optional[str]:
         """
         Save a frame with pose landmarks visualization.
 
+        Draws the detection result that was already computed for the frame,
+        so the pose graph is not run (and its tracking state not advanced)
+        a second time.
+
         Args:
             frame: The video frame to annotate
+            pose_landmarks: MediaPipe pose landmark list detected on the frame
             video_id: The video ID (for subdirectory)
             processed_frame_index: The index of the processed frame (0, 1, 2, ...)
 
@@ -157,171 +187,855 @@ class VideoProcessingService:
             debug_dir = Path(settings.BASE_DIR) / 'debug_output' / video_id
             debug_dir.mkdir(parents=True, exist_ok=True)
 
-            # Convert BGR to RGB for processing
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # Draw landmarks on the frame
+            annotated_frame = frame.copy()
+            self.mp_drawing.draw_landmarks(
+                annotated_frame,
+                pose_landmarks,
+                self.mp_pose.POSE_CONNECTIONS,
+                landmark_drawing_spec=self.mp_drawing.DrawingSpec(
+                    color=(0, 255, 0), thickness=2, circle_radius=3
+                ),
+                connection_drawing_spec=self.mp_drawing.DrawingSpec(
+                    color=(255, 0, 0), thickness=2
+                )
+            )
+
+            # Save the annotated frame
+            output_path = debug_dir / f'frame_{processed_frame_index:04d}.png'
+            cv2.imwrite(str(output_path), annotated_frame)
 
-            # Process the frame
-            results = self.pose.process(rgb_frame)
+            return str(output_path)
 
-            if results.pose_landmarks:
-                # Draw landmarks on the frame
-                annotated_frame = frame.copy()
-                self.mp_drawing.draw_landmarks(
-                    annotated_frame,
-                    results.pose_landmarks,
-                    self.mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=self.mp_drawing.DrawingSpec(
-                        color=(0, 255, 0), thickness=2, circle_radius=3
-                    ),
-                    connection_drawing_spec=self.mp_drawing.DrawingSpec(
-                        color=(255, 0, 0), thickness=2
-                    )
+        except Exception as e:
+            logger.exception("Error saving visualization: %s", e)
+            return None
+
+    def get_bucket_frames(self, fps: float, frame_skip: int) -> int:
+        """Number of video frames per storage bucket (at least one sampled frame)."""
+        return max(frame_skip, int(round(self.bucket_duration * fps)))
+
+    def plan_segments(
+        self,
+        total_frames: int,
+        fps: float,
+        frame_skip: int,
+        bucket_frames: int
+    ) -> List[Tuple[int, Optional[int]]]:
+        """
+        Split a video into time segments that can be analyzed in parallel.
+
+        Segment boundaries fall on the first sampled frame of a storage bucket,
+        so the segments together sample exactly the same frames as a single
+        pass and no bucket is written by two segments.
+
+        Args:
+            total_frames: Number of frames reported by the container
+            fps: Frames per second
+            frame_skip: Number of frames between two sampled frames
+            bucket_frames: Number of video frames per storage bucket
+
+        Returns:
+            List of (start_frame, end_frame) ranges, the last one open ended (None)
+        """
+        duration = total_frames / fps if fps > 0 else 0
+        segment_count = min(self.segment_workers, int(duration // self.min_segment_duration))
+        if segment_count <= 1:
+            return [(0, None)]
+
+        frames_per_segment = math.ceil(total_frames / segment_count)
+        starts = []
+        for index in range(segment_count):
+            bucket_start = math.ceil(index * frames_per_segment / bucket_frames) * bucket_frames
+            start = math.ceil(bucket_start / frame_skip) * frame_skip
+            if start < total_frames and start not in starts:
+                starts.append(start)
+
+        ends = starts[1:] + [None]
+
+        return list(zip(starts, ends))
+
+    def plan_resume(
+        self,
+        analysis_id: ObjectId,
+        segments: List[Tuple[int, Optional[int]]],
+        checkpoints: Dict[str, Dict[str, Any]],
+        frame_skip: int,
+        bucket_frames: int
+    ) -> Tuple[List[Tuple[int, int, Optional[int]]], Dict[int, Dict[str, Any]]]:
+        """
+        Work out what is left to do of a claimed, partially processed analysis.
+
+        Buckets written after a segment's last checkpoint are discarded, and the
+        segment restarts at the first sampled frame after its checkpoint.
+
+        Args:
+            analysis_id: The ObjectId of the claimed analysis header
+            segments: (start_frame, end_frame) ranges stored on the header
+            checkpoints: The header's checkpoints, keyed by segment index
+            frame_skip: Number of frames between two sampled frames
+            bucket_frames: Number of video frames per storage bucket
+
+        Returns:
+            Tuple of the (segment_index, start_frame, end_frame) ranges still to
+            analyze and the checkpoints of completed segments by segment index
+        """
+        remaining = []
+        completed = {}
+
+        for segment_index, (start_frame, end_frame) in enumerate(segments):
+            checkpoint = checkpoints.get(str(segment_index))
+            if checkpoint and checkpoint['complete']:
+                completed[segment_index] = checkpoint
+                continue
+
+            next_frame = checkpoint['next_frame'] if checkpoint else start_frame
+            discard_buckets(
+                analysis_id,
+                next_frame // bucket_frames,
+                end_frame // bucket_frames if end_frame is not None else None
+            )
+
+            resume_frame = max(start_frame, math.ceil(next_frame / frame_skip) * frame_skip)
+            remaining.append((segment_index, resume_frame, end_frame))
+            if checkpoint:
+                logger.info(
+                    "Resuming segment %d at %.2fs", segment_index, checkpoint['timestamp'] or 0.0,
+                    extra={'analysis_id': str(analysis_id)}
                 )
 
-                # Save the annotated frame
-                output_path = debug_dir / f'frame_{processed_frame_index:04d}.png'
-                cv2.imwrite(str(output_path), annotated_frame)
+        return remaining, completed
+
+    def analyze_segment(
+        self,
+        video_path: str,
+        video_id: str,
+        analysis_id: ObjectId,
+        segment_index: int,
+        frame_skip: int,
+        bucket_frames: int,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        debug_visualization: bool = False,
+        progress_callback: Optional[Callable[[float], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract pose landmarks from the sampled frames of one time segment
+        and write them to the analysis' storage buckets.
+
+        Segments that do not start at the beginning of the video first run a
+        few sampled frames before `start_frame` through the estimator (without
+        recording them), so its tracking and smoothing state matches what a
+        single pass over the whole video would have at the boundary.
+
+        Unless VIDEO_PROCESSING_CONFIG['prefetch_frames'] is 0, frames are
+        decoded in a background thread and landmarks persisted in another one
+        while the pose model runs (see pipeline.py). Frames are downscaled
+        and optionally cropped to the speaker before inference (see
+        preprocessing.py); stored landmarks are always relative to the full frame.
+
+        With VIDEO_PROCESSING_CONFIG['keyframe_stride'] above 1, only every
+        N-th sampled frame runs through the estimator and the frames in
+        between are interpolated; the sampler then reads one keyframe past
+        `end_frame` to interpolate up to the segment end (see temporal.py);
+        sampled frames after the last keyframe of the video hold its landmarks.
+        With VIDEO_PROCESSING_CONFIG['skip_duplicate_frames'], frames nearly
+        identical to the last analyzed one reuse its landmarks and are
+        stored as carried forward.
+
+        The models in LANDMARK_MODELS_CONFIG['models'] (face mesh, hands) run
+        on the same decoded frames, each at its own interval and only when
+        the pose shows the face or hands (see model_stages.py).
+
+        Args:
+            video_path: Path to the video file
+            video_id: The video ID (for debug output)
+            analysis_id: The ObjectId of the analysis header the buckets belong to
+            segment_index: Index of the segment in the analysis (for checkpoints)
+            frame_skip: Number of frames between two sampled frames (candidate frames
+                with adaptive sampling)
+            bucket_frames: Number of video frames per storage bucket
+            start_frame: First sampled frame of the segment (or of its resume point)
+            end_frame: Frame index the segment ends before, None for the end of the video
+            debug_visualization: Save annotated frames to debug_output/<video_id>/
+            progress_callback: Called periodically with the processed fraction of the video
+
+        Returns:
+            Dictionary with the segment's frame and bucket counts, max coordinates
+            and sampling details
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise IOError(f"Failed to open video file: {video_path}")
 
-                return str(output_path)
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            # Frames between keyframes are interpolated, not analyzed
+            keyframe_skip = frame_skip * self.keyframe_stride
+            warmup_start = max(0, start_frame - self.segment_warmup_frames * keyframe_skip)
+            sample_end = end_frame
+            if self.keyframe_stride > 1 and end_frame is not None:
+                sample_end = end_frame + keyframe_skip
+
+            motion_gate = None
+            if self.adaptive_sampling:
+                motion_gate = MotionGate(
+                    max(keyframe_skip, int(fps * self.max_frame_interval)),
+                    self.motion_threshold
+                )
+
+            sampler = FrameSampler(
+                cap,
+                video_path,
+                keyframe_skip,
+                strategy=self.sampling_strategy,
+                seek_min_frame_gap=self.seek_min_frame_gap,
+                start_frame=warmup_start,
+                end_frame=sample_end,
+                motion_gate=motion_gate
+            )
+
+            bucket_writer = BucketWriter(
+                analysis_id,
+                segment_index,
+                bucket_frames,
+                fps,
+                self.compression,
+                write_batch=self.bucket_write_batch
+            )
+
+            if self.prefetch_frames > 0:
+                frames = FramePrefetcher(sampler, self.prefetch_frames)
+                writer = BackgroundBucketWriter(bucket_writer, self.persist_queue_size)
             else:
-                return None
+                frames = iter_rgb_frames(sampler)
+                writer = bucket_writer
+
+            smoother = None
+            if self.landmark_smoothing:
+                smoother = OneEuroFilter(self.smoothing_min_cutoff, self.smoothing_beta, self.smoothing_d_cutoff)
+
+            series = LandmarkSeriesWriter(
+                writer,
+                fps,
+                frame_skip,
+                interpolate=self.keyframe_stride > 1,
+                smoother=smoother,
+                start_frame=start_frame,
+                end_frame=end_frame,
+                static_indices=sampler.static_indices
+            )
 
-        except Exception as e:
-            print(f"Error saving visualization: {e}")
-            return None
+            duplicates = None
+            if self.skip_duplicate_frames:
+                duplicates = DuplicateFrameDetector(
+                    self.duplicate_threshold,
+                    max(1, int(fps * self.duplicate_max_carry))
+                )
+
+            preprocessor = InferencePreprocessor(
+                max_side=self.inference_max_side,
+                roi_crop=self.roi_crop,
+                roi_padding=self.roi_padding
+            )
 
-    def process_video(self, video_id: str) -> Dict[str, Any]:
+            model_stages = create_model_stages(
+                self.landmark_models_config['models'],
+                fps,
+                frame_skip,
+                self.landmark_models_config
+            )
+
+            sampled_count = 0
+            stored_count = 0
+            carried_count = 0
+            pose_landmarks = None
+            landmarks = None
+            try:
+                for frame_index, rgb_frame in frames:
+                    sampled_count += 1
+                    if progress_callback and total_frames > 0 and sampled_count % 10 == 0:
+                        progress_callback(min(frame_index / total_frames, 1.0))
+
+                    with STAGE_SECONDS.time(stage=STAGE_PREPROCESS):
+                        duplicate = duplicates is not None and duplicates.is_duplicate(frame_index, rgb_frame)
+
+                    if duplicate:
+                        # Nearly identical to the last analyzed frame, reuse its landmarks
+                        carried_count += 1
+                        series.add(frame_index, landmarks, carried_forward=True)
+                    else:
+                        # Extract landmarks
+                        with STAGE_SECONDS.time(stage=STAGE_PREPROCESS):
+                            inference_frame = preprocessor.prepare(rgb_frame)
+                        pose_landmarks = self.detect_pose_rgb(inference_frame)
+
+                        if preprocessor.roi_crop:
+                            landmark_list = pose_landmarks.landmark if pose_landmarks else None
+                            if landmark_list is not None:
+                                preprocessor.map_landmarks(landmark_list)
+                            if preprocessor.update(landmark_list):
+                                # The tracked pose refers to the previous crop, detect it again
+                                self.pose.reset()
+
+                        landmarks = landmark_list_to_array(pose_landmarks.landmark) if pose_landmarks else None
+
+                        # The other models run on the same frame (warm-up frames are not stored)
+                        model_landmarks = {}
+                        if (
+                            landmarks is not None
+                            and frame_index >= start_frame
+                            and (end_frame is None or frame_index < end_frame)
+                        ):
+                            for stage in model_stages:
+                                model_landmarks.update(stage.process(frame_index, rgb_frame, landmarks))
+
+                        series.add(frame_index, landmarks, model_landmarks=model_landmarks)
+
+                    if (
+                        landmarks is None
+                        or frame_index < start_frame
+                        or (end_frame is not None and frame_index >= end_frame)
+                    ):
+                        continue
+
+                    stored_count += 1
+
+                    # Save visualization for this processed frame
+                    if debug_visualization:
+                        with STAGE_SECONDS.time(stage=STAGE_VISUALIZATION):
+                            self.save_visualization(
+                                cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR),
+                                pose_landmarks,
+                                video_id,
+                                frame_index // frame_skip
+                            )
+
+                    if stored_count % 10 == 0:
+                        logger.debug("Processed %d frames...", stored_count)
+
+                # Sampled frames after the last keyframe (up to the end of the video)
+                series.finish(sampler.frames_read)
+                writer.flush()
+            finally:
+                # The decoder thread has to stop before the capture is released
+                frames.close()
+                if writer is not bucket_writer:
+                    writer.close()
+                for stage in model_stages:
+                    stage.close()
+
+            FRAMES_SAMPLED.inc(sampled_count)
+            if sampler.frames_static:
+                FRAMES_SKIPPED.inc(sampler.frames_static, reason='static')
+            if carried_count:
+                FRAMES_SKIPPED.inc(carried_count, reason='duplicate')
+            FRAMES_INTERPOLATED.inc(series.interpolated_count)
+            FRAMES_PROCESSED.inc(bucket_writer.frame_count)
+
+            result = {
+                'frames_processed': bucket_writer.frame_count,
+                'bucket_count': bucket_writer.bucket_count,
+                'max_x': bucket_writer.max_x,
+                'max_y': bucket_writer.max_y,
+                'frames_read': sampler.frames_read,
+                'sampling_strategy': sampler.strategy,
+                'fourcc': sampler.fourcc
+            }
+
+            record_checkpoint(analysis_id, segment_index, {
+                'next_frame': end_frame if end_frame is not None else sampler.frames_read,
+                'timestamp': bucket_writer.last_timestamp,
+                'complete': True,
+                'frames_read': sampler.frames_read,
+                'sampling_strategy': sampler.strategy,
+                'fourcc': sampler.fourcc
+            })
+
+            return result
+
+        finally:
+            cap.release()
+
+    def process_video(
+        self,
+        video_id: str,
+        debug_visualization: Optional[bool] = None,
+        progress_callback: Optional[Callable[[float], None]] = None,
+        video_path: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Process a video and extract pose landmarks at regular intervals.
+        Process a video and extract pose landmarks at regular (or motion-adaptive) intervals.
+
+        Videos longer than VIDEO_PROCESSING_CONFIG['min_segment_duration'] are
+        split into time segments that are analyzed in parallel worker
+        processes, each with its own pose estimator. Meanwhile the audio track
+        is analyzed for loudness and pitch in a thread (see audio.py).
+
+        Landmarks are written to MongoDB in time buckets while the video is
+        processed; the analysis header is marked complete at the end. If an
+        earlier analysis of the video with the same parameters failed or was
+        abandoned, it is resumed from its checkpoints instead. Videos whose
+        content was already analyzed with the same configuration are answered
+        from the analysis cache.
 
         Args:
             video_id: The MongoDB ObjectId of the video to process
+            debug_visualization: Save annotated frames to debug_output/<video_id>/,
+                defaults to VIDEO_PROCESSING_CONFIG['debug_visualization']
+            progress_callback: Called periodically with the processed fraction of the video (0.0 - 1.0)
+            video_path: Path of the video file if it was already resolved (e.g. for a
+                batch, see jobs.resolve_video_paths()), looked up by get_video_path() otherwise
 
         Returns:
             Dictionary with success status and analysis results
         """
-        # Get video path
-        video_path = self.get_video_path(video_id)
+        started = time.perf_counter()
+        result = self._process_video(video_id, debug_visualization, progress_callback, video_path)
+        elapsed = time.perf_counter() - started
+
+        if not result['success']:
+            ANALYSES.inc(outcome='failed')
+        elif result['cached']:
+            ANALYSES.inc(outcome='cached')
+        else:
+            ANALYSES.inc(outcome='complete')
+            ANALYSIS_SECONDS.observe(elapsed)
+            if not result['resumed'] and elapsed > 0:
+                ANALYSIS_FPS.observe(result['frames_processed'] / elapsed)
+
+        return result
+
+    def _process_video(
+        self,
+        video_id: str,
+        debug_visualization: Optional[bool],
+        progress_callback: Optional[Callable[[float], None]],
+        video_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        # Get video path (a resolved path is looked up again if the file went away since)
+        if not video_path or not os.path.exists(video_path):
+            video_path = self.get_video_path(video_id)
         if not video_path:
             return {
                 'success': False,
-                'error': 'Video not found'
+                'error': 'Video not found',
+                'retryable': False
             }
 
+        if debug_visualization is None:
+            debug_visualization = self.debug_visualization
+
+        # Identical content analyzed with the same configuration is served from the cache
+        # (unless debug frames are requested, which only a real run produces)
+        cache_key = None
+        if self.cache_enabled and not debug_visualization:
+            try:
+                cache_key = get_cache_key(video_path)
+                cached_result = lookup_cached_analysis(cache_key, video_id)
+            except Exception as e:
+                logger.warning("Analysis cache unavailable: %s", e)
+                cache_key = None
+                cached_result = None
+
+            if cached_result:
+                logger.info(
+                    "Analysis cache hit for video %s: %s", video_id, cached_result['analysis_id'],
+                    extra={'video_id': video_id, 'analysis_id': cached_result['analysis_id']}
+                )
+                return cached_result
+
         # Open video
         cap = cv2.VideoCapture(video_path)
 
         if not cap.isOpened():
             return {
                 'success': False,
-                'error': 'Failed to open video file'
+                'error': 'Failed to open video file',
+                'retryable': False
             }
 
-        try:
-            # Get video properties
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            duration = total_frames / fps if fps > 0 else 0
+        # Get video properties
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration = total_frames / fps if fps > 0 else 0
+        cap.release()
 
-            print(f"Processing video: {video_path}")
-            print(f"FPS: {fps}, Total frames: {total_frames}, Duration: {duration:.2f}s")
+        analysis_id = None
+        audio_stop = threading.Event()
+        audio_executor = None
+        heartbeat = None
+        try:
+            logger.info(
+                "Processing video: %s (FPS: %s, total frames: %d, duration: %.2fs)",
+                video_path, fps, total_frames, duration,
+                extra={'video_id': video_id}
+            )
 
             # Check if video is too long
             if duration > self.max_duration:
-                cap.release()
                 return {
                     'success': False,
-                    'error': f'Video duration ({duration:.2f}s) exceeds maximum ({self.max_duration}s)'
+                    'error': f'Video duration ({duration:.2f}s) exceeds maximum ({self.max_duration}s)',
+                    'retryable': False
                 }
 
             # Calculate frame skip interval
-            frame_skip = int(fps * self.frame_interval)
+            frame_interval = self.min_frame_interval if self.adaptive_sampling else self.frame_interval
+            frame_skip = int(fps * frame_interval)
             if frame_skip < 1:
                 frame_skip = 1
 
-            print(f"Processing every {frame_skip} frames ({self.frame_interval}s interval)")
-            print(f"📸 Saving debug visualizations to debug_output/{video_id}/")
-
-            # Create analysis object
-            analysis = VideoAnalysis(video_id=video_id)
-
-            frame_count = 0
-            processed_count = 0
-            max_x = 0.0
-            max_y = 0.0
-
-            while cap.isOpened():
-                ret, frame = cap.read()
-
-                if not ret:
-                    break
-
-                # Process frames at the specified interval
-                if frame_count % frame_skip == 0:
-                    # Calculate timestamp for this frame
-                    timestamp_seconds = frame_count / fps
-                    timestamp = (datetime.min + timedelta(seconds=timestamp_seconds)).time().isoformat()
-
-                    # Extract landmarks
-                    landmarks = self.extract_landmarks(frame)
-
-                    if landmarks:
-                        # Update max coordinates
-                        for landmark in landmarks.values():
-                            max_x = max(max_x, landmark.x)
-                            max_y = max(max_y, landmark.y)
-
-                        frame_analysis = FrameAnalysis(
-                            timestamp=timestamp,
-                            landmarks=landmarks
-                        )
-                        analysis.add_frame_analysis(frame_analysis)
-
-                        # Save visualization for this processed frame
-                        self.save_visualization(frame, video_id, processed_count)
-
-                        processed_count += 1
-
-                        if processed_count % 10 == 0:
-                            print(f"Processed {processed_count} frames...")
-
-                frame_count += 1
-
-            cap.release()
-
-            print(f"Video processing complete. Processed {processed_count} frames out of {frame_count} total frames")
-            print(f"Max coordinates: x={max_x:.4f}, y={max_y:.4f}")
+            if self.adaptive_sampling:
+                logger.info(
+                    "Processing every %d frames while moving, at least every %ss (adaptive sampling)",
+                    frame_skip, self.max_frame_interval
+                )
+            else:
+                logger.info("Processing every %d frames (%ss interval)", frame_skip, self.frame_interval)
+            if debug_visualization:
+                logger.info("Saving debug visualizations to debug_output/%s/", video_id)
+
+            # The audio track is decoded by ffmpeg and analyzed in a thread while the video is processed
+            audio_future = None
+            if self.audio_config['enabled']:
+                audio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='audio-features')
+                audio_future = audio_executor.submit(extract_audio_features, video_path, self.audio_config, audio_stop)
+
+            bucket_frames = self.get_bucket_frames(fps, frame_skip)
+            # Frames analyzed of a resumed analysis have to be selected and processed the same way
+            params = {
+                'frame_skip': frame_skip,
+                'bucket_frames': bucket_frames,
+                'total_frames': total_frames,
+                'config': get_landmark_config()
+            }
 
-            # Set max coordinates on analysis
-            analysis.max_x = max_x
-            analysis.max_y = max_y
+            header = None
+            if self.resume_analyses:
+                header = claim_resumable_analysis(video_id, params, self.resume_stale_after)
 
-            # Save to MongoDB
-            analysis_collection = get_analysis_collection()
-            result = analysis_collection.insert_one(analysis.to_dict())
-            analysis_id = str(result.inserted_id)
+            if header is not None:
+                analysis_id = header['_id']
+                segments = [tuple(segment) for segment in header['segments']]
+                logger.info(
+                    "Resuming analysis %s", analysis_id,
+                    extra={'video_id': video_id, 'analysis_id': str(analysis_id)}
+                )
+                remaining, segment_results = self.plan_resume(
+                    analysis_id,
+                    segments,
+                    header.get('checkpoints', {}),
+                    frame_skip,
+                    bucket_frames
+                )
+            else:
+                segments = self.plan_segments(total_frames, fps, frame_skip, bucket_frames)
+                analysis_id = create_analysis_header(video_id, bucket_frames / fps, params, segments)
+                remaining = [
+                    (segment_index, start_frame, end_frame)
+                    for segment_index, (start_frame, end_frame) in enumerate(segments)
+                ]
+                segment_results = {}
+
+            # Buckets are written in batches and not at all without detected poses, so the
+            # header is touched regularly to keep other workers from claiming it as abandoned
+            heartbeat = Heartbeat(
+                lambda: touch_analysis(analysis_id), self.resume_stale_after / 3, name='analysis-heartbeat'
+            )
+            heartbeat.start()
+
+            if len(remaining) == 1:
+                segment_index, start_frame, end_frame = remaining[0]
+                segment_results[segment_index] = self.analyze_segment(
+                    video_path,
+                    video_id,
+                    analysis_id,
+                    segment_index,
+                    frame_skip,
+                    bucket_frames,
+                    start_frame=start_frame,
+                    end_frame=end_frame,
+                    debug_visualization=debug_visualization,
+                    progress_callback=progress_callback
+                )
+            elif remaining:
+                logger.info("Analyzing %d of %d segments in parallel", len(remaining), len(segments))
+                parallel_results = analyze_segments_in_parallel(
+                    video_path,
+                    video_id,
+                    analysis_id,
+                    frame_skip,
+                    bucket_frames,
+                    remaining,
+                    debug_visualization=debug_visualization,
+                    progress_callback=progress_callback
+                )
+                for (segment_index, _, _), segment_result in zip(remaining, parallel_results):
+                    segment_results[segment_index] = segment_result
+
+            if audio_future is not None:
+                # Each stored frame covers at most the longest sampling interval
+                max_window = self.max_frame_interval if self.adaptive_sampling else frame_skip / fps
+                self._store_audio_features(audio_future, video_id, analysis_id, max_window)
+
+            summary = complete_analysis(analysis_id)
+            max_x = summary['max_x']
+            max_y = summary['max_y']
+            processed_count = summary['total_frames']
+            bucket_count = summary['bucket_count']
+            frame_count = segment_results[len(segments) - 1]['frames_read']
+            sampling_strategy = segment_results[0]['sampling_strategy']
+
+            logger.info(
+                "Video processing complete. Processed %d frames out of %d total frames "
+                "(sampling strategy: %s, codec: %s, max coordinates: x=%.4f, y=%.4f)",
+                processed_count, frame_count, sampling_strategy, segment_results[0]['fourcc'] or 'unknown',
+                max_x, max_y,
+                extra={'video_id': video_id, 'analysis_id': str(analysis_id)}
+            )
+            logger.info("Analysis saved to MongoDB with ID: %s (%d buckets)", analysis_id, bucket_count)
+
+            if self.delivery_metrics_enabled:
+                # Missing metrics are computed again when they are requested
+                try:
+                    update_delivery_metrics(analysis_id)
+                except Exception as e:
+                    logger.warning(
+                        "Could not compute delivery metrics: %s", e,
+                        extra={'video_id': video_id, 'analysis_id': str(analysis_id)}
+                    )
 
-            print(f"Analysis saved to MongoDB with ID: {analysis_id}")
+            if self.lod_enabled:
+                # Missing levels are built again when they are requested
+                try:
+                    update_lod(analysis_id)
+                except Exception as e:
+                    logger.warning(
+                        "Could not build the level-of-detail series: %s", e,
+                        extra={'video_id': video_id, 'analysis_id': str(analysis_id)}
+                    )
 
-            return {
+            result = {
                 'success': True,
-                'analysis_id': analysis_id,
+                'analysis_id': str(analysis_id),
                 'frames_processed': processed_count,
+                'frames_carried_forward': summary['carried_forward_frames'],
+                'model_frames': summary['model_frames'],
                 'total_frames': frame_count,
                 'duration': duration,
                 'max_x': max_x,
-                'max_y': max_y
+                'max_y': max_y,
+                'sampling_strategy': sampling_strategy,
+                'segments': len(segments),
+                'buckets': bucket_count,
+                'resumed': header is not None,
+                'cached': False
             }
 
+            if cache_key:
+                try:
+                    store_cached_analysis(cache_key, video_id, result)
+                except Exception as e:
+                    logger.warning("Failed to cache analysis %s: %s", analysis_id, e)
+
+            return result
+
         except Exception as e:
-            cap.release()
-            print(f"Error processing video: {e}")
+            logger.exception("Error processing video: %s", e, extra={'video_id': video_id})
+            if analysis_id is not None:
+                fail_analysis(analysis_id, str(e))
             return {
                 'success': False,
                 'error': str(e)
             }
+        finally:
+            if heartbeat is not None:
+                heartbeat.stop()
+            audio_stop.set()
+            if audio_executor is not None:
+                audio_executor.shutdown(wait=False)
+
+    def _store_audio_features(self, audio_future, video_id: str, analysis_id: ObjectId, max_window: float):
+        """
+        Wait for the audio features of a video and store them on its analysis; failures are only logged.
+
+        The wait is limited to AUDIO_ANALYSIS_CONFIG['timeout'] seconds, after
+        that the analysis is stored without audio.
+        """
+        started = time.perf_counter()
+        try:
+            features = audio_future.result(timeout=self.audio_config['timeout'])
+            if features is None:
+                return
+            audio_summary = store_audio_features(analysis_id, features, self.audio_config, max_window)
+        except FutureTimeoutError:
+            logger.warning(
+                "The audio track was not analyzed within %ss, storing the analysis without audio",
+                self.audio_config['timeout'],
+                extra={'video_id': video_id, 'analysis_id': str(analysis_id)}
+            )
+            return
+        except Exception as e:
+            logger.warning(
+                "Could not analyze the audio track: %s", e,
+                extra={'video_id': video_id, 'analysis_id': str(analysis_id)}
+            )
+            return
+
+        logger.info(
+            "Audio features stored (waited %.2fs for the audio track, voiced: %.0f%%, median pitch: %s Hz)",
+            time.perf_counter() - started, audio_summary['voiced_ratio'] * 100, audio_summary['pitch_median'],
+            extra={'video_id': video_id, 'analysis_id': str(analysis_id)}
+        )
 
     def __del__(self):
         """Cleanup resources."""
-        if hasattr(self, 'pose'):
+        if getattr(self, '_owns_pose', False):
             self.pose.close()
+
+
+_segment_executor: Optional[ProcessPoolExecutor] = None
+
+# Analysis worker processes on this host that can each start a segment pool (see configure_segment_pool())
+_job_workers = 1
+
+
+def configure_segment_pool(job_workers: int):
+    """Share the CPU cores among the segment pools of `job_workers` analysis worker processes."""
+    global _job_workers
+    _job_workers = max(1, job_workers)
+
+
+def get_segment_pool_size() -> int:
+    """
+    Number of processes a video is analyzed in.
+
+    VIDEO_PROCESSING_CONFIG['segment_workers'], capped so the segment pools of
+    all analysis workers together run at most one process per CPU core.
+    """
+    cores_per_worker = (os.cpu_count() or 1) // _job_workers
+    return max(1, min(settings.VIDEO_PROCESSING_CONFIG['segment_workers'], cores_per_worker))
+
+
+def _init_segment_worker():
+    """Set up Django in a freshly spawned segment worker process."""
+    import django
+    django.setup()
+
+
+def _analyze_segment_in_worker(
+    video_path: str,
+    video_id: str,
+    analysis_id: ObjectId,
+    segment_index: int,
+    frame_skip: int,
+    bucket_frames: int,
+    start_frame: int,
+    end_frame: Optional[int],
+    debug_visualization: bool
+) -> Dict[str, Any]:
+    """
+    Analyze one segment with an estimator from the worker process' own pool.
+
+    The metrics recorded while analyzing the segment are returned under
+    'metrics' so the parent process can add them to its own registry.
+    """
+    REGISTRY.reset()
+    with get_estimator_pool().estimator() as pose:
+        service = VideoProcessingService(pose=pose)
+        result = service.analyze_segment(
+            video_path,
+            video_id,
+            analysis_id,
+            segment_index,
+            frame_skip,
+            bucket_frames,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            debug_visualization=debug_visualization
+        )
+    result['metrics'] = REGISTRY.snapshot()
+    return result
+
+
+def get_segment_executor() -> ProcessPoolExecutor:
+    """Get the process pool used for segment analysis, creating it on first use."""
+    global _segment_executor
+
+    if _segment_executor is None:
+        _segment_executor = ProcessPoolExecutor(
+            max_workers=get_segment_pool_size(),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_segment_worker
+        )
+    return _segment_executor
+
+
+def analyze_segments_in_parallel(
+    video_path: str,
+    video_id: str,
+    analysis_id: ObjectId,
+    frame_skip: int,
+    bucket_frames: int,
+    segments: List[Tuple[int, int, Optional[int]]],
+    debug_visualization: bool = False,
+    progress_callback: Optional[Callable[[float], None]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Analyze video segments in the segment process pool.
+
+    Args:
+        video_path: Path to the video file
+        video_id: The video ID (for debug output)
+        analysis_id: The ObjectId of the analysis header the buckets belong to
+        frame_skip: Number of frames between two sampled frames
+        bucket_frames: Number of video frames per storage bucket
+        segments: (segment_index, start_frame, end_frame) ranges to analyze
+        debug_visualization: Save annotated frames to debug_output/<video_id>/
+        progress_callback: Called with the fraction of finished segments
+
+    Returns:
+        Segment results in the same order as `segments`
+    """
+    executor = get_segment_executor()
+    futures = {
+        executor.submit(
+            _analyze_segment_in_worker,
+            video_path,
+            video_id,
+            analysis_id,
+            segment_index,
+            frame_skip,
+            bucket_frames,
+            start_frame,
+            end_frame,
+            debug_visualization
+        ): index
+        for index, (segment_index, start_frame, end_frame) in enumerate(segments)
+    }
+
+    results = [None] * len(segments)
+    try:
+        for finished, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            REGISTRY.merge(result.pop('metrics'))
+            results[futures[future]] = result
+            if progress_callback:
+                progress_callback(finished / len(segments))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory), start with a fresh pool next time
+        global _segment_executor
+        _segment_executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    except Exception:
+        # Let segments that are already running finish before the analysis is
+        # marked failed, so a resumed analysis never writes buckets concurrently with them
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        raise
+
+    return results
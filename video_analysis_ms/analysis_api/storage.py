@@ -0,0 +1,388 @@
+"""
+Columnar storage format for analysis documents.
+
+Schema version 2 stores the landmarks of all frames as one packed float32
+block of shape (frames, 33, 4) in a BSON binary field, next to a plain array
+of frame timestamps in seconds:
+
+    {
+        'schema_version': 2,
+        'timestamps': [0.0, 0.2, ...],
+        'landmarks': {
+            'dtype': 'float32',
+            'shape': [frames, 33, 4],
+            'fields': ['x', 'y', 'z', 'visibility'],
+            'byte_shuffle': True,
+            'compression': 'zlib',
+            'data': Binary(...)
+        },
+        ...
+    }
+
+Schema version 3 splits the same layout into fixed-length time buckets: the
+analysis document is only a header with aggregates, and each bucket document
+in `analysis_buckets` holds the timestamps and packed landmarks of its frames
+(see analysis_store.py).
+
+Documents without `schema_version` use the legacy layout, where `data` is a
+list of frames with one dict per named landmark.
+"""
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from bson import Binary
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA_VERSION_LEGACY = 1
+SCHEMA_VERSION_COLUMNAR = 2
+SCHEMA_VERSION_BUCKETED = 3
+
+# MediaPipe Pose landmark names, in the order of the packed landmark axis
+POSE_LANDMARK_NAMES = [
+    'nose',
+    'left_eye_inner',
+    'left_eye',
+    'left_eye_outer',
+    'right_eye_inner',
+    'right_eye',
+    'right_eye_outer',
+    'left_ear',
+    'right_ear',
+    'mouth_left',
+    'mouth_right',
+    'left_shoulder',
+    'right_shoulder',
+    'left_elbow',
+    'right_elbow',
+    'left_wrist',
+    'right_wrist',
+    'left_pinky',
+    'right_pinky',
+    'left_index',
+    'right_index',
+    'left_thumb',
+    'right_thumb',
+    'left_hip',
+    'right_hip',
+    'left_knee',
+    'right_knee',
+    'left_ankle',
+    'right_ankle',
+    'left_heel',
+    'right_heel',
+    'left_foot_index',
+    'right_foot_index',
+]
+
+LANDMARK_FIELDS = ['x', 'y', 'z', 'visibility']
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_ZLIB = 'zlib'
+COMPRESSION_ZSTD = 'zstd'
+
+FORMAT_COLUMNAR = 'columnar'
+FORMAT_LEGACY = 'legacy'
+RESPONSE_FORMATS = (FORMAT_COLUMNAR, FORMAT_LEGACY)
+
+VIEW_SUMMARY = 'summary'
+VIEW_FULL = 'full'
+RESPONSE_VIEWS = (VIEW_SUMMARY, VIEW_FULL)
+
+# Document fields holding landmark data (or internal state), excluded from summaries
+DATA_FIELDS = ('data', 'timestamps', 'landmarks', 'buckets', 'checkpoints')
+
+# Bookkeeping fields of bucketed headers (resume, heartbeat) that are not returned to clients
+INTERNAL_FIELDS = ('params', 'params_hash', 'segments', 'updated_at')
+
+# MongoDB projection that loads an analysis document without its landmark data
+SUMMARY_PROJECTION = {field: 0 for field in DATA_FIELDS if field != 'buckets'}
+
+
+def format_timestamp(timestamp_seconds: float) -> str:
+    """Format a video position in seconds as HH:MM:SS.ffffff."""
+    return (datetime.min + timedelta(seconds=timestamp_seconds)).time().isoformat()
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """Parse a HH:MM:SS.ffffff timestamp back to seconds."""
+    hours, minutes, seconds = timestamp.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def resolve_compression(compression: str) -> str:
+    """Fall back to zlib when zstd is requested but the zstandard package is missing."""
+    if compression == COMPRESSION_ZSTD and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to zlib compression")
+        return COMPRESSION_ZLIB
+    return compression
+
+
+def _compress(data: bytes, compression: str, level: Optional[int]) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=level or 3).compress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(data, level or 6)
+    return data
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Analysis is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def pack_landmarks(
+    landmarks: np.ndarray,
+    compression: str = COMPRESSION_NONE,
+    level: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Pack a (frames, 33, 4) landmark array into a BSON binary block.
+
+    The bytes are shuffled (all first bytes of every float, then all second
+    bytes, ...) before compression, which makes float data compress noticeably better.
+
+    Args:
+        landmarks: Landmark array of shape (frames, landmarks, 4)
+        compression: One of 'none', 'zlib' or 'zstd'
+        level: Compression level, defaults to the codec's default
+
+    Returns:
+        Dictionary describing and holding the packed block
+    """
+    compression = resolve_compression(compression)
+    array = np.ascontiguousarray(landmarks, dtype='<f4')
+    shuffled = array.view(np.uint8).reshape(-1, 4).T.tobytes()
+
+    return {
+        'dtype': 'float32',
+        'shape': list(array.shape),
+        'fields': LANDMARK_FIELDS,
+        'byte_shuffle': True,
+        'compression': compression,
+        'data': Binary(_compress(shuffled, compression, level))
+    }
+
+
+def unpack_landmarks(block: Dict[str, Any]) -> np.ndarray:
+    """
+    Unpack a block created by pack_landmarks().
+
+    Args:
+        block: Packed landmark block
+
+    Returns:
+        float32 array of shape block['shape']
+    """
+    data = _decompress(bytes(block['data']), block.get('compression', COMPRESSION_NONE))
+    buffer = np.frombuffer(data, dtype=np.uint8)
+
+    if block.get('byte_shuffle'):
+        buffer = buffer.reshape(4, -1).T
+
+    return np.ascontiguousarray(buffer).view('<f4').reshape(block['shape'])
+
+
+def legacy_frames_to_array(frames: List[Dict[str, Any]]) -> np.ndarray:
+    """Convert legacy frame dicts to a (frames, 33, 4) float32 array."""
+    array = np.zeros((len(frames), len(POSE_LANDMARK_NAMES), len(LANDMARK_FIELDS)), dtype=np.float32)
+    for frame_index, frame in enumerate(frames):
+        landmarks = frame['landmarks']
+        for landmark_index, name in enumerate(POSE_LANDMARK_NAMES):
+            landmark = landmarks[name]
+            array[frame_index, landmark_index] = [landmark[field] for field in LANDMARK_FIELDS]
+    return array
+
+
+def array_to_legacy_frames(
+    timestamps: List[float],
+    landmarks: np.ndarray,
+    landmark_names: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Expand timestamps and a (frames, landmarks, 4) array to legacy frame dicts.
+
+    Args:
+        timestamps: Frame timestamps in seconds
+        landmarks: Landmark array
+        landmark_names: Names of the landmarks on the array's second axis, defaults to all 33
+    """
+    names = landmark_names or POSE_LANDMARK_NAMES
+    frames = []
+    for timestamp, frame in zip(timestamps, landmarks.tolist()):
+        frames.append({
+            'timestamp': format_timestamp(timestamp),
+            'landmarks': {
+                name: dict(zip(LANDMARK_FIELDS, values))
+                for name, values in zip(names, frame)
+            }
+        })
+    return frames
+
+
+def convert_legacy_document(doc: Dict[str, Any], compression: str = COMPRESSION_NONE) -> Dict[str, Any]:
+    """
+    Convert a legacy analysis document to the columnar schema.
+
+    Args:
+        doc: Legacy analysis document (with a 'data' list)
+        compression: Compression of the landmark block
+
+    Returns:
+        New document with the same fields, 'data' replaced by columnar fields
+    """
+    frames = doc.get('data', [])
+    converted = {key: value for key, value in doc.items() if key != 'data'}
+    converted['schema_version'] = SCHEMA_VERSION_COLUMNAR
+    converted['timestamps'] = [parse_timestamp(frame['timestamp']) for frame in frames]
+    converted['landmarks'] = pack_landmarks(legacy_frames_to_array(frames), compression)
+    return converted
+
+
+def get_schema_version(doc: Dict[str, Any]) -> int:
+    """Get the storage schema version of an analysis document."""
+    return doc.get('schema_version', SCHEMA_VERSION_LEGACY)
+
+
+def assemble_buckets(buckets: List[Dict[str, Any]]):
+    """
+    Concatenate bucket documents (in bucket order) to one landmark series.
+
+    Returns:
+        Tuple of (timestamps in seconds, (frames, 33, 4) float32 array)
+    """
+    timestamps = []
+    arrays = []
+    for bucket in buckets:
+        timestamps.extend(bucket['timestamps'])
+        arrays.append(unpack_landmarks(bucket['landmarks']))
+
+    if not arrays:
+        return timestamps, np.zeros((0, len(POSE_LANDMARK_NAMES), len(LANDMARK_FIELDS)), dtype=np.float32)
+    return timestamps, np.concatenate(arrays)
+
+
+def load_landmark_series(doc: Dict[str, Any]):
+    """
+    Load the timestamps and landmark array of an analysis document of any schema version.
+
+    Bucketed (version 3) headers must have their bucket documents attached
+    as `buckets` (see analysis_store.attach_buckets()).
+
+    Returns:
+        Tuple of (timestamps in seconds, (frames, 33, 4) float32 array)
+    """
+    schema_version = get_schema_version(doc)
+
+    if schema_version == SCHEMA_VERSION_LEGACY:
+        frames = doc.get('data', [])
+        return [parse_timestamp(frame['timestamp']) for frame in frames], legacy_frames_to_array(frames)
+
+    if schema_version == SCHEMA_VERSION_BUCKETED:
+        return assemble_buckets(doc.get('buckets', []))
+
+    return doc['timestamps'], unpack_landmarks(doc['landmarks'])
+
+
+def slice_landmark_series(
+    timestamps: List[float],
+    landmarks: np.ndarray,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    landmark_names: Optional[List[str]] = None
+):
+    """
+    Select a time range and a subset of landmarks from a landmark series.
+
+    Args:
+        timestamps: Frame timestamps in seconds
+        landmarks: (frames, 33, 4) landmark array
+        start: Keep frames at or after this many seconds
+        end: Keep frames before this many seconds
+        landmark_names: Keep only these landmarks (in this order)
+
+    Returns:
+        Tuple of (timestamps, landmark array) of the selection
+    """
+    if start is not None or end is not None:
+        timestamp_array = np.asarray(timestamps, dtype=np.float64)
+        mask = np.ones(len(timestamp_array), dtype=bool)
+        if start is not None:
+            mask &= timestamp_array >= start
+        if end is not None:
+            mask &= timestamp_array < end
+        timestamps = timestamp_array[mask].tolist()
+        landmarks = landmarks[mask]
+
+    if landmark_names is not None:
+        landmarks = landmarks[:, [POSE_LANDMARK_NAMES.index(name) for name in landmark_names]]
+
+    return timestamps, landmarks
+
+
+def serialize_analysis(
+    doc: Dict[str, Any],
+    response_format: str = FORMAT_COLUMNAR,
+    view: str = VIEW_FULL,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    landmark_names: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Convert a stored analysis document to its JSON representation.
+
+    Args:
+        doc: Analysis document as stored in MongoDB
+        response_format: 'columnar' for timestamps plus nested landmark lists,
+            'legacy' for the original per-frame dict layout
+        view: 'full' to include the landmarks, 'summary' for the document fields only
+        start: Only include frames at or after this many seconds
+        end: Only include frames before this many seconds
+        landmark_names: Only include these landmarks, defaults to all 33
+
+    Returns:
+        JSON serializable dictionary
+    """
+    result = {
+        key: value for key, value in doc.items()
+        if key not in DATA_FIELDS and key not in INTERNAL_FIELDS and key != 'schema_version'
+    }
+    result['_id'] = str(doc['_id'])
+    if 'cloned_from' in result:
+        result['cloned_from'] = str(result['cloned_from'])
+
+    if view == VIEW_SUMMARY:
+        return result
+
+    sliced = start is not None or end is not None or landmark_names is not None
+    if response_format == FORMAT_LEGACY and get_schema_version(doc) == SCHEMA_VERSION_LEGACY and not sliced:
+        result['data'] = doc.get('data', [])
+        return result
+
+    timestamps, landmarks = slice_landmark_series(*load_landmark_series(doc), start, end, landmark_names)
+
+    if response_format == FORMAT_LEGACY:
+        result['data'] = array_to_legacy_frames(timestamps, landmarks, landmark_names)
+    else:
+        result['format'] = FORMAT_COLUMNAR
+        result['timestamps'] = timestamps
+        result['landmark_names'] = landmark_names or POSE_LANDMARK_NAMES
+        result['fields'] = LANDMARK_FIELDS
+        result['landmarks'] = landmarks.tolist()
+
+    return result
@@ -0,0 +1,197 @@
+"""
+Streaming serialization of analyses.
+
+Instead of building the whole response in memory, the landmarks are encoded
+one storage bucket at a time while the buckets are read from a MongoDB
+cursor, so memory use does not depend on the length of the analysis and the
+first bytes are sent right away.
+
+Two stream formats are supported:
+
+- 'json': the same document as the regular JSON response, written
+  incrementally. In the columnar format the buckets are read twice, first
+  only their timestamps, then their landmarks.
+- 'ndjson': one JSON object per line. The first line holds the analysis
+  fields (plus format, landmark_names and fields), every following line is
+  one frame: {"timestamp": ..., "landmarks": [[x, y, z, visibility], ...]}
+  in the columnar format, the per-frame dict in the legacy format.
+"""
+import json
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import numpy as np
+from rest_framework.utils.encoders import JSONEncoder
+
+from .storage import (
+    POSE_LANDMARK_NAMES,
+    LANDMARK_FIELDS,
+    SCHEMA_VERSION_LEGACY,
+    SCHEMA_VERSION_BUCKETED,
+    FORMAT_COLUMNAR,
+    FORMAT_LEGACY,
+    VIEW_SUMMARY,
+    get_schema_version,
+    load_landmark_series,
+    slice_landmark_series,
+    array_to_legacy_frames,
+    serialize_analysis,
+)
+from .analysis_store import iter_bucket_series
+
+
+STREAM_JSON = 'json'
+STREAM_NDJSON = 'ndjson'
+STREAM_FORMATS = (STREAM_JSON, STREAM_NDJSON)
+
+STREAM_CONTENT_TYPES = {
+    STREAM_JSON: 'application/json',
+    STREAM_NDJSON: 'application/x-ndjson',
+}
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, cls=JSONEncoder, separators=(',', ':'))
+
+
+def _iter_series(
+    doc: Dict[str, Any],
+    start: Optional[float],
+    end: Optional[float],
+    landmark_names: Optional[List[str]],
+    with_landmarks: bool = True
+) -> Iterator[Tuple[List[float], Optional[np.ndarray]]]:
+    """Yield the selected (timestamps, landmarks) of an analysis, one bucket at a time."""
+    if get_schema_version(doc) == SCHEMA_VERSION_BUCKETED:
+        batches = iter_bucket_series(doc, start, end, with_landmarks)
+    else:
+        # Single-document analyses are already fully loaded
+        timestamps, landmarks = load_landmark_series(doc)
+        batches = [(timestamps, landmarks if with_landmarks else None)]
+
+    for timestamps, landmarks in batches:
+        if landmarks is None:
+            yield [
+                timestamp for timestamp in timestamps
+                if (start is None or timestamp >= start) and (end is None or timestamp < end)
+            ], None
+        else:
+            yield slice_landmark_series(timestamps, landmarks, start, end, landmark_names)
+
+
+def _iter_legacy_frames(
+    doc: Dict[str, Any],
+    start: Optional[float],
+    end: Optional[float],
+    landmark_names: Optional[List[str]]
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield batches of legacy per-frame dicts."""
+    sliced = start is not None or end is not None or landmark_names is not None
+    if get_schema_version(doc) == SCHEMA_VERSION_LEGACY and not sliced:
+        yield doc.get('data', [])
+        return
+
+    for timestamps, landmarks in _iter_series(doc, start, end, landmark_names):
+        yield array_to_legacy_frames(timestamps, landmarks, landmark_names)
+
+
+def _json_items(batches: Iterator[list]) -> Iterator[str]:
+    """Encode batches of list items as the comma separated body of one JSON array."""
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        chunk = _dumps(batch)[1:-1]
+        yield chunk if first else ',' + chunk
+        first = False
+
+
+def stream_analysis_json(
+    doc: Dict[str, Any],
+    response_format: str = FORMAT_COLUMNAR,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    landmark_names: Optional[List[str]] = None
+) -> Iterator[str]:
+    """
+    Stream the JSON response of get_analysis for an analysis document.
+
+    Args:
+        doc: Analysis document (the header of a bucketed analysis)
+        response_format: 'columnar' or 'legacy'
+        start: Only include frames at or after this many seconds
+        end: Only include frames before this many seconds
+        landmark_names: Only include these landmarks, defaults to all 33
+
+    Yields:
+        Chunks of the JSON document
+    """
+    header = serialize_analysis(doc, response_format, view=VIEW_SUMMARY)
+    envelope = _dumps({'success': True, 'analysis': header})
+
+    # Leave the analysis object open and append the landmark fields
+    yield envelope[:-2]
+
+    if response_format == FORMAT_LEGACY:
+        yield ',"data":['
+        yield from _json_items(_iter_legacy_frames(doc, start, end, landmark_names))
+        yield ']}}'
+        return
+
+    yield ',' + _dumps({
+        'format': FORMAT_COLUMNAR,
+        'landmark_names': landmark_names or POSE_LANDMARK_NAMES,
+        'fields': LANDMARK_FIELDS,
+    })[1:-1]
+
+    yield ',"timestamps":['
+    yield from _json_items(
+        timestamps for timestamps, _ in _iter_series(doc, start, end, landmark_names, with_landmarks=False)
+    )
+    yield '],"landmarks":['
+    yield from _json_items(
+        landmarks.tolist() for _, landmarks in _iter_series(doc, start, end, landmark_names)
+    )
+    yield ']}}'
+
+
+def stream_analysis_ndjson(
+    doc: Dict[str, Any],
+    response_format: str = FORMAT_COLUMNAR,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    landmark_names: Optional[List[str]] = None
+) -> Iterator[str]:
+    """
+    Stream an analysis as newline delimited JSON (header line, then one line per frame).
+
+    Args:
+        See stream_analysis_json()
+
+    Yields:
+        Chunks of lines
+    """
+    header = serialize_analysis(doc, response_format, view=VIEW_SUMMARY)
+    header['format'] = response_format
+    header['landmark_names'] = landmark_names or POSE_LANDMARK_NAMES
+    header['fields'] = LANDMARK_FIELDS
+    yield _dumps(header) + '\n'
+
+    if response_format == FORMAT_LEGACY:
+        for frames in _iter_legacy_frames(doc, start, end, landmark_names):
+            if frames:
+                yield ''.join(_dumps(frame) + '\n' for frame in frames)
+        return
+
+    for timestamps, landmarks in _iter_series(doc, start, end, landmark_names):
+        if timestamps:
+            yield ''.join(
+                _dumps({'timestamp': timestamp, 'landmarks': frame}) + '\n'
+                for timestamp, frame in zip(timestamps, landmarks.tolist())
+            )
+
+
+def stream_analysis(doc: Dict[str, Any], stream_format: str, **options) -> Iterator[str]:
+    """Stream an analysis in the given stream format ('json' or 'ndjson')."""
+    if stream_format == STREAM_NDJSON:
+        return stream_analysis_ndjson(doc, **options)
+    return stream_analysis_json(doc, **options)
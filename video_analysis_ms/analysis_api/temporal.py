@@ -0,0 +1,346 @@
+"""
+Temporal reconstruction and smoothing of landmark series.
+
+With VIDEO_PROCESSING_CONFIG['keyframe_stride'] above 1 the pose model only
+runs on every N-th sampled frame (the keyframes). The landmarks of the
+sampled frames in between are reconstructed by linear interpolation between
+the surrounding keyframes, weighted by landmark visibility: a landmark that
+was barely visible in one keyframe pulls the interpolated position less than
+a clearly visible one.
+
+With VIDEO_PROCESSING_CONFIG['landmark_smoothing'] the stored series is
+passed through a One-Euro filter (Casiez et al., 2012): an exponential
+smoother whose cutoff frequency rises with the landmark's speed, so jitter
+of a still speaker is removed while fast gestures are not delayed. Low
+visibility landmarks are smoothed more strongly.
+
+interpolate_landmarks() and OneEuroFilter.filter() work on whole
+(frames, 33, 4) arrays; LandmarkSeriesWriter applies them between every
+pair of keyframes while a segment is analyzed, so the series is never held
+in memory as a whole.
+"""
+import math
+from typing import Deque, Dict, Optional
+
+import numpy as np
+
+from .models import LANDMARK_COUNT, FIELD_COUNT, VISIBILITY
+
+
+# Visibility sums below this are treated as "not visible in either keyframe"
+_MIN_WEIGHT = 1e-6
+
+
+def landmark_list_to_array(landmark_list) -> np.ndarray:
+    """Convert a MediaPipe landmark list to a (33, 4) float32 array of x, y, z, visibility."""
+    return np.array(
+        [(landmark.x, landmark.y, landmark.z, landmark.visibility) for landmark in landmark_list],
+        dtype=np.float32
+    )
+
+
+def interpolate_landmarks(
+    key_timestamps: np.ndarray,
+    key_landmarks: np.ndarray,
+    timestamps: np.ndarray
+) -> np.ndarray:
+    """
+    Interpolate a keyframe series at other timestamps.
+
+    Coordinates are interpolated linearly between the two surrounding
+    keyframes, with each keyframe's weight multiplied by the landmark's
+    visibility in it. Visibility itself is interpolated linearly. Timestamps
+    outside the keyframe range take the nearest keyframe.
+
+    Args:
+        key_timestamps: Keyframe timestamps in seconds, ascending (shape (keyframes,))
+        key_landmarks: Keyframe landmarks (shape (keyframes, 33, 4))
+        timestamps: Timestamps to reconstruct (shape (frames,))
+
+    Returns:
+        (frames, 33, 4) float32 array
+    """
+    key_timestamps = np.asarray(key_timestamps, dtype=np.float64)
+    key_landmarks = np.asarray(key_landmarks, dtype=np.float32)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+
+    if len(key_timestamps) == 1:
+        return np.repeat(key_landmarks, len(timestamps), axis=0)
+
+    right = np.clip(np.searchsorted(key_timestamps, timestamps, side='right'), 1, len(key_timestamps) - 1)
+    left = right - 1
+
+    span = key_timestamps[right] - key_timestamps[left]
+    fraction = np.divide(
+        timestamps - key_timestamps[left],
+        span,
+        out=np.zeros_like(timestamps),
+        where=span > 0
+    )
+    fraction = np.clip(fraction, 0.0, 1.0).astype(np.float32)[:, None]
+
+    left_landmarks = key_landmarks[left]
+    right_landmarks = key_landmarks[right]
+    left_visibility = left_landmarks[:, :, VISIBILITY]
+    right_visibility = right_landmarks[:, :, VISIBILITY]
+
+    left_weight = (1 - fraction) * left_visibility
+    right_weight = fraction * right_visibility
+    total_weight = left_weight + right_weight
+
+    # Landmarks invisible in both keyframes fall back to plain linear interpolation
+    invisible = total_weight < _MIN_WEIGHT
+    left_weight = np.where(invisible, 1 - fraction, left_weight)
+    right_weight = np.where(invisible, fraction, right_weight)
+    total_weight = left_weight + right_weight
+
+    result = np.empty((len(timestamps), LANDMARK_COUNT, FIELD_COUNT), dtype=np.float32)
+    result[:, :, :3] = (
+        left_weight[:, :, None] * left_landmarks[:, :, :3]
+        + right_weight[:, :, None] * right_landmarks[:, :, :3]
+    ) / total_weight[:, :, None]
+    result[:, :, VISIBILITY] = (1 - fraction) * left_visibility + fraction * right_visibility
+    return result
+
+
+def _smoothing_factor(elapsed: float, cutoff: np.ndarray) -> np.ndarray:
+    """Exponential smoothing factor for a cutoff frequency (Hz) and sample period (s)."""
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / elapsed)
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter over the x, y and z of all landmarks at once.
+
+    The filter is stateful, consecutive calls of filter() continue the same
+    series. Visibility values are passed through unchanged.
+    """
+
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 5.0, d_cutoff: float = 1.0):
+        """
+        Args:
+            min_cutoff: Cutoff frequency in Hz of a still landmark (lower = smoother)
+            beta: Increase of the cutoff per unit of speed (normalized coordinates per second)
+            d_cutoff: Cutoff frequency in Hz of the speed estimate
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        """Forget the series, the next frame passes unfiltered."""
+        self._timestamp: Optional[float] = None
+        self._value: Optional[np.ndarray] = None
+        self._speed: Optional[np.ndarray] = None
+
+    def filter(self, timestamps: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
+        """
+        Filter the next frames of the series.
+
+        Args:
+            timestamps: Frame timestamps in seconds, ascending (shape (frames,))
+            landmarks: Landmarks of the frames (shape (frames, 33, 4))
+
+        Returns:
+            Filtered (frames, 33, 4) float32 array (a new array)
+        """
+        result = np.array(landmarks, dtype=np.float32)
+
+        for index, timestamp in enumerate(timestamps):
+            value = result[index, :, :3].astype(np.float64)
+            visibility = result[index, :, VISIBILITY:VISIBILITY + 1].astype(np.float64)
+
+            if self._timestamp is None:
+                self._timestamp = timestamp
+                self._value = value
+                self._speed = np.zeros_like(value)
+                continue
+
+            elapsed = timestamp - self._timestamp
+            if elapsed <= 0:
+                result[index, :, :3] = self._value
+                continue
+
+            speed = (value - self._value) / elapsed
+            self._speed += _smoothing_factor(elapsed, self.d_cutoff) * (speed - self._speed)
+
+            cutoff = self.min_cutoff + self.beta * np.abs(self._speed)
+            # A barely visible landmark mostly keeps its filtered position
+            alpha = _smoothing_factor(elapsed, cutoff) * visibility
+            self._value = self._value + alpha * (value - self._value)
+            self._timestamp = timestamp
+
+            result[index, :, :3] = self._value
+
+        return result
+
+
+class LandmarkSeriesWriter:
+    """
+    Turn the landmarks of analyzed frames into the stored series.
+
+    Fills the sampled frames between two keyframes by interpolation, smooths
+    the series and passes the frames of the segment (from `start_frame`
+    up to `end_frame`) to a BucketWriter. Keyframes before and after that
+    range (warm-up and look-ahead) only shape the interpolation and filter.
+    Sampled frames after the last keyframe have no keyframe to interpolate
+    towards; finish() stores them with the last keyframe's landmarks.
+
+    Only the keyframe interval the sampler actually walked over is filled: a
+    gap up to a keyframe that follows candidates the motion gate passed over
+    as static is filled from the last of them on (the frames before it are
+    left out like the static candidates themselves). The frames before a
+    duplicate keyframe, whose landmarks were carried forward, are carried
+    forward as well.
+    """
+
+    def __init__(
+        self,
+        writer,
+        fps: float,
+        frame_skip: int,
+        interpolate: bool = False,
+        smoother: Optional[OneEuroFilter] = None,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        static_indices: Optional[Deque[int]] = None
+    ):
+        """
+        Args:
+            writer: BucketWriter (or BackgroundBucketWriter) the frames are added to
+            fps: Frames per second of the video
+            frame_skip: Number of frames between two stored frames
+            interpolate: Reconstruct the sampled frames between keyframes
+            smoother: Filter applied to the series, None stores it as detected
+            start_frame: First frame that is stored
+            end_frame: Frame index storing ends before, None for the end of the video
+            static_indices: FrameSampler.static_indices of the keyframes' sampler, consumed
+                as the keyframes are added
+        """
+        self.writer = writer
+        self.fps = fps
+        self.frame_skip = frame_skip
+        self.interpolate = interpolate
+        self.smoother = smoother
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.static_indices = static_indices
+
+        # Frames reconstructed by interpolation and passed to the writer
+        self.interpolated_count = 0
+
+        self._previous_index: Optional[int] = None
+        self._previous_landmarks: Optional[np.ndarray] = None
+
+    def add(
+        self,
+        frame_index: int,
+        landmarks: Optional[np.ndarray],
+        carried_forward: bool = False,
+        model_landmarks: Optional[Dict[str, np.ndarray]] = None
+    ):
+        """
+        Add the result of an analyzed frame.
+
+        Args:
+            frame_index: Index of the frame in the video
+            landmarks: (33, 4) landmark array, None if no pose was detected
+            carried_forward: The landmarks were copied from the previous analyzed frame
+            model_landmarks: Landmarks of additional models that ran on the frame, by model
+                name (stored as detected, without interpolation or smoothing)
+        """
+        fill_start = self._fill_start(frame_index)
+
+        if landmarks is None:
+            # Never interpolate or smooth across frames without a pose
+            self._previous_index = None
+            self._previous_landmarks = None
+            if self.smoother is not None:
+                self.smoother.reset()
+            return
+
+        indices = [frame_index]
+        if self.interpolate and fill_start is not None:
+            indices = list(range(fill_start + self.frame_skip, frame_index, self.frame_skip)) + indices
+
+        frame_indices = np.asarray(indices)
+        timestamps = frame_indices / self.fps
+
+        if len(indices) > 1:
+            # From the previous keyframe, or from the last static candidate, which showed its pose
+            key_indices = np.asarray([fill_start, frame_index])
+            series = interpolate_landmarks(
+                key_indices / self.fps,
+                np.stack([self._previous_landmarks, landmarks]),
+                timestamps
+            )
+        else:
+            series = landmarks[None]
+
+        if self.smoother is not None:
+            series = self.smoother.filter(timestamps, series)
+
+        self._previous_index = frame_index
+        self._previous_landmarks = landmarks
+
+        for position, index in enumerate(indices):
+            if index < self.start_frame or (self.end_frame is not None and index >= self.end_frame):
+                continue
+            if index == frame_index:
+                self.writer.add_landmarks(
+                    index, float(timestamps[position]), series[position], carried_forward, model_landmarks
+                )
+            elif carried_forward:
+                # Between the keyframe and its duplicate, nothing was analyzed either
+                self.writer.add_landmarks(index, float(timestamps[position]), series[position], carried_forward=True)
+            else:
+                self.writer.add_landmarks(index, float(timestamps[position]), series[position])
+                self.interpolated_count += 1
+
+    def _fill_start(self, before_index: int) -> Optional[int]:
+        """
+        Index the sampled frames up to `before_index` are filled after.
+
+        Consumes the static candidates before `before_index` and returns the
+        last of them after the previous keyframe, else the previous keyframe
+        (None without one).
+        """
+        fill_start = self._previous_index
+        while self.static_indices and self.static_indices[0] < before_index:
+            static_index = self.static_indices.popleft()
+            if fill_start is not None and static_index > fill_start:
+                fill_start = static_index
+        return fill_start
+
+    def finish(self, end_index: int):
+        """
+        Store the sampled frames after the last keyframe, up to (excluding) `end_index`.
+
+        The frames hold the last keyframe's landmarks and are stored as carried forward.
+
+        Args:
+            end_index: Index of the frame the sampled video ended before
+        """
+        fill_start = self._fill_start(end_index)
+        if not self.interpolate or fill_start is None:
+            return
+        if self.end_frame is not None:
+            end_index = min(end_index, self.end_frame)
+
+        indices = [
+            index for index in range(fill_start + self.frame_skip, end_index, self.frame_skip)
+            if index >= self.start_frame
+        ]
+        if not indices:
+            return
+
+        timestamps = np.asarray(indices) / self.fps
+        series = np.repeat(self._previous_landmarks[None], len(indices), axis=0)
+        if self.smoother is not None:
+            series = self.smoother.filter(timestamps, series)
+
+        self._previous_index = indices[-1]
+        for position, index in enumerate(indices):
+            self.writer.add_landmarks(index, float(timestamps[position]), series[position], carried_forward=True)
@@ -0,0 +1,84 @@
+"""Test doubles shared by the analysis tests."""
+import os
+
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from analysis_api.models import LANDMARK_COUNT
+
+
+def write_test_video(path: str, frame_count: int, fps: float = 30.0, size=(160, 120)):
+    """Write an mp4 whose frames have distinct gray levels (frame i is 40 + 2 * i, wrapping at 256)."""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for frame_index in range(frame_count):
+        writer.write(np.full((height, width, 3), (40 + frame_index * 2) % 256, dtype=np.uint8))
+    writer.release()
+    return os.path.abspath(path)
+
+
+def make_landmark_list(x: float = 0.5, y: float = 0.5, visibility: float = 0.9) -> landmark_pb2.NormalizedLandmarkList:
+    """A pose landmark list with all landmarks at the same position."""
+    landmark_list = landmark_pb2.NormalizedLandmarkList()
+    for _ in range(LANDMARK_COUNT):
+        landmark_list.landmark.add(x=x, y=y, z=0.0, visibility=visibility)
+    return landmark_list
+
+
+class _Results:
+    def __init__(self, pose_landmarks):
+        self.pose_landmarks = pose_landmarks
+
+
+class FakePoseEstimator:
+    """
+    Stands in for mp.solutions.pose.Pose and counts how it is used.
+
+    With `from_frame`, the landmarks' x is the frame's mean gray level / 255,
+    so stored landmarks identify the frame they were detected on.
+    """
+
+    def __init__(self, landmark_list=None, from_frame: bool = False):
+        self.landmark_list = landmark_list if landmark_list is not None else make_landmark_list()
+        self.from_frame = from_frame
+        self.process_calls = 0
+        self.reset_calls = 0
+        self.closed = False
+
+    def process(self, rgb_frame):
+        self.process_calls += 1
+        if self.from_frame:
+            return _Results(make_landmark_list(x=float(rgb_frame.mean()) / 255))
+        return _Results(self.landmark_list)
+
+    def reset(self):
+        self.reset_calls += 1
+
+    def close(self):
+        self.closed = True
+
+
+def insert_analysis(video_id: str = 'video', frame_count: int = 50, fps: float = 5.0, bucket_duration: float = 2.0,
+                    seed: int = 0, complete: bool = True):
+    """
+    Store a bucketed analysis of random landmarks, one frame per video frame.
+
+    Returns:
+        Tuple of the analysis ObjectId, the frame timestamps and the (frames, 33, 4) landmarks
+    """
+    from analysis_api.analysis_store import BucketWriter, create_analysis_header, complete_analysis
+
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(frame_count) / fps
+    landmarks = rng.random((frame_count, LANDMARK_COUNT, 4), dtype=np.float32)
+
+    bucket_frames = int(round(bucket_duration * fps))
+    analysis_id = create_analysis_header(video_id, bucket_duration, {'frame_skip': 1}, [(0, None)])
+    writer = BucketWriter(analysis_id, 0, bucket_frames, fps, 'zlib')
+    for frame_index in range(frame_count):
+        writer.add_landmarks(frame_index, float(timestamps[frame_index]), landmarks[frame_index])
+    writer.flush()
+    if complete:
+        complete_analysis(analysis_id)
+    return analysis_id, timestamps, landmarks
@@ -0,0 +1,114 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from analysis_api.analysis_cache import evict_cache_entries, invalidate_analysis, invalidate_video
+from analysis_api.analysis_store import iter_bucket_series
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.db_connection import get_analysis_cache_collection, get_analysis_collection
+from analysis_api.services import VideoProcessingService
+from analysis_api.tests.fakes import FakePoseEstimator, write_test_video
+
+
+class AnalysisCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.video_path = write_test_video(os.path.join(directory, 'video.mp4'), frame_count=30)
+        self.enterContext(self.settings(
+            AUDIO_ANALYSIS_CONFIG={**settings.AUDIO_ANALYSIS_CONFIG, 'enabled': False},
+            ANALYSIS_CACHE_CONFIG={**settings.ANALYSIS_CACHE_CONFIG, 'enabled': True},
+            VIDEO_PROCESSING_CONFIG={**settings.VIDEO_PROCESSING_CONFIG, 'segment_workers': 1}
+        ))
+
+    def _process(self, video_id):
+        pose = FakePoseEstimator(from_frame=True)
+        result = VideoProcessingService(pose=pose).process_video(video_id, video_path=self.video_path)
+        self.assertTrue(result['success'])
+        return result, pose
+
+    def _series(self, analysis_id):
+        doc = get_analysis_collection().find_one({'_id': analysis_id})
+        timestamps, landmarks = zip(*iter_bucket_series(doc))
+        return np.concatenate(timestamps), np.concatenate(landmarks)
+
+    def test_repeated_analysis_is_a_hit(self):
+        first, _ = self._process('video')
+        second, pose = self._process('video')
+
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['analysis_id'], first['analysis_id'])
+        self.assertEqual(second['frames_processed'], first['frames_processed'])
+        self.assertEqual(pose.process_calls, 0)
+        self.assertEqual(get_analysis_collection().count_documents({}), 1)
+        self.assertEqual(get_analysis_cache_collection().find_one()['hits'], 1)
+
+    def test_identical_upload_gets_a_clone(self):
+        first, _ = self._process('video')
+        second, pose = self._process('reupload')
+
+        self.assertTrue(second['cached'])
+        self.assertNotEqual(second['analysis_id'], first['analysis_id'])
+        self.assertEqual(pose.process_calls, 0)
+
+        clone = get_analysis_collection().find_one({'video_id': 'reupload'})
+        self.assertEqual(str(clone['_id']), second['analysis_id'])
+        source = get_analysis_collection().find_one({'video_id': 'video'})
+        source_timestamps, source_landmarks = self._series(source['_id'])
+        clone_timestamps, clone_landmarks = self._series(clone['_id'])
+        np.testing.assert_array_equal(clone_timestamps, source_timestamps)
+        np.testing.assert_array_equal(clone_landmarks, source_landmarks)
+        self.assertCountEqual(get_analysis_cache_collection().find_one()['video_ids'], ['video', 'reupload'])
+
+    def test_invalidated_video_is_analyzed_again(self):
+        self._process('video')
+        self.assertEqual(invalidate_video('video'), 1)
+
+        result, pose = self._process('video')
+
+        self.assertFalse(result['cached'])
+        self.assertGreater(pose.process_calls, 0)
+
+    def test_configuration_change_misses(self):
+        self._process('video')
+        with self.settings(MEDIAPIPE_CONFIG={**settings.MEDIAPIPE_CONFIG, 'model_complexity': 2}):
+            result, pose = self._process('video')
+
+        self.assertFalse(result['cached'])
+        self.assertGreater(pose.process_calls, 0)
+        self.assertEqual(get_analysis_cache_collection().count_documents({}), 2)
+
+    def test_deleted_analysis_is_not_served(self):
+        first, _ = self._process('video')
+        get_analysis_collection().delete_many({})
+
+        result, _ = self._process('video')
+
+        self.assertFalse(result['cached'])
+        self.assertNotEqual(result['analysis_id'], first['analysis_id'])
+
+    def test_invalidate_analysis(self):
+        self._process('video')
+        doc = get_analysis_collection().find_one()
+        self.assertEqual(invalidate_analysis(doc['_id']), 1)
+        self.assertEqual(get_analysis_cache_collection().count_documents({}), 0)
+
+
+class EvictCacheEntriesTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        now = datetime.utcnow()
+        get_analysis_cache_collection().insert_many([
+            {'_id': f'entry-{age}', 'last_hit_at': now - timedelta(days=age)} for age in (0, 1, 2, 40)
+        ])
+
+    def test_drops_stale_then_least_recently_hit(self):
+        self.assertEqual(evict_cache_entries(max_entries=2, max_age_days=30), 2)
+
+        remaining = sorted(entry['_id'] for entry in get_analysis_cache_collection().find())
+        self.assertEqual(remaining, ['entry-0', 'entry-1'])
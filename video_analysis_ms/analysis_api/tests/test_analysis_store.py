@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from analysis_api.analysis_store import (
+    ANALYSIS_PROCESSING,
+    ANALYSIS_COMPLETE,
+    ANALYSIS_FAILED,
+    BucketWriter,
+    attach_buckets,
+    claim_resumable_analysis,
+    complete_analysis,
+    create_analysis_header,
+    iter_bucket_series,
+    touch_analysis,
+)
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.services import VideoProcessingService
+from analysis_api.tests.fakes import FakePoseEstimator
+from analysis_api.db_connection import get_analysis_collection, get_analysis_buckets_collection
+
+
+PARAMS = {'frame_skip': 2, 'bucket_frames': 900, 'total_frames': 3000, 'config': {'processing': {'keyframe_stride': 1}}}
+
+STALE_AFTER = 60
+
+
+class BucketWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        self.analysis_id = create_analysis_header('video', 2.0, {'frame_skip': 5}, [(0, None)])
+        self.landmarks = np.random.default_rng(0).random((30, 33, 4), dtype=np.float32)
+
+    def _write(self, writer, frame_count=30, frame_skip=5, fps=25.0):
+        for position in range(frame_count):
+            frame_index = position * frame_skip
+            writer.add_landmarks(
+                frame_index, frame_index / fps, self.landmarks[position], carried_forward=position % 10 == 3
+            )
+
+    def _header(self):
+        return get_analysis_collection().find_one({'_id': self.analysis_id})
+
+    def test_frames_are_written_in_time_buckets(self):
+        # 50 video frames (2 s at 25 fps) per bucket, every 5th frame is stored
+        writer = BucketWriter(self.analysis_id, 0, bucket_frames=50, fps=25.0, compression='zlib')
+        self._write(writer)
+        writer.flush()
+
+        buckets = list(get_analysis_buckets_collection().find().sort('bucket_index', 1))
+        self.assertEqual([bucket['bucket_index'] for bucket in buckets], [0, 1, 2])
+        self.assertEqual([bucket['start_time'] for bucket in buckets], [0.0, 2.0, 4.0])
+        self.assertEqual([bucket['frame_count'] for bucket in buckets], [10, 10, 10])
+        self.assertEqual(buckets[1]['carried_forward'], [3])
+
+        timestamps, landmarks = zip(*iter_bucket_series(self._header()))
+        np.testing.assert_allclose(np.concatenate(timestamps), np.arange(30) * 0.2)
+        np.testing.assert_array_equal(np.concatenate(landmarks), self.landmarks)
+
+    def test_buckets_are_written_in_batches_with_checkpoints(self):
+        writer = BucketWriter(self.analysis_id, 0, bucket_frames=50, fps=25.0, compression='zlib', write_batch=2)
+        self._write(writer, frame_count=25)
+
+        # Two buckets were closed and written in one batch, the third is still open
+        self.assertEqual(get_analysis_buckets_collection().count_documents({}), 2)
+        checkpoint = self._header()['checkpoints']['0']
+        self.assertEqual(checkpoint['next_frame'], 100)
+        self.assertAlmostEqual(checkpoint['timestamp'], 3.8)
+
+        writer.flush()
+        self.assertEqual(get_analysis_buckets_collection().count_documents({}), 3)
+        self.assertEqual(self._header()['checkpoints']['0']['next_frame'], 150)
+
+    def test_complete_analysis_sums_the_buckets(self):
+        writer = BucketWriter(self.analysis_id, 0, bucket_frames=50, fps=25.0, compression='zlib')
+        self._write(writer)
+        writer.flush()
+
+        summary = complete_analysis(self.analysis_id)
+
+        self.assertEqual(summary['total_frames'], 30)
+        self.assertEqual(summary['carried_forward_frames'], 3)
+        self.assertEqual(summary['bucket_count'], 3)
+        self.assertAlmostEqual(summary['max_x'], float(self.landmarks[:, :, 0].max()), places=6)
+        self.assertEqual(self._header()['status'], 'complete')
+
+    def test_attach_buckets_reads_only_the_overlapping_buckets(self):
+        writer = BucketWriter(self.analysis_id, 0, bucket_frames=50, fps=25.0, compression='zlib')
+        self._write(writer)
+        writer.flush()
+
+        doc = attach_buckets(self._header(), start=2.5, end=4.0)
+        self.assertEqual([bucket['timestamps'][0] for bucket in doc['buckets']], [2.0])
+
+
+class ClaimResumableAnalysisTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+
+    def _create(self, status, params=PARAMS, age=0):
+        analysis_id = create_analysis_header('video', 30.0, params, [(0, None)])
+        get_analysis_collection().update_one(
+            {'_id': analysis_id},
+            {'$set': {'status': status, 'updated_at': datetime.utcnow() - timedelta(seconds=age)}}
+        )
+        return analysis_id
+
+    def test_failed_analysis_is_resumed(self):
+        analysis_id = self._create(ANALYSIS_FAILED)
+
+        claimed = claim_resumable_analysis('video', PARAMS, STALE_AFTER)
+
+        self.assertEqual(claimed['_id'], analysis_id)
+        self.assertEqual(claimed['status'], ANALYSIS_PROCESSING)
+        self.assertIsNone(claim_resumable_analysis('video', PARAMS, STALE_AFTER))
+
+    def test_params_must_match_exactly(self):
+        self._create(ANALYSIS_FAILED)
+
+        changed_config = {**PARAMS, 'config': {'processing': {'keyframe_stride': 3}}}
+        extra_param = {**PARAMS, 'max_frames': 100}
+        for params in (changed_config, extra_param, {'frame_skip': 2}):
+            with self.subTest(params=params):
+                self.assertIsNone(claim_resumable_analysis('video', params, STALE_AFTER))
+
+        # Key order does not matter
+        self.assertIsNotNone(claim_resumable_analysis('video', dict(reversed(PARAMS.items())), STALE_AFTER))
+
+    def test_live_analysis_is_not_resumed(self):
+        analysis_id = self._create(ANALYSIS_PROCESSING, age=STALE_AFTER * 2)
+        touch_analysis(analysis_id)
+
+        self.assertIsNone(claim_resumable_analysis('video', PARAMS, STALE_AFTER))
+
+    def test_stale_analysis_is_resumed(self):
+        analysis_id = self._create(ANALYSIS_PROCESSING, age=STALE_AFTER * 2)
+
+        self.assertEqual(claim_resumable_analysis('video', PARAMS, STALE_AFTER)['_id'], analysis_id)
+
+    def test_complete_analysis_is_not_resumed(self):
+        self._create(ANALYSIS_COMPLETE, age=STALE_AFTER * 2)
+
+        self.assertIsNone(claim_resumable_analysis('video', PARAMS, STALE_AFTER))
+
+
+class PlanResumeTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        self.analysis_id = create_analysis_header('video', 2.0, PARAMS, [(0, 100), (100, None)])
+        get_analysis_buckets_collection().insert_many([
+            {'analysis_id': self.analysis_id, 'bucket_index': bucket_index} for bucket_index in range(6)
+        ])
+
+    def test_restarts_unfinished_segments_after_their_checkpoint(self):
+        checkpoints = {
+            '0': {'next_frame': 100, 'timestamp': 3.2, 'complete': True},
+            '1': {'next_frame': 160, 'timestamp': 5.2, 'complete': False},
+        }
+        service = VideoProcessingService(pose=FakePoseEstimator())
+
+        remaining, completed = service.plan_resume(
+            self.analysis_id, [(0, 100), (100, None)], checkpoints, frame_skip=6, bucket_frames=40
+        )
+
+        self.assertEqual(list(completed), [0])
+        # The first sampled frame at or after the checkpoint
+        self.assertEqual(remaining, [(1, 162, None)])
+        # Buckets from the checkpoint on were written after it and are discarded
+        bucket_indexes = [bucket['bucket_index'] for bucket in get_analysis_buckets_collection().find()]
+        self.assertEqual(sorted(bucket_indexes), [0, 1, 2, 3])
+
+    def test_segment_without_checkpoint_starts_over(self):
+        service = VideoProcessingService(pose=FakePoseEstimator())
+
+        remaining, completed = service.plan_resume(
+            self.analysis_id, [(0, 100), (100, None)], {}, frame_skip=5, bucket_frames=40
+        )
+
+        self.assertEqual(completed, {})
+        self.assertEqual(remaining, [(0, 0, 100), (1, 100, None)])
+        self.assertEqual(get_analysis_buckets_collection().count_documents({}), 0)
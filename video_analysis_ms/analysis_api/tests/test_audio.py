@@ -0,0 +1,89 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from analysis_api.audio import AudioFeatureExtractor, align_audio_features
+
+
+SAMPLE_RATE = 16000
+
+
+def _tone(frequency, duration=1.0, amplitude=0.5, harmonics=1):
+    """A tone with `harmonics` equally loud partials at multiples of the frequency."""
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    signal = sum(np.sin(2 * np.pi * frequency * partial * t) for partial in range(1, harmonics + 1))
+    return (amplitude * signal / harmonics).astype(np.float32)
+
+
+def _extract(samples, chunk_samples=None):
+    extractor = AudioFeatureExtractor(sample_rate=SAMPLE_RATE)
+    chunk_samples = chunk_samples or len(samples)
+    for start in range(0, len(samples), chunk_samples):
+        extractor.feed(samples[start:start + chunk_samples])
+    return extractor.result()
+
+
+class AudioFeatureExtractorTests(SimpleTestCase):
+    def test_pitch_of_a_pure_tone(self):
+        for frequency in (90.0, 220.0, 380.0):
+            with self.subTest(frequency=frequency):
+                _, _, pitch = _extract(_tone(frequency))
+
+                self.assertFalse(np.isnan(pitch).any())
+                np.testing.assert_allclose(pitch, frequency, rtol=0.01)
+
+    def test_pitch_of_a_voice_like_tone_is_its_fundamental(self):
+        # Strong harmonics must not be mistaken for the pitch (octave errors)
+        _, _, pitch = _extract(_tone(150.0, harmonics=6))
+        self.assertAlmostEqual(float(np.median(pitch)), 150.0, delta=1.5)
+
+    def test_loudness(self):
+        _, loudness, _ = _extract(_tone(220.0, amplitude=0.5))
+        # RMS of a sine is its amplitude / sqrt(2)
+        np.testing.assert_allclose(loudness, 20 * np.log10(0.5 / np.sqrt(2)), atol=0.1)
+
+    def test_silence_and_noise_have_no_pitch(self):
+        _, loudness, pitch = _extract(np.zeros(SAMPLE_RATE, dtype=np.float32))
+        self.assertTrue(np.isnan(pitch).all())
+        self.assertTrue((loudness <= -100).all())
+
+        noise = np.random.default_rng(0).normal(0, 0.2, SAMPLE_RATE).astype(np.float32)
+        _, _, pitch = _extract(noise)
+        self.assertLess(np.count_nonzero(~np.isnan(pitch)) / len(pitch), 0.1)
+
+    def test_chunks_give_the_same_contours(self):
+        samples = np.concatenate([_tone(200.0, 0.5), np.zeros(4000, dtype=np.float32), _tone(300.0, 0.5)])
+        whole = _extract(samples)
+        chunked = _extract(samples, chunk_samples=777)
+
+        for values, chunked_values in zip(whole, chunked):
+            np.testing.assert_allclose(chunked_values, values)
+
+    def test_frame_timestamps(self):
+        timestamps, loudness, _ = _extract(_tone(220.0, duration=0.5))
+        extractor = AudioFeatureExtractor(sample_rate=SAMPLE_RATE)
+
+        self.assertEqual(len(timestamps), len(loudness))
+        self.assertAlmostEqual(timestamps[0], extractor.frame_samples / 2 / SAMPLE_RATE)
+        np.testing.assert_allclose(np.diff(timestamps), 0.01)
+
+
+class AlignAudioFeaturesTests(SimpleTestCase):
+    def test_energy_mean_loudness_and_geometric_mean_pitch(self):
+        audio_timestamps = np.array([0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+        loudness = np.array([-20.0, -20.0, -10.0, -10.0, -100.0, -100.0])
+        pitch = np.array([100.0, 400.0, np.nan, 200.0, np.nan, np.nan])
+
+        frame_loudness, frame_pitch = align_audio_features(
+            np.array([0.05, 0.25, 0.45]), audio_timestamps, loudness, pitch, max_window=1.0
+        )
+
+        np.testing.assert_allclose(frame_loudness[:2], [-20.0, -10.0], atol=1e-6)
+        np.testing.assert_allclose(frame_pitch[:2], [200.0, 200.0])
+        self.assertTrue(np.isnan(frame_pitch[2]))
+
+    def test_frames_without_audio(self):
+        frame_loudness, frame_pitch = align_audio_features(
+            np.array([5.0]), np.array([0.0, 0.1]), np.array([-20.0, -20.0]), np.array([100.0, 100.0]), 0.4
+        )
+        self.assertTrue(np.isnan(frame_loudness[0]))
+        self.assertTrue(np.isnan(frame_pitch[0]))
@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from pymongo import ASCENDING, DESCENDING
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.db_connection import INDEXES, ensure_indexes, find_missing_indexes
+
+
+class FindMissingIndexesTests(SimpleTestCase):
+    def setUp(self):
+        self.db = self.enterContext(in_memory_mongodb())
+
+    def test_reports_every_declared_index_of_an_empty_database(self):
+        missing = find_missing_indexes()
+
+        self.assertEqual(missing.keys(), INDEXES.keys())
+        self.assertEqual(missing['analysis'], ['video_id_newest', 'video_id_status_created_at', 'created_at'])
+
+    def test_nothing_missing_after_ensure_indexes(self):
+        created = ensure_indexes()
+
+        self.assertEqual(
+            created, {name: [index.document['name'] for index in indexes] for name, indexes in INDEXES.items()}
+        )
+        self.assertEqual(find_missing_indexes(), {})
+        self.assertEqual(ensure_indexes(), {})
+
+    def test_index_created_under_another_name_counts(self):
+        self.db['analysis'].create_index([('video_id', ASCENDING), ('_id', DESCENDING)], name='by_hand')
+
+        self.assertNotIn('video_id_newest', find_missing_indexes()['analysis'])
+
+    def test_check_command_exits_with_missing_indexes(self):
+        with self.assertRaises(SystemExit):
+            call_command('ensure_indexes', '--check', stdout=StringIO())
+
+        ensure_indexes()
+        out = StringIO()
+        call_command('ensure_indexes', '--check', stdout=out)
+        self.assertIn('All indexes exist', out.getvalue())
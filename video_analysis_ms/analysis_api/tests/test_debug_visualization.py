@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.services import VideoProcessingService
+from analysis_api.tests.fakes import FakePoseEstimator, write_test_video
+
+
+class DebugVisualizationTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(self.settings(
+            BASE_DIR=directory,
+            AUDIO_ANALYSIS_CONFIG={**settings.AUDIO_ANALYSIS_CONFIG, 'enabled': False}
+        ))
+        self.debug_dir = os.path.join(directory, 'debug_output', 'video')
+        self.video_path = write_test_video(os.path.join(directory, 'video.mp4'), frame_count=60)
+        self.pose = FakePoseEstimator()
+        self.service = VideoProcessingService(pose=self.pose)
+
+    def test_debug_frames_reuse_the_pose_result(self):
+        result = self.service.process_video('video', debug_visualization=True, video_path=self.video_path)
+
+        self.assertTrue(result['success'])
+        # One inference per analyzed frame, the debug frame draws its result
+        self.assertEqual(self.pose.process_calls, result['frames_processed'])
+        self.assertEqual(len(os.listdir(self.debug_dir)), result['frames_processed'])
+
+    def test_debug_frames_are_opt_in(self):
+        result = self.service.process_video('video', video_path=self.video_path)
+
+        self.assertTrue(result['success'])
+        self.assertFalse(os.path.exists(self.debug_dir))
@@ -0,0 +1,139 @@
+import numpy as np
+from bson import ObjectId
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.db_connection import get_delivery_metrics_collection
+from analysis_api.delivery_metrics import (
+    LEFT_EYE,
+    LEFT_HIP,
+    LEFT_SHOULDER,
+    LEFT_WRIST,
+    NOSE,
+    RIGHT_EYE,
+    RIGHT_HIP,
+    RIGHT_SHOULDER,
+    RIGHT_WRIST,
+    compute_delivery_metrics,
+)
+from analysis_api.tests.fakes import insert_analysis
+
+
+def _speaker(timestamps, hip_x=0.0, nose_x=0.0, right_wrist_x=0.0):
+    """
+    A visible speaker facing the camera, shoulders 0.2 apart (one shoulder width).
+
+    The keyword arguments are offsets per frame (or constant) added to the x of the landmarks.
+    """
+    landmarks = np.zeros((len(timestamps), 33, 4), dtype=np.float32)
+    landmarks[:, :, 3] = 1.0
+    positions = {
+        LEFT_SHOULDER: (0.4, 0.4), RIGHT_SHOULDER: (0.6, 0.4),
+        LEFT_HIP: (0.45, 0.7), RIGHT_HIP: (0.55, 0.7),
+        LEFT_EYE: (0.48, 0.2), RIGHT_EYE: (0.52, 0.2), NOSE: (0.5, 0.22),
+        LEFT_WRIST: (0.35, 0.6), RIGHT_WRIST: (0.65, 0.6),
+    }
+    for landmark, (x, y) in positions.items():
+        landmarks[:, landmark, 0] = x
+        landmarks[:, landmark, 1] = y
+    landmarks[:, [LEFT_HIP, RIGHT_HIP], 0] += np.asarray(hip_x, dtype=np.float32).reshape(-1, 1)
+    landmarks[:, NOSE, 0] += nose_x
+    landmarks[:, RIGHT_WRIST, 0] += right_wrist_x
+    return landmarks
+
+
+class ComputeDeliveryMetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.timestamps = np.arange(600) / 10.0
+
+    def test_still_speaker(self):
+        metrics = compute_delivery_metrics(self.timestamps, _speaker(self.timestamps))
+
+        self.assertEqual(metrics['duration'], 59.8)
+        self.assertEqual(metrics['pose_coverage'], 1.0)
+        self.assertEqual(metrics['hips']['sway_amplitude'], 0.0)
+        self.assertEqual(metrics['hand_gestures']['rate_per_minute'], 0.0)
+        self.assertAlmostEqual(metrics['hand_gestures']['openness'], 1.5, places=3)
+        self.assertEqual(metrics['eye_contact'], {'facing_ratio': 1.0, 'longest_look_away': 0.0})
+        self.assertEqual(metrics['stage']['distance'], 0.0)
+        self.assertEqual(len(metrics['timeline']['hip_sway']), 6)
+
+    def test_hip_sway(self):
+        # 0.1 shoulder widths at 0.5 Hz
+        sway = 0.02 * np.sin(2 * np.pi * 0.5 * self.timestamps)
+        hips = compute_delivery_metrics(self.timestamps, _speaker(self.timestamps, hip_x=sway))['hips']
+
+        self.assertAlmostEqual(hips['sway_frequency'], 0.5, delta=0.02)
+        self.assertAlmostEqual(hips['sway_amplitude'], 0.1 / np.sqrt(2), delta=0.01)
+
+    def test_looking_away(self):
+        # A nose one eye distance to the side for the second half
+        nose_x = np.where(self.timestamps >= 30, 0.04, 0.0)
+        eye_contact = compute_delivery_metrics(self.timestamps, _speaker(self.timestamps, nose_x=nose_x))['eye_contact']
+
+        self.assertAlmostEqual(eye_contact['facing_ratio'], 0.5, delta=0.02)
+        self.assertAlmostEqual(eye_contact['longest_look_away'], 30.0, delta=0.5)
+
+    def test_gestures(self):
+        # Three one-second gestures of the right hand, out and back at three shoulder widths per second
+        wrist_x = np.zeros(len(self.timestamps))
+        for start in (10.1, 30.1, 50.1):
+            progress = self.timestamps - start
+            gesture = (progress >= 0) & (progress < 1)
+            wrist_x[gesture] = 0.6 * np.minimum(progress[gesture], 1 - progress[gesture])
+
+        hands = compute_delivery_metrics(self.timestamps, _speaker(self.timestamps, right_wrist_x=wrist_x))
+        hands = hands['hand_gestures']
+
+        self.assertEqual(hands['rate_per_minute'], 3.0)
+        self.assertGreater(hands['active_ratio'], 0.0)
+        self.assertLess(hands['active_ratio'], 0.1)
+
+    def test_walking_across_the_stage(self):
+        hip_x = np.linspace(-0.2, 0.2, len(self.timestamps))
+        stage = compute_delivery_metrics(self.timestamps, _speaker(self.timestamps, hip_x=hip_x))['stage']
+
+        self.assertAlmostEqual(stage['distance'], 2.0, delta=0.1)
+        self.assertAlmostEqual(stage['coverage'], 0.36, delta=0.02)
+        # Too slow to count as moving
+        self.assertEqual(stage['moving_ratio'], 0.0)
+
+    def test_gap_without_a_pose(self):
+        timestamps = self.timestamps[(self.timestamps < 20) | (self.timestamps >= 40)]
+        metrics = compute_delivery_metrics(timestamps, _speaker(timestamps), max_gap=1.0)
+
+        self.assertAlmostEqual(metrics['pose_coverage'], 0.7, delta=0.03)
+
+    def test_shorter_than_the_smoothing_windows(self):
+        timestamps = np.arange(10) / 5.0
+        metrics = compute_delivery_metrics(timestamps, _speaker(timestamps))
+
+        self.assertEqual(metrics['duration'], 1.8)
+        self.assertEqual(metrics['hips']['sway_amplitude'], 0.0)
+        self.assertEqual(len(metrics['timeline']['movement']), 1)
+
+    def test_single_frame(self):
+        metrics = compute_delivery_metrics([0.0], _speaker([0.0]))
+        self.assertIsNone(metrics['pose_coverage'])
+
+
+class DeliveryMetricsEndpointTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+
+    def test_computed_once_and_stored(self):
+        analysis_id = insert_analysis()[0]
+
+        response = self.client.get(f'/api/v1/analysis/{analysis_id}/delivery-metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        metrics = response.json()['metrics']
+        self.assertEqual(metrics['_id'], str(analysis_id))
+        self.assertEqual(metrics['video_id'], 'video')
+        self.assertEqual(get_delivery_metrics_collection().count_documents({'_id': analysis_id}), 1)
+
+    def test_unfinished_or_unknown_analysis(self):
+        analysis_id = insert_analysis(complete=False)[0]
+        for unknown in (analysis_id, ObjectId()):
+            with self.subTest(analysis_id=unknown):
+                self.assertEqual(self.client.get(f'/api/v1/analysis/{unknown}/delivery-metrics/').status_code, 404)
@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.sampling import DuplicateFrameDetector
+from analysis_api.services import VideoProcessingService
+from analysis_api.tests.fakes import FakePoseEstimator
+
+
+def _frame(gray_level, moved_square=False):
+    frame = np.full((120, 160, 3), gray_level, dtype=np.uint8)
+    if moved_square:
+        frame[20:60, 20:60] = 255 - gray_level
+    return frame
+
+
+class DuplicateFrameDetectorTests(SimpleTestCase):
+    def setUp(self):
+        self.detector = DuplicateFrameDetector(threshold=0.003, max_carry_frames=60, color_code=cv2.COLOR_BGR2GRAY)
+
+    def test_unchanged_frames_are_duplicates(self):
+        self.assertFalse(self.detector.is_duplicate(0, _frame(100)))
+        # Noise below the pixel threshold does not count as a change
+        self.assertTrue(self.detector.is_duplicate(6, _frame(104)))
+        self.assertTrue(self.detector.is_duplicate(12, _frame(100)))
+
+    def test_changed_frame_becomes_the_reference(self):
+        self.detector.is_duplicate(0, _frame(100))
+
+        self.assertFalse(self.detector.is_duplicate(6, _frame(100, moved_square=True)))
+        self.assertTrue(self.detector.is_duplicate(12, _frame(100, moved_square=True)))
+        self.assertFalse(self.detector.is_duplicate(18, _frame(100)))
+
+    def test_slow_drift_adds_up(self):
+        duplicates = [self.detector.is_duplicate(index * 6, _frame(100 + index * 5)) for index in range(6)]
+
+        # Compared to the reference, not to the previous frame: 15 gray levels after three frames
+        self.assertEqual(duplicates, [False, True, True, False, True, True])
+
+    def test_analyzed_again_after_max_carry_frames(self):
+        duplicates = [self.detector.is_duplicate(frame_index, _frame(100)) for frame_index in range(0, 150, 30)]
+        self.assertEqual(duplicates, [False, True, False, True, False])
+
+
+class SkipDuplicateFramesTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.video_path = os.path.join(directory, 'video.mp4')
+
+        # One second of a still picture, then one second of another one
+        writer = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 120))
+        for frame_index in range(60):
+            writer.write(_frame(60 if frame_index < 30 else 180))
+        writer.release()
+
+        self.enterContext(self.settings(
+            VIDEO_PROCESSING_CONFIG={
+                **settings.VIDEO_PROCESSING_CONFIG,
+                'skip_duplicate_frames': True,
+                'segment_workers': 1
+            },
+            AUDIO_ANALYSIS_CONFIG={**settings.AUDIO_ANALYSIS_CONFIG, 'enabled': False},
+            ANALYSIS_CACHE_CONFIG={**settings.ANALYSIS_CACHE_CONFIG, 'enabled': False}
+        ))
+
+    def test_duplicates_reuse_the_last_pose(self):
+        pose = FakePoseEstimator(from_frame=True)
+        result = VideoProcessingService(pose=pose).process_video('video', video_path=self.video_path)
+
+        self.assertTrue(result['success'])
+        # Frames 0 and 30 run through the pose model, the other eight sampled frames are carried forward
+        self.assertEqual(pose.process_calls, 2)
+        self.assertEqual(result['frames_processed'], 10)
+        self.assertEqual(result['frames_carried_forward'], 8)
@@ -0,0 +1,75 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from analysis_api.estimator_pool import PoseEstimatorPool, EstimatorPoolExhausted
+from analysis_api.tests.fakes import FakePoseEstimator
+
+
+class _FailingReset(FakePoseEstimator):
+    def reset(self):
+        raise RuntimeError('graph error')
+
+
+class PoseEstimatorPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.created = []
+
+        def create():
+            estimator = self.estimator_class()
+            self.created.append(estimator)
+            return estimator
+
+        self.estimator_class = FakePoseEstimator
+        self.enterContext(mock.patch('analysis_api.estimator_pool.create_pose_estimator', side_effect=create))
+
+    def test_checked_in_estimator_is_reset_and_reused(self):
+        pool = PoseEstimatorPool(size=2, checkout_timeout=1)
+
+        estimator = pool.checkout()
+        pool.checkin(estimator)
+
+        self.assertEqual(estimator.reset_calls, 1)
+        self.assertIs(pool.checkout(), estimator)
+        self.assertEqual(len(self.created), 1)
+
+    def test_warm_fills_the_pool(self):
+        pool = PoseEstimatorPool(size=3, checkout_timeout=1)
+        pool.warm()
+
+        self.assertEqual(len(self.created), 3)
+        self.assertEqual(pool.stats(), {'size': 3, 'created': 3, 'idle': 3, 'in_use': 0, 'discarded': 0})
+
+    def test_checkout_waits_for_a_checkin(self):
+        pool = PoseEstimatorPool(size=1, checkout_timeout=1)
+        estimator = pool.checkout()
+
+        with self.assertRaises(EstimatorPoolExhausted):
+            pool.checkout(timeout=0.05)
+
+        threading.Timer(0.05, pool.checkin, args=(estimator,)).start()
+        self.assertIs(pool.checkout(timeout=2), estimator)
+        self.assertEqual(len(self.created), 1)
+
+    def test_unhealthy_estimator_is_replaced(self):
+        pool = PoseEstimatorPool(size=1, checkout_timeout=1)
+
+        with self.assertRaises(ValueError):
+            with pool.estimator() as estimator:
+                raise ValueError('inference failed')
+
+        self.assertTrue(estimator.closed)
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertIsNot(pool.checkout(), estimator)
+        self.assertEqual(len(self.created), 2)
+
+    def test_estimator_that_fails_to_reset_is_discarded(self):
+        self.estimator_class = _FailingReset
+        pool = PoseEstimatorPool(size=1, checkout_timeout=1)
+
+        estimator = pool.checkout()
+        pool.checkin(estimator)
+
+        self.assertTrue(estimator.closed)
+        self.assertEqual(pool.stats()['created'], 0)
@@ -0,0 +1,257 @@
+import importlib
+import os
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from pymongo.errors import BulkWriteError
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.jobs import (
+    JOB_COMPLETED,
+    JOB_FAILED,
+    JOB_PENDING,
+    JOB_RUNNING,
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    enqueue_analysis_job,
+    enqueue_batch_jobs,
+    claim_next_job,
+    complete_job,
+    fail_job,
+    renew_job_lease,
+    update_job_progress,
+)
+from analysis_api.db_connection import get_jobs_collection
+from video_analysis_service import settings as settings_module
+
+
+def _expire_lease(job):
+    get_jobs_collection().update_one(
+        {'_id': job['_id']},
+        {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+    )
+
+
+class JobQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+
+    def _state(self, job):
+        return get_jobs_collection().find_one({'_id': job['_id']})
+
+    def test_enqueue_deduplicates_active_jobs(self):
+        job, created = enqueue_analysis_job('video')
+        duplicate, duplicate_created = enqueue_analysis_job('video')
+
+        self.assertTrue(created)
+        self.assertFalse(duplicate_created)
+        self.assertEqual(duplicate['_id'], job['_id'])
+
+        # Other options are another job
+        _, debug_created = enqueue_analysis_job('video', {'debug_visualization': True})
+        self.assertTrue(debug_created)
+
+    def test_finished_job_is_not_reused(self):
+        job, _ = enqueue_analysis_job('video')
+        claimed = claim_next_job('worker')
+        self.assertTrue(complete_job(claimed['_id'], 'worker', {'success': True, 'analysis_id': 'analysis'}))
+
+        self.assertEqual(self._state(job)['state'], JOB_COMPLETED)
+        self.assertIsNone(claim_next_job('worker'))
+        _, created = enqueue_analysis_job('video')
+        self.assertTrue(created)
+
+    def test_expired_lease_is_reclaimed(self):
+        enqueue_analysis_job('video')
+        job = claim_next_job('worker-1')
+        self.assertEqual(job['state'], JOB_RUNNING)
+        self.assertIsNone(claim_next_job('worker-2'))
+
+        _expire_lease(job)
+        reclaimed = claim_next_job('worker-2')
+
+        self.assertEqual(reclaimed['_id'], job['_id'])
+        self.assertEqual(reclaimed['worker_id'], 'worker-2')
+        self.assertEqual(reclaimed['attempts'], job['attempts'] + 1)
+
+    def test_renewed_lease_is_not_reclaimed(self):
+        enqueue_analysis_job('video')
+        job = claim_next_job('worker-1')
+
+        _expire_lease(job)
+        self.assertTrue(renew_job_lease(job['_id'], 'worker-1'))
+        self.assertIsNone(claim_next_job('worker-2'))
+
+    def test_worker_that_lost_the_lease_cannot_record_the_outcome(self):
+        enqueue_analysis_job('video')
+        stale = claim_next_job('worker-1')
+        _expire_lease(stale)
+        current = claim_next_job('worker-2')
+
+        self.assertFalse(renew_job_lease(stale['_id'], 'worker-1'))
+        self.assertFalse(update_job_progress(stale['_id'], 'worker-1', 0.5))
+        self.assertFalse(complete_job(stale['_id'], 'worker-1', {'success': True, 'analysis_id': 'stale'}))
+        self.assertFalse(fail_job(stale, 'stale worker failed'))
+
+        job = self._state(current)
+        self.assertEqual(job['state'], JOB_RUNNING)
+        self.assertEqual(job['worker_id'], 'worker-2')
+        self.assertIsNone(job['error'])
+
+        self.assertTrue(complete_job(current['_id'], 'worker-2', {'success': True, 'analysis_id': 'current'}))
+        self.assertEqual(self._state(current)['analysis_id'], 'current')
+
+    def test_failed_job_is_retried_until_attempts_run_out(self):
+        job, _ = enqueue_analysis_job('video')
+        max_attempts = job['max_attempts']
+
+        for attempt in range(1, max_attempts + 1):
+            get_jobs_collection().update_one({'_id': job['_id']}, {'$set': {'available_at': datetime.utcnow()}})
+            claimed = claim_next_job('worker')
+            self.assertEqual(claimed['attempts'], attempt)
+            self.assertTrue(fail_job(claimed, 'decoder error'))
+
+        state = self._state(job)
+        self.assertEqual(state['state'], JOB_FAILED)
+        self.assertEqual(state['error'], 'decoder error')
+
+    def test_failed_job_waits_for_its_backoff(self):
+        enqueue_analysis_job('video')
+        fail_job(claim_next_job('worker'), 'decoder error')
+
+        self.assertEqual(get_jobs_collection().find_one()['state'], JOB_PENDING)
+        self.assertIsNone(claim_next_job('worker'))
+
+
+class BatchJobTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+
+    def _batch_max_running(self, value):
+        return self.settings(ANALYSIS_JOB_CONFIG={**settings.ANALYSIS_JOB_CONFIG, 'batch_max_running': value})
+
+    def test_interactive_jobs_are_claimed_first(self):
+        self.enterContext(self._batch_max_running(2))
+        enqueue_batch_jobs({'batch-1': '/videos/1.mp4', 'batch-2': '/videos/2.mp4'})
+        enqueue_analysis_job('interactive')
+
+        claimed = [claim_next_job('worker')['video_id'] for _ in range(3)]
+
+        self.assertEqual(claimed[0], 'interactive')
+        self.assertCountEqual(claimed[1:], ['batch-1', 'batch-2'])
+        self.assertIsNone(claim_next_job('worker'))
+
+    def test_batch_jobs_are_throttled(self):
+        self.enterContext(self._batch_max_running(1))
+        enqueue_batch_jobs({'batch-1': '/videos/1.mp4', 'batch-2': '/videos/2.mp4'})
+
+        first = claim_next_job('worker-1')
+        self.assertEqual(first['priority'], PRIORITY_BATCH)
+        self.assertIsNone(claim_next_job('worker-2'))
+
+        # Interactive jobs are not held back by running batch jobs
+        enqueue_analysis_job('interactive')
+        self.assertEqual(claim_next_job('worker-2')['video_id'], 'interactive')
+
+        self.assertTrue(complete_job(first['_id'], 'worker-1', {'success': True, 'analysis_id': 'analysis'}))
+        self.assertEqual(claim_next_job('worker-3')['priority'], PRIORITY_BATCH)
+
+    def test_interactive_request_raises_batch_priority(self):
+        self.enterContext(self._batch_max_running(1))
+        enqueue_batch_jobs({'batch-1': '/videos/1.mp4', 'batch-2': '/videos/2.mp4'})
+        job, created = enqueue_analysis_job('batch-2')
+
+        self.assertFalse(created)
+        self.assertEqual(job['priority'], PRIORITY_INTERACTIVE)
+        self.assertEqual(claim_next_job('worker')['video_id'], 'batch-2')
+        # The promoted job does not count against the batch limit
+        self.assertEqual(claim_next_job('worker')['video_id'], 'batch-1')
+
+    def test_batch_joins_active_jobs(self):
+        job, _ = enqueue_analysis_job('video-1')
+        batch_id, jobs = enqueue_batch_jobs({'video-1': '/videos/1.mp4', 'video-2': '/videos/2.mp4'})
+
+        self.assertEqual([created for _, created in jobs], [False, True])
+        self.assertEqual(jobs[0][0]['_id'], job['_id'])
+        self.assertIn(batch_id, jobs[0][0]['batch_ids'])
+        self.assertEqual(get_jobs_collection().count_documents({}), 2)
+
+    def _bulk_write_failing_once(self, write_errors):
+        collection = get_jobs_collection()
+        calls = []
+
+        def bulk_write(requests, ordered):
+            calls.append(list(requests))
+            result = collection.bulk_write(requests, ordered=ordered)
+            if len(calls) == 1:
+                raise BulkWriteError({'writeErrors': write_errors, 'nInserted': 0})
+            return result
+
+        self.enterContext(mock.patch(
+            'analysis_api.jobs.get_jobs_collection',
+            return_value=mock.Mock(wraps=collection, bulk_write=bulk_write)
+        ))
+        return calls
+
+    def test_duplicate_key_errors_retry_only_the_failed_upserts(self):
+        calls = self._bulk_write_failing_once([{'index': 1, 'code': 11000, 'errmsg': 'duplicate key'}])
+
+        _, jobs = enqueue_batch_jobs({'video-1': '/videos/1.mp4', 'video-2': '/videos/2.mp4'})
+
+        self.assertEqual([len(requests) for requests in calls], [2, 1])
+        self.assertIs(calls[1][0], calls[0][1])
+        self.assertEqual([job['video_id'] for job, _ in jobs], ['video-1', 'video-2'])
+        self.assertEqual(get_jobs_collection().count_documents({}), 2)
+
+    def test_other_write_errors_are_raised(self):
+        calls = self._bulk_write_failing_once([
+            {'index': 0, 'code': 11000, 'errmsg': 'duplicate key'},
+            {'index': 1, 'code': 121, 'errmsg': 'document failed validation'},
+        ])
+
+        with self.assertRaises(BulkWriteError):
+            enqueue_batch_jobs({'video-1': '/videos/1.mp4', 'video-2': '/videos/2.mp4'})
+        self.assertEqual(len(calls), 1)
+
+    def test_persistent_duplicate_key_errors_are_raised(self):
+        collection = get_jobs_collection()
+        error = BulkWriteError({'writeErrors': [{'index': 0, 'code': 11000, 'errmsg': 'duplicate key'}]})
+        bulk_write = mock.Mock(side_effect=error)
+        self.enterContext(mock.patch(
+            'analysis_api.jobs.get_jobs_collection',
+            return_value=mock.Mock(wraps=collection, bulk_write=bulk_write)
+        ))
+
+        with self.assertRaises(BulkWriteError):
+            enqueue_batch_jobs({'video': '/videos/video.mp4'})
+        self.assertGreater(bulk_write.call_count, 1)
+
+
+class JobSettingsTests(SimpleTestCase):
+    def tearDown(self):
+        importlib.reload(settings_module)
+
+    def _job_config(self, cpu_count, **environ):
+        with mock.patch.dict(os.environ), mock.patch('os.cpu_count', return_value=cpu_count):
+            for name in ('ANALYSIS_WORKERS', 'ANALYSIS_BATCH_MAX_RUNNING'):
+                os.environ.pop(name, None)
+            os.environ.update(environ)
+            return importlib.reload(settings_module).ANALYSIS_JOB_CONFIG
+
+    def test_workers_default_to_cpu_count(self):
+        config = self._job_config(8)
+        self.assertEqual(config['workers'], 8)
+        self.assertEqual(config['batch_max_running'], 7)
+
+    def test_single_core_still_runs_batch_jobs(self):
+        config = self._job_config(1)
+        self.assertEqual(config['workers'], 1)
+        self.assertEqual(config['batch_max_running'], 1)
+
+    def test_batch_limit_follows_configured_workers(self):
+        self.assertEqual(self._job_config(8, ANALYSIS_WORKERS='3')['batch_max_running'], 2)
+        self.assertEqual(
+            self._job_config(8, ANALYSIS_WORKERS='3', ANALYSIS_BATCH_MAX_RUNNING='1')['batch_max_running'], 1
+        )
@@ -0,0 +1,129 @@
+import numpy as np
+from bson import ObjectId
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.lod import build_lod, load_lod_series
+from analysis_api.storage import pack_landmarks, SCHEMA_VERSION_BUCKETED
+from analysis_api.analysis_store import ANALYSIS_COMPLETE
+from analysis_api.db_connection import get_analysis_collection, get_analysis_buckets_collection
+from analysis_api.tests.fakes import insert_analysis
+
+
+BUCKET_DURATION = 10.0
+
+
+class BuildLodTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        self.enterContext(self.settings(
+            ANALYSIS_LOD_CONFIG={**settings.ANALYSIS_LOD_CONFIG, 'resolutions': [1, 2.5, 5, 20], 'chunk_points': 4}
+        ))
+
+        # 5 fps for 60 seconds, with frames dropped as if no pose was detected
+        rng = np.random.default_rng(0)
+        timestamps = np.round(np.arange(300) * 0.2, 3)
+        keep = rng.random(len(timestamps)) > 0.2
+        keep[100:130] = False
+        self.timestamps = timestamps[keep]
+        self.landmarks = rng.random((len(self.timestamps), 33, 4), dtype=np.float32)
+
+        self.analysis_id = ObjectId()
+        get_analysis_collection().insert_one({
+            '_id': self.analysis_id,
+            'video_id': 'video',
+            'schema_version': SCHEMA_VERSION_BUCKETED,
+            'status': ANALYSIS_COMPLETE,
+            'bucket_duration': BUCKET_DURATION
+        })
+        bucket_indexes = (self.timestamps // BUCKET_DURATION).astype(int)
+        for bucket_index in np.unique(bucket_indexes):
+            mask = bucket_indexes == bucket_index
+            get_analysis_buckets_collection().insert_one({
+                'analysis_id': self.analysis_id,
+                'bucket_index': int(bucket_index),
+                'start_time': bucket_index * BUCKET_DURATION,
+                'timestamps': self.timestamps[mask].tolist(),
+                'landmarks': pack_landmarks(self.landmarks[mask], 'zlib')
+            })
+
+        self.doc = get_analysis_collection().find_one({'_id': self.analysis_id})
+        self.doc['lod'] = build_lod(self.doc)
+
+    def _brute_force(self, resolution, start=None, end=None):
+        bins = np.floor(self.timestamps / resolution + 1e-9)
+        starts = np.unique(bins) * resolution
+        if start is not None:
+            starts = starts[starts >= start]
+        if end is not None:
+            starts = starts[starts < end]
+
+        frame_counts = []
+        series = {'min': [], 'mean': [], 'max': []}
+        for bin_start in starts:
+            frames = self.landmarks[bins == round(bin_start / resolution)]
+            frame_counts.append(len(frames))
+            series['min'].append(frames.min(axis=0))
+            series['mean'].append(frames.mean(axis=0))
+            series['max'].append(frames.max(axis=0))
+        return starts, frame_counts, series
+
+    def _assert_level(self, resolution, start=None, end=None):
+        timestamps, frame_counts, series = load_lod_series(self.doc, resolution, start, end)
+        expected_timestamps, expected_counts, expected = self._brute_force(resolution, start, end)
+
+        np.testing.assert_allclose(timestamps, expected_timestamps)
+        self.assertEqual(frame_counts, expected_counts)
+        for statistic, arrays in expected.items():
+            np.testing.assert_allclose(series[statistic], np.stack(arrays), atol=1e-5)
+
+    def test_header(self):
+        self.assertEqual(self.doc['lod']['resolutions'], [1.0, 2.5, 5.0, 20.0])
+        self.assertEqual(self.doc['lod']['chunk_points'], 4)
+
+    def test_levels_match_brute_force(self):
+        # 5 and 20 second levels are built from finer levels, 2.5 seconds from the frames
+        for resolution in self.doc['lod']['resolutions']:
+            with self.subTest(resolution=resolution):
+                self._assert_level(resolution)
+
+    def test_time_range(self):
+        for resolution in (1.0, 5.0):
+            with self.subTest(resolution=resolution):
+                self._assert_level(resolution, start=7.0, end=41.0)
+
+
+class AnalysisResolutionTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        self.enterContext(self.settings(
+            ANALYSIS_LOD_CONFIG={**settings.ANALYSIS_LOD_CONFIG, 'resolutions': [1, 5, 30], 'auto_max_points': 20}
+        ))
+        # 5 fps for 60 seconds
+        self.analysis_id = insert_analysis(frame_count=300)[0]
+
+    def _get(self, **params):
+        return self.client.get(f'/api/v1/analysis/{self.analysis_id}/', params)
+
+    def test_resolution_implies_the_columnar_format(self):
+        response = self._get(resolution=5)
+
+        self.assertEqual(response.status_code, 200)
+        analysis = response.json()['analysis']
+        self.assertEqual(analysis['format'], 'columnar')
+        self.assertEqual(analysis['resolution'], 5.0)
+        self.assertEqual(len(analysis['timestamps']), 12)
+        self.assertEqual(analysis['frame_counts'], [25] * 12)
+        self.assertEqual(set(analysis['landmarks']), {'min', 'mean', 'max'})
+
+    def test_auto_picks_the_finest_level_within_the_point_budget(self):
+        self.assertEqual(self._get(resolution='auto').json()['analysis']['resolution'], 5.0)
+        self.assertEqual(self._get(resolution='auto', start=0, end=15).json()['analysis']['resolution'], 1.0)
+
+    def test_invalid_resolutions(self):
+        for params in ({'resolution': 2}, {'resolution': 'fine'}, {'resolution': 5, 'format': 'legacy'}):
+            with self.subTest(**params):
+                response = self._get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.db_connection import get_jobs_collection, get_metrics_collection
+from analysis_api.jobs import JOB_COMPLETED, JOB_RUNNING, count_active_jobs, enqueue_analysis_job
+from analysis_api.metrics import FRAMES_SAMPLED, Counter, Gauge, Histogram, MetricsRegistry
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.counter = self.registry.register(Counter('frames_total', 'Frames', ('reason',)))
+        self.gauge = self.registry.register(Gauge('workers', 'Workers'))
+        self.histogram = self.registry.register(Histogram('stage_seconds', 'Stage time', ('stage',), (0.1, 1)))
+
+    def test_render(self):
+        self.counter.inc(2, reason='static')
+        self.counter.inc(reason='say "hi"\n')
+        self.gauge.set(3)
+        for value in (0.05, 0.5, 0.5, 5):
+            self.histogram.observe(value, stage='decode')
+
+        lines = self.registry.render().splitlines()
+
+        self.assertIn('# TYPE frames_total counter', lines)
+        self.assertIn('frames_total{reason="static"} 2', lines)
+        self.assertIn('frames_total{reason="say \\"hi\\"\\n"} 1', lines)
+        self.assertIn('workers 3', lines)
+        self.assertIn('# TYPE stage_seconds histogram', lines)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="0.1"} 1', lines)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="1"} 3', lines)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="+Inf"} 4', lines)
+        self.assertIn('stage_seconds_sum{stage="decode"} 6.05', lines)
+        self.assertIn('stage_seconds_count{stage="decode"} 4', lines)
+
+    def test_snapshots_of_other_processes_are_summed(self):
+        self.counter.inc(reason='static')
+        self.histogram.observe(0.5, stage='decode')
+
+        worker = MetricsRegistry()
+        worker.register(Counter('frames_total', 'Frames', ('reason',))).inc(4, reason='static')
+        worker.register(Histogram('stage_seconds', 'Stage time', ('stage',), (0.1, 1))).observe(0.05, stage='decode')
+        worker.register(Gauge('unknown', 'Not registered in the rendering process')).set(1)
+
+        lines = self.registry.render([worker.snapshot(), worker.snapshot()]).splitlines()
+
+        self.assertIn('frames_total{reason="static"} 9', lines)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="0.1"} 2', lines)
+        self.assertIn('stage_seconds_count{stage="decode"} 3', lines)
+        self.assertFalse(any(line.startswith('unknown') for line in lines))
+        # Rendering does not change the process' own values
+        self.assertEqual(self.counter.samples(), [[['static'], 1]])
+
+    def test_collectors_run_before_rendering(self):
+        self.registry.add_collector(lambda: self.gauge.set(7))
+        self.assertIn('workers 7', self.registry.render().splitlines())
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+
+    def test_job_gauge_counts_each_active_state(self):
+        jobs = [enqueue_analysis_job(f'video-{index}')[0] for index in range(4)]
+        get_jobs_collection().update_one({'_id': jobs[0]['_id']}, {'$set': {'state': JOB_RUNNING}})
+        get_jobs_collection().update_one({'_id': jobs[1]['_id']}, {'$set': {'state': JOB_COMPLETED}})
+
+        self.assertEqual(count_active_jobs(), {'pending': 2, 'running': 1})
+
+        response = self.client.get('/api/v1/metrics/')
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode().splitlines()
+        self.assertIn('analysis_jobs{state="pending"} 2', lines)
+        self.assertIn('analysis_jobs{state="running"} 1', lines)
+
+    def test_empty_queue(self):
+        self.assertEqual(count_active_jobs(), {'pending': 0, 'running': 0})
+
+    def test_worker_snapshots_are_counted(self):
+        # Two recent snapshots, one of them with a sampled frame, and one of a worker that stopped
+        now = datetime.utcnow()
+        get_metrics_collection().insert_many([
+            {'_id': 'host:1:0', 'updated_at': now, 'metrics': {}},
+            {'_id': 'host:2:1', 'updated_at': now, 'metrics': {'analysis_frames_sampled_total': [[[], 1]]}},
+            {'_id': 'host:3:0', 'updated_at': now - timedelta(days=1), 'metrics': {}},
+        ])
+        sampled = sum(value for _, value in FRAMES_SAMPLED.samples())
+
+        lines = self.client.get('/api/v1/metrics/').content.decode().splitlines()
+        self.assertIn('analysis_workers 2', lines)
+        self.assertIn(f'analysis_frames_sampled_total {sampled + 1}', lines)
@@ -0,0 +1,111 @@
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.db_connection import get_analysis_collection
+from analysis_api.model_stages import FACE_LANDMARK_COUNT, MODEL_FACE, ModelStage
+from analysis_api.models import VISIBILITY
+from analysis_api.services import VideoProcessingService
+from analysis_api.tests.fakes import FakePoseEstimator, write_test_video
+
+
+class _FakeFaceStage(ModelStage):
+    """Face 'model' whose landmarks' x is the frame's mean gray level / 255."""
+
+    models = (MODEL_FACE,)
+    inference_stage = 'face_inference'
+
+    def __init__(self, interval_frames, **kwargs):
+        super().__init__(interval_frames, **kwargs)
+        self.runs = []
+        self.closed = False
+
+    def visible(self, pose):
+        return bool(pose[0, VISIBILITY] >= self.min_visibility)
+
+    def _run(self, rgb_frame, pose):
+        self.runs.append(rgb_frame.mean() / 255)
+        face = np.ones((FACE_LANDMARK_COUNT, 4), dtype=np.float32)
+        face[:, 0] = rgb_frame.mean() / 255
+        return {MODEL_FACE: face}
+
+    def close(self):
+        self.closed = True
+
+
+def _pose(visibility=0.9):
+    pose = np.full((33, 4), 0.5, dtype=np.float32)
+    pose[:, VISIBILITY] = visibility
+    return pose
+
+
+class ModelStageTests(SimpleTestCase):
+    def test_stages_implement_visible_and_run(self):
+        with self.assertRaises(TypeError):
+            ModelStage(5)
+
+    def test_runs_once_per_interval_when_visible(self):
+        stage = _FakeFaceStage(interval_frames=15)
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+
+        ran = [bool(stage.process(frame_index, frame, _pose())) for frame_index in range(0, 60, 6)]
+
+        # Frames 0, 18, 30 and 48 are the first sampled frames of their intervals
+        self.assertEqual(ran, [True, False, False, True, False, True, False, False, True, False])
+
+    def test_skipped_while_not_visible(self):
+        stage = _FakeFaceStage(interval_frames=15)
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+
+        self.assertEqual(stage.process(0, frame, _pose(visibility=0.1)), {})
+        # The interval is still due once the face shows
+        self.assertIn(MODEL_FACE, stage.process(6, frame, _pose()))
+
+
+class ModelSeriesTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.video_path = write_test_video(os.path.join(directory, 'video.mp4'), frame_count=60)
+        self.enterContext(self.settings(
+            VIDEO_PROCESSING_CONFIG={**settings.VIDEO_PROCESSING_CONFIG, 'segment_workers': 1},
+            AUDIO_ANALYSIS_CONFIG={**settings.AUDIO_ANALYSIS_CONFIG, 'enabled': False},
+            ANALYSIS_CACHE_CONFIG={**settings.ANALYSIS_CACHE_CONFIG, 'enabled': False}
+        ))
+
+        self.stage = _FakeFaceStage(interval_frames=15)
+        self.enterContext(mock.patch('analysis_api.services.create_model_stages', return_value=[self.stage]))
+        result = VideoProcessingService(pose=FakePoseEstimator(from_frame=True)).process_video(
+            'video', video_path=self.video_path
+        )
+        self.assertTrue(result['success'])
+        self.analysis = get_analysis_collection().find_one({'video_id': 'video'})
+
+    def _get(self, model, **params):
+        return self.client.get(f"/api/v1/analysis/{self.analysis['_id']}/models/{model}/", params)
+
+    def test_stored_at_the_model_interval(self):
+        response = self._get('face')
+
+        self.assertEqual(response.status_code, 200)
+        landmarks = response.json()['landmarks']
+        # Sampled every 6 frames at 30 fps, the model ran on frames 0, 18, 30 and 48
+        np.testing.assert_allclose(landmarks['timestamps'], [0.0, 0.6, 1.0, 1.6])
+        self.assertEqual(np.asarray(landmarks['landmarks']).shape, (4, FACE_LANDMARK_COUNT, 4))
+        # The landmarks of a frame are stored with that frame
+        np.testing.assert_allclose([frame[0][0] for frame in landmarks['landmarks']], self.stage.runs, rtol=1e-6)
+        self.assertEqual(self.analysis['model_frames'], {MODEL_FACE: 4})
+        self.assertTrue(self.stage.closed)
+
+    def test_time_range(self):
+        landmarks = self._get('face', start=0.5, end=1.5).json()['landmarks']
+        np.testing.assert_allclose(landmarks['timestamps'], [0.6, 1.0])
+
+    def test_models_without_landmarks(self):
+        self.assertEqual(self._get('hands').status_code, 404)
+        self.assertEqual(self._get('tail').status_code, 400)
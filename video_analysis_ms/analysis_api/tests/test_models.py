@@ -0,0 +1,37 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from analysis_api.models import LandmarkBuffer, X, Y
+from analysis_api.tests.fakes import make_landmark_list
+
+
+class LandmarkBufferTests(SimpleTestCase):
+    def test_grows_past_its_capacity(self):
+        landmarks = np.random.default_rng(0).random((10, 33, 4), dtype=np.float32)
+        buffer = LandmarkBuffer(capacity=2)
+
+        for index in range(5):
+            self.assertEqual(buffer.append(index * 0.2, landmarks[index]), index)
+        buffer.extend(np.arange(5, 10) * 0.2, landmarks[5:])
+
+        self.assertEqual(len(buffer), 10)
+        np.testing.assert_allclose(buffer.timestamps, np.arange(10) * 0.2)
+        np.testing.assert_array_equal(buffer.landmarks, landmarks)
+
+    def test_append_landmark_list(self):
+        buffer = LandmarkBuffer()
+        buffer.append_landmark_list(0.0, make_landmark_list(x=0.25, y=0.75).landmark)
+
+        self.assertEqual(buffer.landmarks.shape, (1, 33, 4))
+        self.assertAlmostEqual(buffer.field_max(X), 0.25)
+        self.assertAlmostEqual(buffer.max_y, 0.75)
+
+    def test_empty_buffer_reports_zero(self):
+        buffer = LandmarkBuffer()
+        self.assertEqual(buffer.max_x, 0.0)
+        self.assertEqual(buffer.field_min(Y), 0.0)
+
+        # Coordinates outside the frame are not clamped, but the maximum never drops below 0
+        buffer.append(0.0, np.full((33, 4), -0.5, dtype=np.float32))
+        self.assertEqual(buffer.max_x, 0.0)
+        self.assertEqual(buffer.field_min(X), -0.5)
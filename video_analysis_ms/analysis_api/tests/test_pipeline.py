@@ -0,0 +1,145 @@
+import os
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from analysis_api.pipeline import BackgroundBucketWriter, FramePrefetcher, iter_rgb_frames
+from analysis_api.sampling import FrameSampler
+from analysis_api.tests.fakes import write_test_video
+
+
+class _FailingSampler:
+    """Sampler whose decoder fails after a few frames."""
+
+    def __init__(self, frames_before_error: int):
+        self.frames_before_error = frames_before_error
+        self.out = None
+
+    def __iter__(self):
+        for frame_index in range(self.frames_before_error):
+            yield frame_index, np.full((8, 8, 3), frame_index, dtype=np.uint8)
+        raise IOError('Corrupt frame')
+
+
+class _RecordingWriter:
+    """Stands in for a BucketWriter, fails on `fail_at_frame` and writes nothing until `release` is set."""
+
+    def __init__(self, fail_at_frame=None, release=None):
+        self.fail_at_frame = fail_at_frame
+        self.release = release
+        self.frames = []
+        self.threads = set()
+        self.flushed = False
+
+    def add_landmarks(self, frame_index, timestamp_seconds, values, carried_forward=False, model_landmarks=None):
+        self.threads.add(threading.current_thread().name)
+        if self.release is not None:
+            self.release.wait()
+        if frame_index == self.fail_at_frame:
+            raise RuntimeError('Write failed')
+        self.frames.append((frame_index, timestamp_seconds, values, carried_forward))
+
+    def flush(self):
+        self.flushed = True
+
+
+class FramePrefetcherTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.video_path = write_test_video(os.path.join(cls.directory.name, 'video.mp4'), frame_count=60)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def _frames(self, iterate, frame_skip=3):
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            sampler = FrameSampler(cap, self.video_path, frame_skip, strategy='grab')
+            # Frames are only valid until the next one is requested
+            return [(frame_index, frame.copy()) for frame_index, frame in iterate(sampler)]
+        finally:
+            cap.release()
+
+    def test_yields_the_sequential_frames_in_order(self):
+        expected = self._frames(iter_rgb_frames)
+        for depth in (1, 4):
+            with self.subTest(depth=depth):
+                frames = self._frames(lambda sampler: FramePrefetcher(sampler, depth))
+
+                self.assertEqual([index for index, _ in frames], list(range(0, 60, 3)))
+                self.assertEqual([index for index, _ in frames], [index for index, _ in expected])
+                for (_, frame), (_, expected_frame) in zip(frames, expected):
+                    np.testing.assert_array_equal(frame, expected_frame)
+
+    def test_held_frame_is_not_overwritten(self):
+        cap = cv2.VideoCapture(self.video_path)
+        self.addCleanup(cap.release)
+        prefetcher = FramePrefetcher(FrameSampler(cap, self.video_path, 1, strategy='grab'), depth=1)
+
+        for frame_index, frame in prefetcher:
+            held = frame.copy()
+            # Give the decoder time to fill every free slot
+            threading.Event().wait(0.02)
+            np.testing.assert_array_equal(frame, held)
+            if frame_index == 5:
+                break
+
+        self.assertFalse(prefetcher._thread.is_alive())
+
+    def test_decoder_error_is_raised_in_the_consumer(self):
+        prefetcher = FramePrefetcher(_FailingSampler(frames_before_error=3), depth=2)
+        indices = []
+
+        with self.assertRaisesMessage(IOError, 'Corrupt frame'):
+            for frame_index, _ in prefetcher:
+                indices.append(frame_index)
+
+        self.assertEqual(indices, [0, 1, 2])
+        self.assertFalse(prefetcher._thread.is_alive())
+
+
+class BackgroundBucketWriterTests(SimpleTestCase):
+    def test_writes_frames_in_order_in_the_background(self):
+        writer = _RecordingWriter()
+        background = BackgroundBucketWriter(writer, queue_size=2)
+
+        for frame_index in range(20):
+            background.add_landmarks(frame_index, frame_index / 10, np.full((33, 4), frame_index))
+        background.flush()
+
+        self.assertEqual([frame[0] for frame in writer.frames], list(range(20)))
+        self.assertEqual(writer.threads, {'bucket-writer'})
+        self.assertTrue(writer.flushed)
+
+    def test_error_is_raised_by_flush(self):
+        release = threading.Event()
+        writer = _RecordingWriter(fail_at_frame=3, release=release)
+        background = BackgroundBucketWriter(writer, queue_size=100)
+
+        for frame_index in range(6):
+            background.add_landmarks(frame_index, frame_index / 10, np.zeros((33, 4)))
+        # The failure must not surface in add_landmarks before flush
+        release.set()
+
+        with self.assertRaisesMessage(RuntimeError, 'Write failed'):
+            background.flush()
+        # Nothing after the failed frame is written, and the last bucket is not flushed
+        self.assertEqual([frame[0] for frame in writer.frames], [0, 1, 2])
+        self.assertFalse(writer.flushed)
+
+    def test_error_is_raised_by_the_next_add(self):
+        writer = _RecordingWriter(fail_at_frame=0)
+        background = BackgroundBucketWriter(writer, queue_size=1)
+        self.addCleanup(background.close)
+
+        background.add_landmarks(0, 0.0, np.zeros((33, 4)))
+        with self.assertRaisesMessage(RuntimeError, 'Write failed'):
+            for frame_index in range(1, 1000):
+                background.add_landmarks(frame_index, frame_index / 10, np.zeros((33, 4)))
@@ -0,0 +1,89 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from analysis_api.preprocessing import InferencePreprocessor
+from analysis_api.tests.fakes import make_landmark_list
+
+
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+
+
+def _speaker_landmarks(center_x=0.5, center_y=0.5, extent=0.1):
+    """Landmarks spread evenly over a box around a point, in full-frame coordinates."""
+    landmark_list = make_landmark_list()
+    positions = np.linspace(-extent / 2, extent / 2, len(landmark_list.landmark))
+    for landmark, offset in zip(landmark_list.landmark, positions):
+        landmark.x = center_x + offset
+        landmark.y = center_y - offset
+    return landmark_list
+
+
+def _frame_with_dot(x, y):
+    frame = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+    frame[y - 2:y + 3, x - 2:x + 3] = 255
+    return frame
+
+
+def _dot_position(image):
+    """Normalized position of the center of the bright dot in an image."""
+    ys, xs = np.nonzero(image[:, :, 0] > 127)
+    height, width = image.shape[:2]
+    return (xs.mean() + 0.5) / width, (ys.mean() + 0.5) / height
+
+
+class InferencePreprocessorTests(SimpleTestCase):
+    def _cropping_preprocessor(self, **kwargs):
+        preprocessor = InferencePreprocessor(max_side=128, roi_crop=True, **kwargs)
+        preprocessor.prepare(np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8))
+        self.assertTrue(preprocessor.update(_speaker_landmarks().landmark))
+        return preprocessor
+
+    def test_landmarks_on_the_crop_map_back_to_the_frame(self):
+        preprocessor = self._cropping_preprocessor()
+        x, y, width, height = preprocessor.region
+        self.assertLess(width, FRAME_WIDTH)
+
+        # A point detected on the cropped and downscaled image is found at the same place of the frame
+        image = preprocessor.prepare(_frame_with_dot(330, 250))
+        self.assertLessEqual(max(image.shape[:2]), 128)
+        detected = make_landmark_list()
+        detected.landmark[0].x, detected.landmark[0].y = _dot_position(image)
+        detected.landmark[0].z = 0.2
+
+        preprocessor.map_landmarks(detected.landmark)
+
+        self.assertAlmostEqual(detected.landmark[0].x * FRAME_WIDTH, 330.5, delta=1.5)
+        self.assertAlmostEqual(detected.landmark[0].y * FRAME_HEIGHT, 250.5, delta=1.5)
+        self.assertAlmostEqual(detected.landmark[0].z, 0.2 * width / FRAME_WIDTH, places=6)
+
+    def test_downscaling_alone_keeps_normalized_coordinates(self):
+        preprocessor = InferencePreprocessor(max_side=160)
+        image = preprocessor.prepare(_frame_with_dot(330, 250))
+        self.assertEqual(image.shape, (120, 160, 3))
+
+        detected = make_landmark_list(x=0.25, y=0.75)
+        preprocessor.map_landmarks(detected.landmark)
+        self.assertAlmostEqual(detected.landmark[0].x, 0.25, places=6)
+        self.assertAlmostEqual(detected.landmark[0].y, 0.75, places=6)
+
+    def test_full_resolution_frame_is_used_as_is(self):
+        frame = _frame_with_dot(330, 250)
+        self.assertIs(InferencePreprocessor().prepare(frame), frame)
+
+    def test_region_is_kept_while_the_speaker_stays_inside(self):
+        preprocessor = self._cropping_preprocessor()
+        region = preprocessor.region
+
+        self.assertFalse(preprocessor.update(_speaker_landmarks(center_x=0.505).landmark))
+        self.assertEqual(preprocessor.region, region)
+
+        self.assertTrue(preprocessor.update(_speaker_landmarks(center_x=0.7).landmark))
+        self.assertNotEqual(preprocessor.region, region)
+
+    def test_lost_speaker_falls_back_to_the_whole_frame(self):
+        preprocessor = self._cropping_preprocessor()
+
+        self.assertTrue(preprocessor.update(None))
+        self.assertIsNone(preprocessor.region)
+        self.assertEqual(preprocessor.prepare(_frame_with_dot(330, 250)).shape, (96, 128, 3))
@@ -0,0 +1,96 @@
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from analysis_api.sampling import FrameSampler, MotionGate, STRATEGIES, STRATEGY_GRAB, STRATEGY_READ, STRATEGY_SEEK
+
+
+FRAME_COUNT = 90
+
+
+class _OverstatedFrameCount:
+    """VideoCapture whose container reports more frames than it holds (as damaged or VFR files do)."""
+
+    def __init__(self, cap):
+        self.cap = cap
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return FRAME_COUNT * 2
+        return self.cap.get(prop)
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+class FrameSamplerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.video_path = os.path.join(cls.directory.name, 'frames.mp4')
+
+        # Every frame has its own gray level, so a decoded frame identifies its index
+        writer = cv2.VideoWriter(cls.video_path, cv2.VideoWriter_fourcc(*'mp4v'), 30, (160, 120))
+        for frame_index in range(FRAME_COUNT):
+            writer.write(np.full((120, 160, 3), frame_index * 2 + 40, dtype=np.uint8))
+        writer.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def _sample(self, strategy, frame_skip, start_frame=0, end_frame=None, wrap=None):
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            sampler = FrameSampler(
+                wrap(cap) if wrap else cap,
+                self.video_path,
+                frame_skip,
+                strategy=strategy,
+                start_frame=start_frame,
+                end_frame=end_frame
+            )
+            frames = [(frame_index, float(frame.mean())) for frame_index, frame in sampler]
+            return frames, sampler.frames_read
+        finally:
+            cap.release()
+
+    def test_strategies_sample_the_same_frames(self):
+        for frame_skip, start_frame, end_frame in ((7, 0, None), (6, 10, 60), (1, 85, None), (40, 0, None)):
+            expected = list(range(start_frame, end_frame or FRAME_COUNT, frame_skip))
+            reference, _ = self._sample(STRATEGY_READ, frame_skip, start_frame, end_frame)
+            self.assertEqual([frame_index for frame_index, _ in reference], expected)
+            for strategy in STRATEGIES:
+                with self.subTest(strategy=strategy, frame_skip=frame_skip, start_frame=start_frame):
+                    frames, _ = self._sample(strategy, frame_skip, start_frame, end_frame)
+                    self.assertEqual([frame_index for frame_index, _ in frames], expected)
+                    # The decoded frames are the same, not only their indexes
+                    for (_, mean), (_, reference_mean) in zip(frames, reference):
+                        self.assertAlmostEqual(mean, reference_mean, delta=0.5)
+
+    def test_frames_read_counts_the_whole_video(self):
+        for strategy in STRATEGIES:
+            for frame_skip in (7, 40):
+                with self.subTest(strategy=strategy, frame_skip=frame_skip):
+                    _, frames_read = self._sample(strategy, frame_skip)
+                    self.assertEqual(frames_read, FRAME_COUNT)
+
+    def test_seek_does_not_trust_the_container_frame_count(self):
+        _, frames_read = self._sample(STRATEGY_SEEK, 40, wrap=_OverstatedFrameCount)
+        self.assertEqual(frames_read, FRAME_COUNT)
+
+    def test_motion_gate_reports_the_static_frames(self):
+        cap = cv2.VideoCapture(self.video_path)
+        self.addCleanup(cap.release)
+        # No frame moves enough, every 4th candidate is taken for the maximum gap
+        gate = MotionGate(max_frame_gap=24, motion_threshold=2.0)
+        sampler = FrameSampler(cap, self.video_path, 6, strategy=STRATEGY_GRAB, motion_gate=gate)
+
+        self.assertEqual([frame_index for frame_index, _ in sampler], [0, 24, 48, 72])
+        self.assertEqual(list(sampler.static_indices), [6, 12, 18, 30, 36, 42, 54, 60, 66, 78, 84])
+        self.assertEqual(sampler.frames_static, 11)
@@ -0,0 +1,104 @@
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from analysis_api import services
+from analysis_api.analysis_store import iter_bucket_series
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.db_connection import get_analysis_collection
+from analysis_api.services import VideoProcessingService, configure_segment_pool, get_segment_pool_size
+from analysis_api.tests.fakes import FakePoseEstimator, write_test_video
+
+
+def _processing_config(**overrides):
+    return {**settings.VIDEO_PROCESSING_CONFIG, 'min_segment_duration': 1, **overrides}
+
+
+class SegmentPoolSizeTests(SimpleTestCase):
+    def tearDown(self):
+        configure_segment_pool(1)
+
+    def test_capped_at_cores_per_analysis_worker(self):
+        with self.settings(VIDEO_PROCESSING_CONFIG=_processing_config(segment_workers=8)):
+            with mock.patch('analysis_api.services.os.cpu_count', return_value=8):
+                self.assertEqual(get_segment_pool_size(), 8)
+                configure_segment_pool(4)
+                self.assertEqual(get_segment_pool_size(), 2)
+                configure_segment_pool(16)
+                self.assertEqual(get_segment_pool_size(), 1)
+
+
+class PlanSegmentsTests(SimpleTestCase):
+    def _service(self, segment_workers):
+        with self.settings(VIDEO_PROCESSING_CONFIG=_processing_config(segment_workers=segment_workers)):
+            with mock.patch('analysis_api.services.os.cpu_count', return_value=8):
+                return VideoProcessingService(pose=FakePoseEstimator())
+
+    def test_short_video_is_not_split(self):
+        service = self._service(4)
+        self.assertEqual(service.plan_segments(total_frames=45, fps=30, frame_skip=6, bucket_frames=30), [(0, None)])
+
+    def test_segments_start_on_sampled_bucket_starts(self):
+        service = self._service(4)
+        segments = service.plan_segments(total_frames=3000, fps=30, frame_skip=7, bucket_frames=100)
+
+        self.assertEqual(len(segments), 4)
+        self.assertEqual(segments[0][0], 0)
+        self.assertIsNone(segments[-1][1])
+        for (start, end), (next_start, _) in zip(segments, segments[1:]):
+            self.assertEqual(end, next_start)
+            # The first sampled frame at or after a bucket start, so no bucket is split between segments
+            self.assertEqual(start % 7, 0)
+            self.assertLess(next_start - (next_start // 100) * 100, 7)
+
+    def test_segment_count_limited_by_duration(self):
+        service = self._service(8)
+        segments = service.plan_segments(total_frames=90, fps=30, frame_skip=3, bucket_frames=15)
+        self.assertEqual(len(segments), 3)
+
+
+class SegmentStitchingTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.video_path = write_test_video(os.path.join(directory, 'video.mp4'), frame_count=150)
+        self.enterContext(self.settings(
+            AUDIO_ANALYSIS_CONFIG={**settings.AUDIO_ANALYSIS_CONFIG, 'enabled': False},
+            ANALYSIS_CACHE_CONFIG={**settings.ANALYSIS_CACHE_CONFIG, 'enabled': False},
+            ANALYSIS_STORAGE_CONFIG={**settings.ANALYSIS_STORAGE_CONFIG, 'bucket_duration': 0.5}
+        ))
+        self.enterContext(mock.patch('analysis_api.services.os.cpu_count', return_value=8))
+
+    def _analyze_in_process(self, video_path, video_id, analysis_id, frame_skip, bucket_frames, segments, **kwargs):
+        # Stands in for the segment process pool: every segment gets its own estimator
+        return [
+            VideoProcessingService(pose=FakePoseEstimator(from_frame=True)).analyze_segment(
+                video_path, video_id, analysis_id, segment_index, frame_skip, bucket_frames,
+                start_frame=start_frame, end_frame=end_frame
+            )
+            for segment_index, start_frame, end_frame in segments
+        ]
+
+    def _series(self, segment_workers):
+        with self.settings(VIDEO_PROCESSING_CONFIG=_processing_config(segment_workers=segment_workers)):
+            service = VideoProcessingService(pose=FakePoseEstimator(from_frame=True))
+        with mock.patch.object(services, 'analyze_segments_in_parallel', side_effect=self._analyze_in_process):
+            result = service.process_video(f'video-{segment_workers}', video_path=self.video_path)
+        self.assertTrue(result['success'])
+
+        doc = get_analysis_collection().find_one({'video_id': f'video-{segment_workers}'})
+        timestamps, landmarks = zip(*iter_bucket_series(doc))
+        return doc, np.concatenate(timestamps), np.concatenate(landmarks)
+
+    def test_segments_store_the_frames_of_a_single_pass(self):
+        single_doc, single_timestamps, single_landmarks = self._series(1)
+        doc, timestamps, landmarks = self._series(3)
+
+        self.assertEqual(len(doc['segments']), 3)
+        self.assertEqual(doc['total_frames'], single_doc['total_frames'])
+        np.testing.assert_allclose(timestamps, single_timestamps)
+        np.testing.assert_array_equal(landmarks, single_landmarks)
@@ -0,0 +1,74 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.storage import (
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB,
+    COMPRESSION_ZSTD,
+    POSE_LANDMARK_NAMES,
+    pack_landmarks,
+    unpack_landmarks,
+    resolve_compression,
+)
+from analysis_api.tests.fakes import insert_analysis
+
+
+class PackLandmarksTests(SimpleTestCase):
+    def setUp(self):
+        self.landmarks = np.random.default_rng(0).random((50, 33, 4), dtype=np.float32)
+
+    def test_round_trip(self):
+        for compression in (COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD):
+            with self.subTest(compression=compression):
+                block = pack_landmarks(self.landmarks, compression)
+                self.assertEqual(block['compression'], resolve_compression(compression))
+                self.assertEqual(block['shape'], [50, 33, 4])
+                np.testing.assert_array_equal(unpack_landmarks(block), self.landmarks)
+
+    def test_round_trip_without_frames(self):
+        empty = np.zeros((0, 33, 4), dtype=np.float32)
+        self.assertEqual(unpack_landmarks(pack_landmarks(empty, COMPRESSION_ZLIB)).shape, (0, 33, 4))
+
+    def test_zstd_falls_back_to_zlib(self):
+        with mock.patch('analysis_api.storage.zstandard', None):
+            block = pack_landmarks(self.landmarks, COMPRESSION_ZSTD)
+        self.assertEqual(block['compression'], COMPRESSION_ZLIB)
+        np.testing.assert_array_equal(unpack_landmarks(block), self.landmarks)
+
+
+class AnalysisFormatTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        self.analysis_id, self.timestamps, self.landmarks = insert_analysis(frame_count=12)
+
+    def _get(self, **params):
+        response = self.client.get(f'/api/v1/analysis/{self.analysis_id}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['analysis']
+
+    def test_legacy_layout_is_the_default(self):
+        analysis = self._get()
+
+        self.assertEqual(len(analysis['data']), 12)
+        frame = analysis['data'][3]
+        self.assertEqual(frame['timestamp'], '00:00:00.600000')
+        self.assertAlmostEqual(frame['landmarks']['nose']['x'], float(self.landmarks[3, 0, 0]), places=6)
+        self.assertAlmostEqual(
+            frame['landmarks']['right_foot_index']['visibility'], float(self.landmarks[3, 32, 3]), places=6
+        )
+
+    def test_columnar_layout_is_opt_in(self):
+        analysis = self._get(format='columnar')
+
+        self.assertEqual(analysis['format'], 'columnar')
+        self.assertEqual(analysis['landmark_names'], list(POSE_LANDMARK_NAMES))
+        np.testing.assert_allclose(analysis['timestamps'], self.timestamps)
+        np.testing.assert_allclose(np.array(analysis['landmarks']), self.landmarks, rtol=1e-6)
+        self.assertNotIn('data', analysis)
+
+    def test_invalid_format(self):
+        response = self.client.get(f'/api/v1/analysis/{self.analysis_id}/', {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
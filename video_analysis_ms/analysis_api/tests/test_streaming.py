@@ -0,0 +1,55 @@
+import json
+
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.tests.fakes import insert_analysis
+
+
+class StreamAnalysisTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        self.analysis_id = insert_analysis(frame_count=23)[0]
+
+    def _get(self, **params):
+        response = self.client.get(f'/api/v1/analysis/{self.analysis_id}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def _streamed(self, **params):
+        response = self._get(**params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_json_stream_equals_the_regular_response(self):
+        for response_format in ('legacy', 'columnar'):
+            for params in ({}, {'start': 1.1, 'end': 3.3, 'landmarks': 'nose,left_wrist'}):
+                with self.subTest(format=response_format, **params):
+                    expected = self._get(format=response_format, **params).json()
+                    response, body = self._streamed(format=response_format, stream='json', **params)
+
+                    self.assertEqual(response['Content-Type'], 'application/json')
+                    self.assertEqual(json.loads(body), expected)
+
+    def test_ndjson_has_a_header_then_one_line_per_frame(self):
+        expected = self._get(format='columnar', start=1, end=3).json()['analysis']
+        response, body = self._streamed(format='columnar', stream='ndjson', start=1, end=3)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        header, *frames = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(header['_id'], expected['_id'])
+        self.assertEqual(header['landmark_names'], expected['landmark_names'])
+        self.assertEqual([frame['timestamp'] for frame in frames], expected['timestamps'])
+        self.assertEqual([frame['landmarks'] for frame in frames], expected['landmarks'])
+
+    def test_ndjson_legacy_frames(self):
+        expected = self._get().json()['analysis']['data']
+        _, body = self._streamed(stream='ndjson')
+
+        self.assertEqual([json.loads(line) for line in body.splitlines()[1:]], expected)
+
+    def test_invalid_stream_requests(self):
+        for params in ({'stream': 'xml'}, {'stream': 'json', 'resolution': 'auto'}):
+            with self.subTest(**params):
+                response = self.client.get(f'/api/v1/analysis/{self.analysis_id}/', params)
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,112 @@
+from collections import deque
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from analysis_api.temporal import LandmarkSeriesWriter, interpolate_landmarks
+
+
+def _keyframe(coordinate: float, visibility: float) -> np.ndarray:
+    landmarks = np.full((33, 4), coordinate, dtype=np.float32)
+    landmarks[:, 3] = visibility
+    return landmarks
+
+
+class InterpolateLandmarksTests(SimpleTestCase):
+    def test_linear_between_visible_keyframes(self):
+        keyframes = np.stack([_keyframe(0.2, 1.0), _keyframe(0.6, 1.0)])
+        result = interpolate_landmarks([0.0, 1.0], keyframes, [0.0, 0.25, 0.5, 1.0])
+
+        self.assertEqual(result.shape, (4, 33, 4))
+        np.testing.assert_allclose(result[:, 0, 0], [0.2, 0.3, 0.4, 0.6], atol=1e-6)
+        np.testing.assert_allclose(result[:, 0, 3], 1.0)
+
+    def test_weighted_by_visibility(self):
+        keyframes = np.stack([_keyframe(0.2, 1.0), _keyframe(0.6, 0.0)])
+        result = interpolate_landmarks([0.0, 1.0], keyframes, [0.5])
+
+        # The invisible keyframe does not pull the position, the visibility is still interpolated
+        np.testing.assert_allclose(result[0, :, :3], 0.2, atol=1e-6)
+        np.testing.assert_allclose(result[0, :, 3], 0.5, atol=1e-6)
+
+    def test_linear_when_invisible_in_both_keyframes(self):
+        keyframes = np.stack([_keyframe(0.2, 0.0), _keyframe(0.6, 0.0)])
+        result = interpolate_landmarks([0.0, 1.0], keyframes, [0.5])
+
+        np.testing.assert_allclose(result[0, :, :3], 0.4, atol=1e-6)
+        np.testing.assert_allclose(result[0, :, 3], 0.0)
+
+    def test_outside_range_takes_nearest_keyframe(self):
+        keyframes = np.stack([_keyframe(0.2, 1.0), _keyframe(0.4, 1.0), _keyframe(0.6, 1.0)])
+        result = interpolate_landmarks([1.0, 2.0, 3.0], keyframes, [0.0, 0.5, 3.5, 10.0])
+
+        np.testing.assert_allclose(result[:, 0, 0], [0.2, 0.2, 0.6, 0.6], atol=1e-6)
+
+    def test_single_keyframe_is_repeated(self):
+        keyframe = _keyframe(0.3, 0.8)
+        result = interpolate_landmarks([1.0], keyframe[None], [0.0, 1.0, 2.0])
+
+        self.assertEqual(result.shape, (3, 33, 4))
+        for frame in result:
+            np.testing.assert_array_equal(frame, keyframe)
+
+
+class _RecordingWriter:
+    def __init__(self):
+        self.frames = []
+
+    def add_landmarks(self, frame_index, timestamp_seconds, values, carried_forward=False, model_landmarks=None):
+        self.frames.append((frame_index, float(values[0, 0]), carried_forward))
+
+
+class LandmarkSeriesWriterTests(SimpleTestCase):
+    def test_frames_after_last_keyframe_hold_its_landmarks(self):
+        writer = _RecordingWriter()
+        series = LandmarkSeriesWriter(writer, fps=30.0, frame_skip=2, interpolate=True)
+        series.add(0, _keyframe(0.2, 1.0))
+        series.add(6, _keyframe(0.8, 1.0))
+        series.finish(11)
+        held = float(np.float32(0.8))
+
+        self.assertEqual([frame[0] for frame in writer.frames], [0, 2, 4, 6, 8, 10])
+        self.assertEqual(writer.frames[-2:], [(8, held, True), (10, held, True)])
+        self.assertEqual(series.interpolated_count, 2)
+
+    def test_finish_stops_at_segment_end(self):
+        writer = _RecordingWriter()
+        series = LandmarkSeriesWriter(writer, fps=30.0, frame_skip=2, interpolate=True, end_frame=9)
+        series.add(0, _keyframe(0.2, 1.0))
+        series.finish(20)
+
+        self.assertEqual([frame[0] for frame in writer.frames], [0, 2, 4, 6, 8])
+
+    def test_static_intervals_are_not_filled(self):
+        writer = _RecordingWriter()
+        static_indices = deque()
+        series = LandmarkSeriesWriter(writer, fps=30.0, frame_skip=2, interpolate=True, static_indices=static_indices)
+        series.add(0, _keyframe(0.2, 1.0))
+        # The motion gate passed over the candidates 6 and 12, the sampler ran ahead to 24
+        static_indices.extend([6, 12, 24])
+        series.add(18, _keyframe(0.8, 1.0))
+
+        self.assertEqual([frame[0] for frame in writer.frames], [0, 14, 16, 18])
+        # Interpolated from the last static candidate, which still showed the first keyframe's pose
+        np.testing.assert_allclose([frame[1] for frame in writer.frames[1:3]], [0.4, 0.6], atol=1e-6)
+        self.assertEqual(list(static_indices), [24])
+
+        series.finish(29)
+        self.assertEqual([frame[0] for frame in writer.frames[4:]], [26, 28])
+        self.assertFalse(static_indices)
+
+    def test_frames_before_a_duplicate_are_carried_forward(self):
+        writer = _RecordingWriter()
+        series = LandmarkSeriesWriter(writer, fps=30.0, frame_skip=2, interpolate=True)
+        keyframe = _keyframe(0.2, 1.0)
+        series.add(0, keyframe)
+        series.add(6, keyframe, carried_forward=True)
+
+        self.assertEqual(
+            [(frame[0], frame[2]) for frame in writer.frames], [(0, False), (2, True), (4, True), (6, True)]
+        )
+        np.testing.assert_allclose([frame[1] for frame in writer.frames], 0.2, atol=1e-6)
+        self.assertEqual(series.interpolated_count, 0)
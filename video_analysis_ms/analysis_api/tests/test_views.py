@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+from django.test import SimpleTestCase
+
+from analysis_api.benchmark import in_memory_mongodb
+from analysis_api.db_connection import get_analysis_buckets_collection, get_analysis_collection
+from analysis_api.storage import POSE_LANDMARK_NAMES
+from analysis_api.tests.fakes import insert_analysis
+
+
+class GetAnalysisTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        self.analysis_id, self.timestamps, self.landmarks = insert_analysis(frame_count=50)
+
+    def _get(self, **params):
+        response = self.client.get(f'/api/v1/analysis/{self.analysis_id}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['analysis']
+
+    def test_time_range_and_landmarks_are_sliced(self):
+        analysis = self._get(format='columnar', start=2, end=4, landmarks='left_hip,right_hip')
+
+        np.testing.assert_allclose(analysis['timestamps'], self.timestamps[10:20])
+        self.assertEqual(analysis['landmark_names'], ['left_hip', 'right_hip'])
+        hips = [POSE_LANDMARK_NAMES.index('left_hip'), POSE_LANDMARK_NAMES.index('right_hip')]
+        np.testing.assert_allclose(analysis['landmarks'], self.landmarks[10:20][:, hips], rtol=1e-6)
+
+    def test_summary_view_has_no_landmarks(self):
+        analysis = self._get(view='summary')
+
+        self.assertEqual(analysis['_id'], str(self.analysis_id))
+        self.assertEqual(analysis['total_frames'], 50)
+        for field in ('data', 'timestamps', 'landmarks', 'buckets', 'params'):
+            self.assertNotIn(field, analysis)
+
+    def test_invalid_parameters(self):
+        for params in ({'start': 'soon'}, {'start': 4, 'end': 2}, {'landmarks': 'tail'}, {'view': 'all'}):
+            with self.subTest(params=params):
+                response = self.client.get(f'/api/v1/analysis/{self.analysis_id}/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+    def test_unknown_analysis(self):
+        self.assertEqual(self.client.get(f'/api/v1/analysis/{ObjectId()}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/analysis/not-an-id/').status_code, 400)
+
+
+class GetVideoAnalysesTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+        self.video_id = str(ObjectId())
+        self.analysis_ids = [insert_analysis(self.video_id, frame_count=10, seed=seed)[0] for seed in range(3)]
+        self.processing_id = insert_analysis(self.video_id, frame_count=10, complete=False)[0]
+
+    def _get(self, **params):
+        response = self.client.get(f'/api/v1/analysis/video/{self.video_id}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_newest_first(self):
+        first = self._get(limit=2)
+        second = self._get(limit=2, cursor=first['next_cursor'])
+
+        listed = [analysis['_id'] for analysis in first['analyses'] + second['analyses']]
+        self.assertEqual(listed, [str(analysis_id) for analysis_id in reversed(self.analysis_ids)])
+        self.assertEqual(first['count'], 2)
+        self.assertIsNone(second['next_cursor'])
+
+    def test_summaries_by_default(self):
+        analyses = self._get()['analyses']
+        self.assertNotIn('data', analyses[0])
+        self.assertNotIn('landmarks', analyses[0])
+
+    def test_unfinished_analyses_are_opt_in(self):
+        listed = [analysis['_id'] for analysis in self._get(include='processing')['analyses']]
+        self.assertEqual(listed[0], str(self.processing_id))
+        self.assertEqual(len(listed), 4)
+
+        response = self.client.get(f'/api/v1/analysis/video/{self.video_id}/', {'include': 'complete'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DeleteAnalysisTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(in_memory_mongodb())
+
+    def _delete(self, analysis_id):
+        return self.client.delete(f'/api/v1/analysis/{analysis_id}/delete/')
+
+    def test_deletes_analysis_and_buckets(self):
+        analysis_id = insert_analysis()[0]
+
+        self.assertEqual(self._delete(analysis_id).status_code, 200)
+        self.assertIsNone(get_analysis_collection().find_one({'_id': analysis_id}))
+        self.assertEqual(get_analysis_buckets_collection().count_documents({'analysis_id': analysis_id}), 0)
+
+    def test_processing_analysis_is_kept(self):
+        analysis_id = insert_analysis(complete=False)[0]
+        buckets = get_analysis_buckets_collection().count_documents({'analysis_id': analysis_id})
+
+        response = self._delete(analysis_id)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['success'])
+        self.assertIsNotNone(get_analysis_collection().find_one({'_id': analysis_id}))
+        self.assertEqual(get_analysis_buckets_collection().count_documents({'analysis_id': analysis_id}), buckets)
+
+    def test_abandoned_analysis_is_deleted(self):
+        analysis_id = insert_analysis(complete=False)[0]
+        get_analysis_collection().update_one(
+            {'_id': analysis_id}, {'$set': {'updated_at': datetime.utcnow() - timedelta(days=1)}}
+        )
+
+        self.assertEqual(self._delete(analysis_id).status_code, 200)
+        self.assertEqual(get_analysis_buckets_collection().count_documents({'analysis_id': analysis_id}), 0)
+
+    def test_unknown_analysis(self):
+        self.assertEqual(self._delete(ObjectId()).status_code, 404)
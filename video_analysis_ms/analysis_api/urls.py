@@ -7,10 +7,30 @@ from . import views
 urlpatterns = [
     # Health check
     path('health/', views.health_check, name='health_check'),
+    path('metrics/', views.metrics, name='metrics'),
 
     # Video analysis endpoints
     path('analyze/video/<str:video_id>/', views.analyze_video, name='analyze_video'),
+    path('analyze/batch/', views.analyze_batch, name='analyze_batch'),
     path('analysis/<str:analysis_id>/', views.get_analysis, name='get_analysis'),
     path('analysis/video/<str:video_id>/', views.get_video_analyses, name='get_video_analyses'),
     path('analysis/<str:analysis_id>/delete/', views.delete_analysis, name='delete_analysis'),
+    path(
+        'analysis/<str:analysis_id>/delivery-metrics/',
+        views.get_analysis_delivery_metrics,
+        name='get_delivery_metrics'
+    ),
+    path('analysis/<str:analysis_id>/audio/', views.get_analysis_audio, name='get_analysis_audio'),
+    path(
+        'analysis/<str:analysis_id>/models/<str:model>/',
+        views.get_analysis_model_landmarks,
+        name='get_analysis_model_landmarks'
+    ),
+
+    # Analysis jobs
+    path('jobs/<str:job_id>/', views.get_job_status, name='get_job_status'),
+    path('jobs/batch/<str:batch_id>/', views.get_batch_status, name='get_batch_status'),
+
+    # Analysis cache
+    path('cache/video/<str:video_id>/', views.invalidate_video_cache, name='invalidate_video_cache'),
 ]
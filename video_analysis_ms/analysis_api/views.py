@@ -1,26 +1,197 @@
 """
 API views for video analysis endpoints.
 """
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from bson import ObjectId
 from bson.errors import InvalidId
 
-from .services import VideoProcessingService
+from .jobs import (
+    enqueue_analysis_job,
+    enqueue_batch_jobs,
+    resolve_video_paths,
+    get_job,
+    get_batch_jobs,
+    count_active_jobs,
+    job_to_dict,
+)
+from .storage import (
+    serialize_analysis,
+    POSE_LANDMARK_NAMES,
+    LANDMARK_FIELDS,
+    FORMAT_COLUMNAR,
+    FORMAT_LEGACY,
+    RESPONSE_FORMATS,
+    VIEW_SUMMARY,
+    VIEW_FULL,
+    RESPONSE_VIEWS,
+    SUMMARY_PROJECTION,
+    SCHEMA_VERSION_BUCKETED,
+    get_schema_version,
+)
+from .streaming import stream_analysis, STREAM_FORMATS, STREAM_CONTENT_TYPES
+from .analysis_store import (
+    attach_buckets,
+    delete_analysis_buckets,
+    delete_analysis_header,
+    load_model_series,
+    ANALYSIS_PROCESSING,
+    ANALYSIS_FAILED,
+)
+from .model_stages import MODEL_FACE, MODEL_HANDS, HAND_LANDMARK_NAMES
+from .analysis_cache import invalidate_analysis, invalidate_video
+from .delivery_metrics import get_delivery_metrics, delete_delivery_metrics
+from .lod import RESOLUTION_AUTO, serialize_lod, delete_lod
+from .audio import load_audio_series
 from .db_connection import get_analysis_collection
+from .metrics import REGISTRY, JOBS, WORKERS, CONTENT_TYPE, get_worker_snapshots
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Query operators that run server-side JavaScript, not accepted in batch video filters
+FORBIDDEN_FILTER_OPERATORS = ('$where', '$function', '$accumulator')
+
+
+def _parse_bool(value):
+    """Parse an optional boolean query parameter ('true'/'1'/'yes')."""
+    if value is None:
+        return None
+    return value.lower() in ('true', '1', 'yes')
+
+
+def _bad_request(error):
+    return Response(
+        {
+            'success': False,
+            'error': error
+        },
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def _has_forbidden_operator(value):
+    """Check a client supplied MongoDB filter for FORBIDDEN_FILTER_OPERATORS at any depth."""
+    if isinstance(value, dict):
+        return any(
+            key in FORBIDDEN_FILTER_OPERATORS or _has_forbidden_operator(item)
+            for key, item in value.items()
+        )
+    if isinstance(value, list):
+        return any(_has_forbidden_operator(item) for item in value)
+    return False
+
+
+def _parse_read_options(query_params, default_view):
+    """
+    Parse the query parameters shared by the analysis read endpoints.
+
+    Returns:
+        Dictionary with response_format, view, start, end, landmark_names and resolution
+
+    Raises:
+        ValueError: With a client facing message if a parameter is invalid
+    """
+    # Existing clients read the per-frame layout, the columnar one is opt-in for now;
+    # precomputed levels only exist in the columnar format
+    default_format = FORMAT_COLUMNAR if query_params.get('resolution') is not None else FORMAT_LEGACY
+    response_format = query_params.get('format', default_format)
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"Invalid format, expected one of: {', '.join(RESPONSE_FORMATS)}")
+
+    view = query_params.get('view', default_view)
+    if view not in RESPONSE_VIEWS:
+        raise ValueError(f"Invalid view, expected one of: {', '.join(RESPONSE_VIEWS)}")
+
+    time_range = {}
+    for name in ('start', 'end'):
+        value = query_params.get(name)
+        if value is None:
+            time_range[name] = None
+            continue
+        try:
+            time_range[name] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid {name}, expected seconds")
+    if time_range['start'] is not None and time_range['end'] is not None and time_range['end'] <= time_range['start']:
+        raise ValueError('end must be greater than start')
+
+    landmark_names = None
+    if query_params.get('landmarks'):
+        landmark_names = [name.strip() for name in query_params['landmarks'].split(',') if name.strip()]
+        unknown = [name for name in landmark_names if name not in POSE_LANDMARK_NAMES]
+        if unknown:
+            raise ValueError(f"Unknown landmarks: {', '.join(unknown)}")
+
+    resolution = query_params.get('resolution')
+    if resolution is not None:
+        resolutions = settings.ANALYSIS_LOD_CONFIG['resolutions']
+        try:
+            valid = resolution == RESOLUTION_AUTO or float(resolution) in resolutions
+        except ValueError:
+            valid = False
+        if not valid:
+            choices = [RESOLUTION_AUTO] + [f'{value:g}' for value in sorted(resolutions)]
+            raise ValueError(f"Invalid resolution, expected one of: {', '.join(choices)}")
+        if response_format != FORMAT_COLUMNAR:
+            raise ValueError('resolution is only available in the columnar format')
+
+    return {
+        'response_format': response_format,
+        'view': view,
+        'start': time_range['start'],
+        'end': time_range['end'],
+        'landmark_names': landmark_names,
+        'resolution': resolution,
+    }
+
+
+def _serialize(analysis_doc, options):
+    """Serialize an analysis document according to parsed read options."""
+    if options['view'] == VIEW_FULL and options['resolution'] is not None:
+        return serialize_lod(
+            analysis_doc,
+            options['resolution'],
+            start=options['start'],
+            end=options['end'],
+            landmark_names=options['landmark_names']
+        )
+
+    if options['view'] == VIEW_FULL:
+        analysis_doc = attach_buckets(analysis_doc, options['start'], options['end'])
+
+    return serialize_analysis(
+        analysis_doc,
+        options['response_format'],
+        view=options['view'],
+        start=options['start'],
+        end=options['end'],
+        landmark_names=options['landmark_names']
+    )
 
 
 @api_view(['POST'])
 def analyze_video(request, video_id):
     """
-    Analyze a video and extract pose landmarks.
+    Queue a video for pose landmark analysis.
+
+    The analysis itself runs in a worker process (see run_analysis_workers);
+    poll the returned job via GET /jobs/<job_id>/. An identical job that is
+    still pending or running is returned instead of queueing a duplicate.
 
     Args:
         video_id: The MongoDB ObjectId of the video to analyze
 
+    Query parameters:
+        debug: Save annotated debug frames for this request (true/false),
+            defaults to VIDEO_PROCESSING_CONFIG['debug_visualization']
+
     Returns:
-        JSON response with analysis results
+        JSON response with the queued job
     """
     # Validate video_id format
     try:
@@ -34,33 +205,206 @@ def analyze_video(request, video_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Process the video
-    service = VideoProcessingService()
-    result = service.process_video(video_id)
+    options = {}
+    debug_visualization = _parse_bool(request.query_params.get('debug'))
+    if debug_visualization is not None:
+        options['debug_visualization'] = debug_visualization
+
+    job, created = enqueue_analysis_job(video_id, options)
 
-    if result['success']:
+    return Response(
+        {
+            'success': True,
+            'message': 'Video analysis queued' if created else 'Video analysis already queued',
+            'job_id': str(job['_id']),
+            'state': job['state']
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+@api_view(['POST'])
+def analyze_batch(request):
+    """
+    Queue many videos for analysis, e.g. to reprocess them after a model or configuration change.
+
+    The video paths are resolved with a single query and the jobs are
+    enqueued with one bulk write. Batch jobs run at a lower priority than
+    single analyze requests and at most ANALYSIS_JOB_CONFIG['batch_max_running']
+    of them at a time, so a batch does not starve interactive requests.
+    Identical jobs that are still pending or running are reused.
+
+    Body (JSON), one of:
+        video_ids: List of video ObjectIds
+        filter: MongoDB filter on the videos collection (e.g. {"user_id": "..."})
+
+    Returns:
+        JSON response with the batch_id, one job handle per video and the
+        videos that could not be queued
+    """
+    # A JSON body can also be a list or a scalar
+    if not isinstance(request.data, dict):
+        return _bad_request('Expected a JSON object with video_ids or filter')
+
+    video_ids = request.data.get('video_ids')
+    video_filter = request.data.get('filter')
+    if (video_ids is None) == (video_filter is None):
+        return _bad_request('Expected either video_ids or filter')
+
+    max_batch_size = settings.ANALYSIS_JOB_CONFIG['max_batch_size']
+    errors = []
+
+    if video_ids is not None:
+        if not isinstance(video_ids, list) or not all(isinstance(video_id, str) for video_id in video_ids):
+            return _bad_request('video_ids must be a list of video IDs')
+        video_ids = list(dict.fromkeys(video_ids))
+        if len(video_ids) > max_batch_size:
+            return _bad_request(f"A batch can contain at most {max_batch_size} videos")
+        invalid = [video_id for video_id in video_ids if not ObjectId.is_valid(video_id)]
+        if invalid:
+            return _bad_request(f"Invalid video ID format: {', '.join(invalid)}")
+
+        video_paths = resolve_video_paths({'_id': {'$in': [ObjectId(video_id) for video_id in video_ids]}})
+        errors.extend(
+            {'video_id': video_id, 'error': 'Video not found'}
+            for video_id in video_ids if video_id not in video_paths
+        )
+    else:
+        if not isinstance(video_filter, dict) or _has_forbidden_operator(video_filter):
+            return _bad_request('filter must be a MongoDB query document without JavaScript operators')
+        video_paths = resolve_video_paths(video_filter, limit=max_batch_size + 1)
+        if len(video_paths) > max_batch_size:
+            return _bad_request(f"filter matches more than {max_batch_size} videos")
+
+    errors.extend(
+        {'video_id': video_id, 'error': 'Video file not found'}
+        for video_id, video_path in video_paths.items() if video_path is None
+    )
+    batch_id, jobs = enqueue_batch_jobs(
+        {video_id: video_path for video_id, video_path in video_paths.items() if video_path is not None}
+    )
+
+    if not jobs:
         return Response(
             {
-                'success': True,
-                'message': 'Video analysis completed successfully',
-                'analysis_id': result['analysis_id'],
-                'frames_processed': result['frames_processed'],
-                'total_frames': result['total_frames'],
-                'duration': result['duration'],
-                'max_x': result.get('max_x'),
-                'max_y': result.get('max_y')
+                'success': False,
+                'error': 'No videos to analyze',
+                'errors': errors
             },
-            status=status.HTTP_201_CREATED
+            status=status.HTTP_404_NOT_FOUND
         )
-    else:
+
+    return Response(
+        {
+            'success': True,
+            'message': f"{sum(created for _, created in jobs)} video analyses queued",
+            'batch_id': str(batch_id),
+            'jobs': [
+                {
+                    'video_id': job['video_id'],
+                    'job_id': str(job['_id']),
+                    'state': job['state'],
+                    'created': created
+                }
+                for job, created in jobs
+            ],
+            'errors': errors
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+@api_view(['GET'])
+def get_batch_status(request, batch_id):
+    """
+    Get the state of the jobs of a batch.
+
+    Args:
+        batch_id: The batch_id returned by analyze_batch
+
+    Returns:
+        JSON response with the number of jobs per state, the overall progress and the jobs
+    """
+    # Validate batch_id format
+    try:
+        jobs = get_batch_jobs(batch_id)
+    except InvalidId:
         return Response(
             {
                 'success': False,
-                'error': result.get('error', 'Unknown error occurred')
+                'error': 'Invalid batch ID format'
             },
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            status=status.HTTP_400_BAD_REQUEST
         )
 
+    if not jobs:
+        return Response(
+            {
+                'success': False,
+                'error': 'Batch not found'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    states = {}
+    for job in jobs:
+        states[job['state']] = states.get(job['state'], 0) + 1
+
+    return Response(
+        {
+            'success': True,
+            'batch': {
+                'batch_id': batch_id,
+                'count': len(jobs),
+                'states': states,
+                'progress': round(sum(job.get('progress', 0.0) for job in jobs) / len(jobs), 4),
+                'jobs': [job_to_dict(job) for job in jobs]
+            }
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+def get_job_status(request, job_id):
+    """
+    Get the state of an analysis job.
+
+    Args:
+        job_id: The MongoDB ObjectId of the job
+
+    Returns:
+        JSON response with job state, progress and the resulting analysis_id
+    """
+    # Validate job_id format
+    try:
+        job = get_job(job_id)
+    except InvalidId:
+        return Response(
+            {
+                'success': False,
+                'error': 'Invalid job ID format'
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not job:
+        return Response(
+            {
+                'success': False,
+                'error': 'Job not found'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return Response(
+        {
+            'success': True,
+            'job': job_to_dict(job)
+        },
+        status=status.HTTP_200_OK
+    )
+
 
 @api_view(['GET'])
 def get_analysis(request, analysis_id):
@@ -70,6 +414,22 @@ def get_analysis(request, analysis_id):
     Args:
         analysis_id: The MongoDB ObjectId of the analysis document
 
+    Query parameters:
+        format: 'legacy' (default) for one dict per frame and landmark,
+            'columnar' for timestamps plus a frames x 33 x 4 landmark list
+        view: 'full' (default) or 'summary' (document fields without landmarks)
+        start, end: Only return frames in [start, end) seconds; only the
+            storage buckets overlapping the range are read
+        landmarks: Comma separated landmark names to return (e.g. left_hip,right_hip)
+        resolution: Seconds per point of a precomputed level (e.g. 1, 5, 30) to
+            return the min, mean and max of every landmark coordinate per time
+            bin instead of every frame, or 'auto' for the finest level with at
+            most ANALYSIS_LOD_CONFIG['auto_max_points'] points (columnar only,
+            the default format with a resolution)
+        stream: 'json' to stream the same JSON document incrementally, 'ndjson'
+            for a header line followed by one line per frame (view=full only,
+            not with resolution)
+
     Returns:
         JSON response with analysis data
     """
@@ -85,9 +445,23 @@ def get_analysis(request, analysis_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Get analysis from MongoDB
+    try:
+        options = _parse_read_options(request.query_params, VIEW_FULL)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    stream_format = request.query_params.get('stream')
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        return _bad_request(f"Invalid stream, expected one of: {', '.join(STREAM_FORMATS)}")
+    streaming = stream_format is not None and options['view'] == VIEW_FULL
+    downsampled = options['resolution'] is not None and options['view'] == VIEW_FULL
+    if streaming and downsampled:
+        return _bad_request('stream cannot be combined with resolution')
+
+    # Get analysis from MongoDB (bucketed analyses are streamed from the bucket collection)
     analysis_collection = get_analysis_collection()
-    analysis_doc = analysis_collection.find_one({'_id': obj_id})
+    projection = SUMMARY_PROJECTION if options['view'] == VIEW_SUMMARY or streaming or downsampled else None
+    analysis_doc = analysis_collection.find_one({'_id': obj_id}, projection)
 
     if not analysis_doc:
         return Response(
@@ -98,13 +472,26 @@ def get_analysis(request, analysis_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
-    # Convert ObjectId to string for JSON serialization
-    analysis_doc['_id'] = str(analysis_doc['_id'])
+    if streaming:
+        if get_schema_version(analysis_doc) != SCHEMA_VERSION_BUCKETED:
+            analysis_doc = analysis_collection.find_one({'_id': obj_id})
+
+        return StreamingHttpResponse(
+            stream_analysis(
+                analysis_doc,
+                stream_format,
+                response_format=options['response_format'],
+                start=options['start'],
+                end=options['end'],
+                landmark_names=options['landmark_names']
+            ),
+            content_type=STREAM_CONTENT_TYPES[stream_format]
+        )
 
     return Response(
         {
             'success': True,
-            'analysis': analysis_doc
+            'analysis': _serialize(analysis_doc, options)
         },
         status=status.HTTP_200_OK
     )
@@ -113,13 +500,22 @@ def get_analysis(request, analysis_id):
 @api_view(['GET'])
 def get_video_analyses(request, video_id):
     """
-    Get all analyses for a specific video.
+    Get the analyses of a specific video, newest first, one page at a time.
 
     Args:
         video_id: The MongoDB ObjectId of the video
 
+    Query parameters:
+        limit: Page size (default 20, max 100)
+        cursor: `next_cursor` of the previous page
+        view: 'summary' (default) or 'full' to include the landmarks
+        include: Comma separated unfinished states to list as well ('processing',
+            'failed'); by default only complete analyses are listed
+        format, start, end, landmarks, resolution: See get_analysis (only used with view=full)
+
     Returns:
-        JSON response with list of analyses
+        JSON response with a page of analyses and the cursor of the next page
+        (null on the last page)
     """
     # Validate video_id format
     try:
@@ -133,19 +529,226 @@ def get_video_analyses(request, video_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Get all analyses for this video
+    try:
+        options = _parse_read_options(request.query_params, VIEW_SUMMARY)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    try:
+        limit = min(max(1, int(request.query_params.get('limit', DEFAULT_PAGE_SIZE))), MAX_PAGE_SIZE)
+    except ValueError:
+        return _bad_request('Invalid limit')
+
+    unfinished_states = [ANALYSIS_PROCESSING, ANALYSIS_FAILED]
+    include = [state.strip() for state in request.query_params.get('include', '').split(',') if state.strip()]
+    unknown = [state for state in include if state not in unfinished_states]
+    if unknown:
+        return _bad_request(f"Invalid include, expected any of: {', '.join(unfinished_states)}")
+
+    # Documents of older schema versions have no status and are complete
+    query = {'video_id': video_id}
+    excluded_states = [state for state in unfinished_states if state not in include]
+    if excluded_states:
+        query['status'] = {'$nin': excluded_states}
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            query['_id'] = {'$lt': ObjectId(cursor)}
+        except InvalidId:
+            return _bad_request('Invalid cursor')
+
+    # Fetch one document more than requested to know whether there is a next page
     analysis_collection = get_analysis_collection()
-    analyses = list(analysis_collection.find({'video_id': video_id}))
+    projection = SUMMARY_PROJECTION if options['view'] == VIEW_SUMMARY or options['resolution'] is not None else None
+    docs = list(analysis_collection.find(query, projection).sort('_id', -1).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
 
-    # Convert ObjectIds to strings
-    for analysis in analyses:
-        analysis['_id'] = str(analysis['_id'])
+    analyses = [_serialize(analysis, options) for analysis in docs]
 
     return Response(
         {
             'success': True,
             'count': len(analyses),
-            'analyses': analyses
+            'analyses': analyses,
+            'next_cursor': str(docs[-1]['_id']) if has_more else None
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+def get_analysis_delivery_metrics(request, analysis_id):
+    """
+    Get the speech-delivery metrics of an analysis (hip sway, hand gestures,
+    eye contact, stage movement; see delivery_metrics.py).
+
+    Metrics are computed when an analysis completes; for analyses without
+    stored metrics (or with metrics of an older version) they are computed
+    on the first request.
+
+    Args:
+        analysis_id: The MongoDB ObjectId of the analysis
+
+    Returns:
+        JSON response with the metrics document
+    """
+    try:
+        obj_id = ObjectId(analysis_id)
+    except InvalidId:
+        return Response(
+            {
+                'success': False,
+                'error': 'Invalid analysis ID format'
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    metrics_doc = get_delivery_metrics(obj_id)
+    if metrics_doc is None:
+        return Response(
+            {
+                'success': False,
+                'error': 'Analysis not found or not complete'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    metrics_doc['_id'] = str(metrics_doc['_id'])
+    return Response(
+        {
+            'success': True,
+            'metrics': metrics_doc
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+def get_analysis_audio(request, analysis_id):
+    """
+    Get the voice loudness and pitch of an analysis, one value per stored frame.
+
+    Args:
+        analysis_id: The MongoDB ObjectId of the analysis
+
+    Query parameters:
+        start: Only include frames at or after this many seconds
+        end: Only include frames before this many seconds
+
+    Returns:
+        JSON response with the audio summary and the loudness_db and pitch
+        series aligned with timestamps (null where a frame has no audio or no
+        voiced pitch)
+    """
+    try:
+        obj_id = ObjectId(analysis_id)
+    except InvalidId:
+        return _bad_request('Invalid analysis ID format')
+
+    try:
+        options = _parse_read_options(request.query_params, VIEW_FULL)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    analysis_doc = get_analysis_collection().find_one({'_id': obj_id}, SUMMARY_PROJECTION)
+    if not analysis_doc:
+        return Response(
+            {
+                'success': False,
+                'error': 'Analysis not found'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if not analysis_doc.get('audio'):
+        return Response(
+            {
+                'success': False,
+                'error': 'No audio features stored for this analysis'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return Response(
+        {
+            'success': True,
+            'audio': {
+                'summary': analysis_doc['audio'],
+                **load_audio_series(analysis_doc, options['start'], options['end'])
+            }
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+def get_analysis_model_landmarks(request, analysis_id, model):
+    """
+    Get the landmarks of an additional model ('face' or 'hands') of an analysis.
+
+    The models run at their own intervals, so their timestamps are a subset
+    of the pose timestamps (see model_stages.py).
+
+    Args:
+        analysis_id: The MongoDB ObjectId of the analysis
+        model: 'face' (468 FaceMesh landmarks) or 'hands' (21 left, then 21 right hand landmarks)
+
+    Query parameters:
+        start: Only include frames at or after this many seconds
+        end: Only include frames before this many seconds
+
+    Returns:
+        JSON response with the model's timestamps and landmarks in the columnar format
+    """
+    try:
+        obj_id = ObjectId(analysis_id)
+    except InvalidId:
+        return _bad_request('Invalid analysis ID format')
+
+    if model not in (MODEL_FACE, MODEL_HANDS):
+        return _bad_request(f"Invalid model, expected one of: {MODEL_FACE}, {MODEL_HANDS}")
+
+    try:
+        options = _parse_read_options(request.query_params, VIEW_FULL)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    analysis_doc = get_analysis_collection().find_one({'_id': obj_id}, SUMMARY_PROJECTION)
+    if not analysis_doc:
+        return Response(
+            {
+                'success': False,
+                'error': 'Analysis not found'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if not analysis_doc.get('model_frames', {}).get(model):
+        return Response(
+            {
+                'success': False,
+                'error': f'No {model} landmarks stored for this analysis'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    timestamps, landmarks = load_model_series(analysis_doc, model, options['start'], options['end'])
+    result = {
+        'analysis_id': str(obj_id),
+        'model': model,
+        'format': FORMAT_COLUMNAR,
+        'fields': LANDMARK_FIELDS,
+        'timestamps': timestamps,
+        'landmarks': landmarks.tolist() if landmarks is not None else []
+    }
+    if model == MODEL_HANDS:
+        result['landmark_names'] = HAND_LANDMARK_NAMES
+
+    return Response(
+        {
+            'success': True,
+            'landmarks': result
         },
         status=status.HTTP_200_OK
     )
@@ -156,6 +759,9 @@ def delete_analysis(request, analysis_id):
     """
     Delete an analysis by ID.
 
+    Analyses that are still being processed cannot be deleted (409), unless
+    their worker stopped updating them for the job lease timeout.
+
     Args:
         analysis_id: The MongoDB ObjectId of the analysis to delete
 
@@ -174,11 +780,23 @@ def delete_analysis(request, analysis_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Delete the analysis
-    analysis_collection = get_analysis_collection()
-    result = analysis_collection.delete_one({'_id': obj_id})
+    # An analysis that is still being processed would get buckets written after they were deleted
+    deleted = delete_analysis_header(obj_id, settings.ANALYSIS_JOB_CONFIG['lease_timeout'])
+    if deleted is False:
+        return Response(
+            {
+                'success': False,
+                'error': 'Analysis is still being processed'
+            },
+            status=status.HTTP_409_CONFLICT
+        )
+
+    invalidate_analysis(obj_id)
+    delete_analysis_buckets(obj_id)
+    delete_delivery_metrics(obj_id)
+    delete_lod(obj_id)
 
-    if result.deleted_count == 0:
+    if deleted is None:
         return Response(
             {
                 'success': False,
@@ -196,6 +814,43 @@ def delete_analysis(request, analysis_id):
     )
 
 
+@api_view(['DELETE'])
+def invalidate_video_cache(request, video_id):
+    """
+    Drop the cached analysis results of a video.
+
+    The next analysis of this video (or of an identical upload) runs the
+    full pipeline again. Existing analyses are not deleted.
+
+    Args:
+        video_id: The MongoDB ObjectId of the video
+
+    Returns:
+        JSON response with the number of invalidated cache entries
+    """
+    # Validate video_id format
+    try:
+        ObjectId(video_id)
+    except InvalidId:
+        return Response(
+            {
+                'success': False,
+                'error': 'Invalid video ID format'
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    invalidated = invalidate_video(video_id)
+
+    return Response(
+        {
+            'success': True,
+            'invalidated': invalidated
+        },
+        status=status.HTTP_200_OK
+    )
+
+
 @api_view(['GET'])
 def health_check(request):
     """
@@ -211,3 +866,32 @@ def health_check(request):
         },
         status=status.HTTP_200_OK
     )
+
+
+@api_view(['GET'])
+def metrics(request):
+    """
+    Processing metrics in the Prometheus text format.
+
+    Combines the metrics of this process with the snapshots recently
+    published by the analysis workers, plus the current queue depth.
+
+    Returns:
+        text/plain response in the Prometheus exposition format
+    """
+    if not settings.METRICS_CONFIG['enabled']:
+        return Response(
+            {
+                'success': False,
+                'error': 'Metrics are disabled'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    for state, count in count_active_jobs().items():
+        JOBS.set(count, state=state)
+
+    snapshots = get_worker_snapshots()
+    WORKERS.set(len(snapshots))
+
+    return HttpResponse(REGISTRY.render(snapshots), content_type=CONTENT_TYPE)
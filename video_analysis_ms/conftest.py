@@ -0,0 +1,15 @@
+"""
+Configures Django for running the test suite with pytest (`python -m pytest`).
+
+`python manage.py test` does the same through Django's test runner.
+"""
+import os
+
+import django
+from django.test.utils import setup_test_environment
+
+
+def pytest_configure(config):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'video_analysis_service.settings')
+    django.setup()
+    setup_test_environment()
@@ -4,6 +4,7 @@ Simple test script for the Video Analysis API.
 import requests
 import json
 import sys
+import time
 
 
 BASE_URL = "http://localhost:8001/api"
@@ -19,25 +20,38 @@ def test_health_check():
 
 
 def test_analyze_video(video_id):
-    """Test video analysis endpoint."""
+    """Test video analysis endpoint (queues a job and polls it until it finishes)."""
     print(f"\nTesting video analysis for video ID: {video_id}...")
     response = requests.post(f"{BASE_URL}/analyze/video/{video_id}/")
     print(f"Status: {response.status_code}")
     print(f"Response: {json.dumps(response.json(), indent=2)}")
 
-    if response.status_code == 201:
-        analysis_id = response.json().get('analysis_id')
-        print(f"\n✅ Analysis completed! Analysis ID: {analysis_id}")
-        return analysis_id
-    else:
-        print(f"\n❌ Analysis failed!")
+    if response.status_code != 202:
+        print(f"\n❌ Failed to queue analysis!")
         return None
 
+    job_id = response.json().get('job_id')
+    print(f"\nWaiting for job {job_id} (is run_analysis_workers running?)...")
+
+    while True:
+        job = requests.get(f"{BASE_URL}/jobs/{job_id}/").json()['job']
+        print(f"  state={job['state']} progress={job['progress']:.0%}")
+
+        if job['state'] == 'completed':
+            analysis_id = job['analysis_id']
+            print(f"\n✅ Analysis completed! Analysis ID: {analysis_id}")
+            return analysis_id
+        if job['state'] == 'failed':
+            print(f"\n❌ Analysis failed: {job['error']}")
+            return None
+
+        time.sleep(2)
+
 
 def test_get_analysis(analysis_id):
     """Test get analysis endpoint."""
     print(f"\nGetting analysis results for ID: {analysis_id}...")
-    response = requests.get(f"{BASE_URL}/analysis/{analysis_id}/")
+    response = requests.get(f"{BASE_URL}/analysis/{analysis_id}/", params={'format': 'legacy'})
     print(f"Status: {response.status_code}")
 
     if response.status_code == 200:
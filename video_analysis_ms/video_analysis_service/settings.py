@@ -77,6 +77,23 @@ MONGODB_CONFIG = {
     'database': os.getenv('DB_NAME', 'fluent'),
     'username': os.getenv('DB_USERNAME', ''),
     'password': os.getenv('DB_PASSWORD', ''),
+    'app_name': 'video_analysis_ms',
+    # Connection pool (per process)
+    'max_pool_size': int(os.getenv('DB_MAX_POOL_SIZE', 50)),
+    'min_pool_size': int(os.getenv('DB_MIN_POOL_SIZE', 0)),
+    'max_idle_time_ms': int(os.getenv('DB_MAX_IDLE_TIME_MS', 300000)),
+    # Timeouts in milliseconds (socket_timeout_ms None = no timeout)
+    'server_selection_timeout_ms': int(os.getenv('DB_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'connect_timeout_ms': int(os.getenv('DB_CONNECT_TIMEOUT_MS', 5000)),
+    'socket_timeout_ms': int(os.getenv('DB_SOCKET_TIMEOUT_MS')) if os.getenv('DB_SOCKET_TIMEOUT_MS') else None,
+    # Write concern: number of nodes or 'majority', optionally waiting for the journal
+    'write_concern': os.getenv('DB_WRITE_CONCERN', '1'),
+    'journal': os.getenv('DB_JOURNAL', 'False') == 'True',
+    # Wire compression in order of preference ('zstd' needs zstandard, 'snappy' python-snappy), empty = off
+    'compressors': os.getenv('DB_COMPRESSORS', ''),
+    # On startup, log the missing indexes or create them
+    'check_indexes': os.getenv('DB_CHECK_INDEXES', 'True') == 'True',
+    'ensure_indexes': os.getenv('DB_ENSURE_INDEXES', 'False') == 'True',
 }
 
 # API Gateway Configuration
@@ -119,6 +136,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
     ],
+    # Only JSON is rendered, ?format= selects the analysis layout instead (see get_analysis)
+    'URL_FORMAT_OVERRIDE': None,
 }
 
 # MediaPipe Configuration
@@ -128,8 +147,166 @@ MEDIAPIPE_CONFIG = {
     'model_complexity': 1,  # 0, 1, or 2 (higher = more accurate but slower)
 }
 
+# Additional landmark models run on the decoded frames of the pose pass (see analysis_api/model_stages.py)
+LANDMARK_MODELS_CONFIG = {
+    # Comma separated: 'face' (FaceMesh), 'hands' (Hands) or 'holistic' (face and hands from one Holistic graph)
+    'models': [name.strip() for name in os.getenv('LANDMARK_MODELS', '').split(',') if name.strip()],
+    'face_interval': 0.5,  # Seconds between two runs of each model
+    'hands_interval': 0.2,
+    'holistic_interval': 0.5,
+    'min_visibility': 0.5,  # Pose visibility of the face/hand landmarks needed for a model to run
+    'roi_padding': 0.5,  # Padding around the face/hands crop, as a fraction of its extent
+    'min_detection_confidence': 0.5,
+    'min_tracking_confidence': 0.5,  # Holistic only, FaceMesh and Hands detect on every crop
+}
+
 # Video Processing Configuration
 VIDEO_PROCESSING_CONFIG = {
     'frame_interval': 0.2,  # Process frame every 0.2 seconds
-    'max_video_duration': 600,  # Maximum video duration in seconds (10 minutes)
+    # Motion-adaptive sampling: analyze every min_frame_interval seconds while the picture changes by at
+    # least motion_threshold (fraction of the frame), and every max_frame_interval seconds while it is static
+    'adaptive_sampling': os.getenv('ADAPTIVE_SAMPLING', 'False') == 'True',
+    'min_frame_interval': 0.1,
+    'max_frame_interval': 1.0,
+    'motion_threshold': 0.02,
+    # Run the pose model on every N-th sampled frame only and interpolate the frames in between (1 disables)
+    'keyframe_stride': int(os.getenv('KEYFRAME_STRIDE', 1)),
+    # One-Euro filter over the stored landmarks (cutoffs in Hz, beta per normalized unit/s of speed)
+    'landmark_smoothing': os.getenv('LANDMARK_SMOOTHING', 'False') == 'True',
+    'smoothing_min_cutoff': 1.0,
+    'smoothing_beta': 5.0,
+    'smoothing_d_cutoff': 1.0,
+    # Reuse the landmarks of the last analyzed frame for frames where at most duplicate_threshold of the
+    # picture changed, analyzing again at least every duplicate_max_carry seconds
+    'skip_duplicate_frames': os.getenv('SKIP_DUPLICATE_FRAMES', 'False') == 'True',
+    'duplicate_threshold': 0.003,
+    'duplicate_max_carry': 2.0,
+    # Maximum video duration in seconds (landmarks are streamed to MongoDB in buckets, so this is not memory bound)
+    'max_video_duration': int(os.getenv('MAX_VIDEO_DURATION', 3600)),
+    # How skipped frames are passed over: 'auto' (pick per container/codec), 'read', 'grab' or 'seek'
+    'sampling_strategy': os.getenv('SAMPLING_STRATEGY', 'auto'),
+    'seek_min_frame_gap': 90,  # Seek inter-coded video only when sampled frames are at least this far apart
+    # Save annotated frames to debug_output/<video_id>/ (can be enabled per request with ?debug=true)
+    'debug_visualization': os.getenv('DEBUG_VISUALIZATION', 'False') == 'True',
+    # Intra-video parallelism: long videos are split into time segments analyzed in separate processes
+    # Processes per video, 1 disables splitting; capped at the CPU cores per analysis worker
+    'segment_workers': int(os.getenv('SEGMENT_WORKERS', 1)),
+    'min_segment_duration': 60,  # Seconds, videos are never split into shorter segments
+    'segment_warmup_frames': 5,  # Sampled frames run before a segment start to warm up pose tracking
+    # Decoded frames buffered ahead of inference by the decoder thread (0 decodes on the inference thread)
+    'prefetch_frames': int(os.getenv('PREFETCH_FRAMES', 4)),
+    'persist_queue_size': 64,  # Frames with landmarks waiting for the persistence thread
+    # Longest side of the image the pose model runs on, frames are downscaled to it (0 keeps the resolution)
+    'inference_max_side': int(os.getenv('INFERENCE_MAX_SIDE', 0)),
+    # Crop to the region around the previous frame's landmarks before inference
+    'roi_crop': os.getenv('ROI_CROP', 'False') == 'True',
+    'roi_padding': 0.25,  # Padding around the landmarks as a fraction of their extent
+    # Resume failed or abandoned analyses of a video from their checkpoints instead of starting over
+    'resume_analyses': os.getenv('RESUME_ANALYSES', 'True') == 'True',
+}
+
+# Pose estimator pool (warm MediaPipe graphs shared by analyses in a process)
+ESTIMATOR_POOL_CONFIG = {
+    'size': int(os.getenv('ESTIMATOR_POOL_SIZE', 1)),  # Max concurrent analyses per process
+    'checkout_timeout': float(os.getenv('ESTIMATOR_POOL_TIMEOUT', 30)),  # Seconds to wait for a free estimator
+    'warm_on_startup': os.getenv('ESTIMATOR_POOL_WARM', 'True') == 'True',
+}
+
+# Analysis job queue (stored in the MongoDB 'analysis_jobs' collection)
+# Worker processes started by run_analysis_workers, one per CPU core unless ANALYSIS_WORKERS is set
+_analysis_workers = int(os.getenv('ANALYSIS_WORKERS', 0)) or os.cpu_count() or 1
+ANALYSIS_JOB_CONFIG = {
+    'workers': _analysis_workers,
+    'max_attempts': 3,  # Attempts before a job is marked failed
+    'retry_backoff': 30,  # Seconds, multiplied by the attempt number
+    'lease_timeout': 300,  # Seconds without a lease renewal (every third of it while running) before a job is lost
+    'poll_interval': 1.0,  # Seconds between queue polls of an idle worker
+    # Batch jobs running at once across all workers; defaults to all workers but one so interactive jobs
+    # find a free worker
+    'batch_max_running': int(os.getenv('ANALYSIS_BATCH_MAX_RUNNING', 0)) or max(1, _analysis_workers - 1),
+    'max_batch_size': 1000,  # Videos per POST /analyze/batch/ request
+}
+
+# Analysis document storage
+ANALYSIS_STORAGE_CONFIG = {
+    # Compression of the packed landmark block: 'none', 'zlib' or 'zstd' (requires the zstandard package)
+    'compression': os.getenv('ANALYSIS_COMPRESSION', 'zlib'),
+    'bucket_duration': 30,  # Seconds of video per document in the 'analysis_buckets' collection
+    'bucket_write_batch': 4,  # Finished buckets sent to MongoDB per insert_many
+}
+
+# Level-of-detail series served by GET /analysis/<id>/?resolution= (MongoDB 'analysis_lod' collection)
+ANALYSIS_LOD_CONFIG = {
+    'enabled': os.getenv('ANALYSIS_LOD', 'True') == 'True',  # Build when an analysis completes
+    # Seconds per point of each level; levels that are multiples of a finer one are built from it
+    'resolutions': [
+        float(value) for value in os.getenv('ANALYSIS_LOD_RESOLUTIONS', '1,5,30').split(',') if value.strip()
+    ],
+    'chunk_points': 720,  # Points of a level per document
+    'auto_max_points': 300,  # resolution=auto picks the finest level with at most this many points
+}
+
+# Content-addressed analysis cache (MongoDB 'analysis_cache' and 'video_hashes' collections)
+ANALYSIS_CACHE_CONFIG = {
+    'enabled': os.getenv('ANALYSIS_CACHE', 'True') == 'True',
+    'max_entries': int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 10000)),  # Least recently hit entries are evicted first
+    'max_age_days': 30,  # Entries not hit for this long are evicted
+    'hash_chunk_size': 1024 * 1024,  # Bytes read per chunk when hashing a video file
+}
+
+# Voice volume and pitch from the audio track (decoded with ffmpeg, see analysis_api/audio.py)
+AUDIO_ANALYSIS_CONFIG = {
+    'enabled': os.getenv('AUDIO_ANALYSIS', 'True') == 'True',  # Analyze the audio track next to the video
+    'ffmpeg_path': os.getenv('FFMPEG_PATH', 'ffmpeg'),
+    'sample_rate': 16000,  # Hz the audio track is resampled to
+    'chunk_duration': 1.0,  # Seconds of audio read from ffmpeg at a time
+    'timeout': float(os.getenv('AUDIO_ANALYSIS_TIMEOUT', 120)),  # Seconds to wait for the audio after the video
+    'frame_length': 0.04,  # Seconds per analysis frame
+    'hop_length': 0.01,  # Seconds between two analysis frames
+    'min_pitch': 75.0,  # Hz
+    'max_pitch': 400.0,  # Hz
+    'voicing_threshold': 0.15,  # YIN threshold, lower accepts fewer frames as voiced
+    'silence_db': -50.0,  # Frames quieter than this (dBFS) have no pitch
+}
+
+# Speech-delivery metrics per analysis (MongoDB 'delivery_metrics' collection, see analysis_api/delivery_metrics.py)
+DELIVERY_METRICS_CONFIG = {
+    'enabled': os.getenv('DELIVERY_METRICS', 'True') == 'True',  # Compute when an analysis completes
+    'sample_rate': 5.0,  # Samples per second the landmark series is resampled to
+    'window': 10.0,  # Seconds per timeline value
+    'max_gap': 1.0,  # Seconds without a detected pose after which the speaker counts as not visible
+}
+
+# Processing metrics exposed at /api/v1/metrics/ (workers publish snapshots to the 'analysis_metrics' collection)
+METRICS_CONFIG = {
+    'enabled': os.getenv('METRICS_ENABLED', 'True') == 'True',
+    'publish_interval': 15,  # Seconds between metrics snapshots of an idle worker
+    'stale_after': 300,  # Seconds after which a worker that stopped publishing is left out
+}
+
+# Logging ('plain' text or one 'json' object per line)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {
+            'format': '%(asctime)s %(levelname)s [%(name)s:%(process)d] %(message)s',
+        },
+        'json': {
+            '()': 'analysis_api.log_formatting.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': os.getenv('LOG_FORMAT', 'plain'),
+        },
+    },
+    'loggers': {
+        'analysis_api': {
+            'handlers': ['console'],
+            'level': os.getenv('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
 }